@@ -3,30 +3,58 @@ from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 
+from app.compression import Compressor
+from app.profiling import Profiler
+from app.ratelimit import RateLimiter
+
 
 db = SQLAlchemy()
 migrate = Migrate()
+limiter = RateLimiter()
+compressor = Compressor()
+profiler = Profiler()
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config.from_object("app.config.Config")
+    # Overrides for tests and scripts that build several apps in one process
+    if config:
+        app.config.update(config)
 
     CORS(app)
 
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
+    limiter.init_app(app)
+    compressor.init_app(app)
 
     # Import models so they are registered with SQLAlchemy
     from app import models  # noqa: F401
 
-    # Create tables on first run (safe if already exist)
+    # Per-connection tuning (SQLite PRAGMAs), then create tables on first run
+    from app.dialects import configure_engine
     with app.app_context():
+        configure_engine(db.engine, app.config)
         db.create_all()
+    profiler.init_app(app)
 
     # Register routes
     from app.routes import bp as api_bp
     app.register_blueprint(api_bp, url_prefix="/api")
 
+    # CLI commands: `flask upgrade-schema`, `flask worker`, `flask import-matches`, `flask partitions`,
+    # `flask backfill-stats`
+    from app.schema import upgrade_schema_command
+    from app.jobs import worker_command
+    from app.importer import import_matches_command
+    from app.partitions import partitions_cli
+    from app.stats import backfill_stats_command
+    app.cli.add_command(upgrade_schema_command)
+    app.cli.add_command(worker_command)
+    app.cli.add_command(import_matches_command)
+    app.cli.add_command(partitions_cli)
+    app.cli.add_command(backfill_stats_command)
+
     return app
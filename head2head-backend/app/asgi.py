@@ -0,0 +1,256 @@
+"""Optional ASGI entry point with async read endpoints.
+
+``create_asgi_app`` wraps the Flask app so the hot read-only endpoints run on
+the event loop with async SQLAlchemy over asyncpg, while every other request
+(writes, auth, exports) falls through to Flask on a thread pool:
+
+* ``GET /api/groups/<id>``          (``get_group``)
+* ``GET /api/groups/<id>/matches``  (``list_matches``)
+* ``GET /api/my/groups``            (``my_groups``)
+* ``GET /api/invites``              (``list_invites``)
+
+A waiting read holds neither a thread nor a pooled connection, and the
+queries a request needs that don't depend on each other run concurrently on
+separate connections: the access check (caller, group and membership in one
+query) alongside the page itself, so a request holds at most two.  Responses come from the same models and serializers as the
+Flask views, so both paths return identical bodies.
+
+Serve with ``uvicorn asgi:app`` after ``pip install -r requirements-asgi.txt``.
+Without a Postgres DATABASE_URL, or with ASGI_ASYNC_READS=false, everything
+is served by Flask.
+"""
+import asyncio
+import re
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import NotFound
+
+from app import create_app
+from app.compression import negotiate, compress_body
+from app.models import User, Group, Membership, Invite, Ranking, Match, MatchParticipant
+from app.routes import _jwt_decode, _group_payload, _invite_payload, _match_payload, _my_groups_query, _my_groups_page
+from app.routes import _MY_GROUPS_PAGE, _MY_GROUPS_MAX_PAGE
+
+
+def async_database_url(config):
+    """asyncpg URL for the app's database, or None when it is not Postgres."""
+    if config.get('ASYNC_DATABASE_URL'):
+        return config['ASYNC_DATABASE_URL']
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'postgresql':
+        return None
+    return url.set(drivername='postgresql+asyncpg')
+
+
+async def _none():
+    return None
+
+
+class AsyncReadApp:
+    """ASGI app serving the read endpoints itself and delegating the rest to Flask."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        config = flask_app.config
+        self.wsgi = WSGIMiddleware(flask_app, workers=config['ASGI_WSGI_THREADS'])
+        url = async_database_url(config) if config['ASGI_ASYNC_READS'] else None
+        self.engine = create_async_engine(
+            url, pool_size=config['ASGI_POOL_SIZE'], max_overflow=config['ASGI_MAX_OVERFLOW'],
+        ) if url else None
+        self.routes = [
+            (re.compile(r'^/api/groups/(\d+)$'), self.get_group),
+            (re.compile(r'^/api/groups/(\d+)/matches$'), self.list_matches),
+            (re.compile(r'^/api/my/groups$'), self.my_groups),
+            (re.compile(r'^/api/invites$'), self.list_invites),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] == 'GET' and self.engine is not None:
+            for pattern, handler in self.routes:
+                m = pattern.match(scope['path'])
+                if m:
+                    headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+                    query = parse_qs(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+                    args = {k: v[0] for k, v in query.items()}
+                    result = await handler(headers, args, *(int(x) for x in m.groups()))
+                    await self._send(send, headers, *result)
+                    return
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _send(self, send, headers, status, payload):
+        config = self.flask_app.config
+        if payload is None:
+            # Same page Flask's get_or_404 renders
+            body, content_type = NotFound().get_body().encode('utf-8'), 'text/html; charset=utf-8'
+        else:
+            body = f"{self.flask_app.json.dumps(payload, separators=(',', ':'))}\n".encode('utf-8')
+            content_type = 'application/json'
+        out = [(b'content-type', content_type.encode('latin-1'))]
+        if config.get('COMPRESS_ENABLED') and payload is not None:
+            out.append((b'vary', b'Accept-Encoding'))
+            encoding = negotiate(headers.get('accept-encoding'), config)
+            compressed = compress_body(body, encoding, config) if encoding else None
+            if compressed is not None:
+                body = compressed
+                out.append((b'content-encoding', encoding.encode('latin-1')))
+        # Mirrors what Flask-CORS adds with its default settings
+        out.append((b'access-control-allow-origin', headers.get('origin', '*').encode('latin-1')))
+        out.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': out})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _user_id(self, headers):
+        auth = headers.get('authorization') or ''
+        if auth.lower().startswith('bearer '):
+            with self.flask_app.app_context():
+                payload = _jwt_decode(auth.split(' ', 1)[1].strip())
+            return int(payload['sub']) if payload and 'sub' in payload else None
+        try:
+            return int(headers['x-user-id']) if headers.get('x-user-id') else None
+        except ValueError:
+            return None
+
+    # Each helper checks out its own connection so they can run under gather()
+
+    async def _all(self, stmt):
+        async with AsyncSession(self.engine) as session:
+            return (await session.execute(stmt)).all()
+
+    async def _first(self, stmt):
+        async with AsyncSession(self.engine) as session:
+            return (await session.execute(stmt)).scalars().first()
+
+    async def _access(self, uid, group_id):
+        """``(user, group, membership)`` in one round trip; all None when the user is unknown."""
+        rows = await self._all(
+            select(User, Group, Membership)
+            .select_from(User)
+            .outerjoin(Group, Group.id == group_id)
+            .outerjoin(Membership, (Membership.user_id == User.id) & (Membership.group_id == group_id))
+            .where(User.id == uid)
+        )
+        return tuple(rows[0]) if rows else (None, None, None)
+
+    def _user(self, uid):
+        return self._first(select(User).where(User.id == uid))
+
+    async def get_group(self, headers, args, group_id):
+        uid = self._user_id(headers)
+        if uid is None:
+            return 401, {'ok': False, 'error': 'Unauthorized'}
+        (me, group, membership), members = await asyncio.gather(
+            self._access(uid, group_id),
+            self._all(
+                select(User, Membership, Ranking)
+                .join(Membership, Membership.user_id == User.id)
+                .outerjoin(Ranking, (Ranking.user_id == User.id) & (Ranking.group_id == group_id))
+                .where(Membership.group_id == group_id)
+            ),
+        )
+        if not me:
+            return 401, {'ok': False, 'error': 'Unauthorized'}
+        if group is None:
+            return 404, None
+        if not membership:
+            return 403, {'ok': False, 'error': 'Forbidden'}
+        return 200, {'ok': True, 'group': _group_payload(group, membership, members)}
+
+    async def list_matches(self, headers, args, group_id):
+        uid = self._user_id(headers)
+        if uid is None:
+            return 401, {'ok': False, 'error': 'Unauthorized'}
+        try:
+            limit = max(1, min(int(args.get('limit', 20)), 100))
+            offset = max(0, int(args.get('offset', 0)))
+        except ValueError:
+            limit = None
+        page = self._all(
+            select(Match).where(Match.group_id == group_id)
+            .order_by(Match.created_at.desc()).offset(offset).limit(limit)
+        ) if limit is not None else _none()
+        (me, group, membership), rows = await asyncio.gather(self._access(uid, group_id), page)
+        if not me:
+            return 401, {'ok': False, 'error': 'Unauthorized'}
+        if group is None:
+            return 404, None
+        if not membership:
+            return 403, {'ok': False, 'error': 'Forbidden'}
+        if limit is None:
+            return 400, {'ok': False, 'error': 'limit and offset must be integers'}
+
+        matches = [m for (m,) in rows]
+        if not matches:
+            return 200, {'ok': True, 'matches': []}
+        player_ids = {x for m in matches for x in (m.winner_id, m.loser_id) if x}
+        parts, names = await asyncio.gather(
+            self._all(
+                select(MatchParticipant.match_id, MatchParticipant.team, MatchParticipant.place, User.id, User.username)
+                .join(User, User.id == MatchParticipant.user_id)
+                .where(MatchParticipant.match_id.in_([m.id for m in matches]))
+                .order_by(MatchParticipant.id)
+            ),
+            self._all(select(User.id, User.username).where(User.id.in_(player_ids))) if player_ids else _none(),
+        )
+        by_match = {}
+        for match_id, team, place, pid, uname in parts:
+            by_match.setdefault(match_id, []).append({'user': {'id': pid, 'username': uname}, 'team': team, 'place': place})
+        usernames = dict(names or [])
+        return 200, {'ok': True, 'matches': [_match_payload(m, by_match.get(m.id, []), usernames) for m in matches]}
+
+    async def my_groups(self, headers, args):
+        uid = self._user_id(headers)
+        if uid is None:
+            return 401, {'ok': False, 'error': 'Unauthorized'}
+        try:
+            limit = max(1, min(int(args.get('limit', _MY_GROUPS_PAGE)), _MY_GROUPS_MAX_PAGE))
+            offset = max(0, int(args.get('offset', 0)))
+        except ValueError:
+            limit = None
+        page = self._all(_my_groups_query(uid).offset(offset).limit(limit + 1)) if limit is not None else _none()
+        me, rows = await asyncio.gather(self._user(uid), page)
+        if not me:
+            return 401, {'ok': False, 'error': 'Unauthorized'}
+        if limit is None:
+            return 400, {'ok': False, 'error': 'limit and offset must be integers'}
+        return 200, {'ok': True, **_my_groups_page(rows, limit, offset)}
+
+    async def list_invites(self, headers, args):
+        uid = self._user_id(headers)
+        if uid is None:
+            return 401, {'ok': False, 'error': 'Unauthorized'}
+        status = args.get('status') or 'pending'
+        me, invites = await asyncio.gather(
+            self._user(uid),
+            self._all(
+                select(Invite, Group, User)
+                .outerjoin(Group, Group.id == Invite.group_id)
+                .outerjoin(User, User.id == Invite.inviter_id)
+                .where(Invite.invitee_id == uid, Invite.status == status)
+                .order_by(Invite.created_at.desc())
+            ),
+        )
+        if not me:
+            return 401, {'ok': False, 'error': 'Unauthorized'}
+        return 200, {'ok': True, 'invites': [_invite_payload(inv, g, inviter) for inv, g, inviter in invites]}
+
+
+def create_asgi_app(flask_app=None):
+    return AsyncReadApp(flask_app or create_app())
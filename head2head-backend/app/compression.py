@@ -0,0 +1,161 @@
+"""Response compression negotiated on ``Accept-Encoding``.
+
+gzip is always available; ``br`` and ``zstd`` are offered when the optional
+``brotli`` and ``zstandard`` packages are installed.  Buffered responses are
+compressed when they reach ``COMPRESS_MIN_SIZE`` bytes and shrink; streamed
+responses (the match export) are compressed chunk by chunk and sync-flushed
+after each one, so memory stays flat and the client receives every chunk as
+soon as the app yields it.  A compressed body is a different representation
+of the same resource, so its ETag is made weak: conditional requests still
+match the view's ETag under the weak comparison ``If-None-Match`` uses.
+"""
+import zlib
+
+from flask import current_app, request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._c = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._c.compress(data)
+
+    def sync(self):
+        return self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def flush(self):
+        return self._c.flush()
+
+
+class _Brotli:
+    def __init__(self, level):
+        self._c = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._c.process(data)
+
+    def sync(self):
+        return self._c.flush()
+
+    def flush(self):
+        return self._c.finish()
+
+
+class _Zstd:
+    def __init__(self, level):
+        self._c = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._c.compress(data)
+
+    def sync(self):
+        return self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def flush(self):
+        return self._c.flush()
+
+
+# Config key holding each encoding's level, and its streaming compressor
+ENCODINGS = {
+    'gzip': ('COMPRESS_GZIP_LEVEL', _Gzip),
+    'br': ('COMPRESS_BR_LEVEL', _Brotli),
+    'zstd': ('COMPRESS_ZSTD_LEVEL', _Zstd),
+}
+
+
+def available_encodings() -> list:
+    return ['gzip'] + (['br'] if brotli is not None else []) + (['zstd'] if zstandard is not None else [])
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    c = ENCODINGS[encoding][1](level)
+    return c.compress(data) + c.flush()
+
+
+def negotiate(accept_encoding: str, config):
+    """Encoding to use for a request's ``Accept-Encoding`` header, or None."""
+    offered = [e.strip() for e in config['COMPRESS_ALGORITHMS'].split(',') if e.strip() in available_encodings()]
+    if not offered or not accept_encoding:
+        return None
+    # Ties in client quality go to the first encoding in COMPRESS_ALGORITHMS
+    return parse_accept_header(accept_encoding).best_match(offered)
+
+
+def compress_body(data: bytes, encoding: str, config):
+    """Compressed ``data``, or None when it is too small or does not shrink."""
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return None
+    body = compress(data, encoding, config[ENCODINGS[encoding][0]])
+    return body if len(body) < len(data) else None
+
+
+def _compress_stream(chunks, source, compressor):
+    try:
+        for chunk in chunks:
+            if chunk:
+                # Sync-flush so each chunk reaches the client now rather than
+                # once the compressor's window fills
+                yield compressor.compress(chunk) + compressor.sync()
+        yield compressor.flush()
+    finally:
+        # Lets stream_with_context tear down its request context
+        if hasattr(source, 'close'):
+            source.close()
+
+
+class Compressor:
+    """Flask extension compressing responses in an ``after_request`` hook."""
+
+    def init_app(self, app):
+        if not app.config.get('COMPRESS_ENABLED', True):
+            return
+        app.extensions['compressor'] = self
+        app.after_request(self.after_request)
+
+    def after_request(self, response):
+        config = current_app.config
+        if response.mimetype not in config['COMPRESS_MIMETYPES'] or request.method == 'HEAD':
+            return response
+        if 'Content-Encoding' in response.headers or response.direct_passthrough:
+            return response
+        if 'no-transform' in (response.headers.get('Cache-Control') or ''):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code < 200 or response.status_code in (204, 206):
+            return response
+
+        encoding = negotiate(request.headers.get('Accept-Encoding'), config)
+        if encoding is None:
+            return response
+        etag, weak = response.get_etag()
+        if response.status_code == 304:
+            # Match the tag the compressed 200 carried
+            if etag and not weak:
+                response.set_etag(etag, weak=True)
+            return response
+
+        if response.is_streamed:
+            compressor = ENCODINGS[encoding][1](config[ENCODINGS[encoding][0]])
+            response.response = _compress_stream(response.iter_encoded(), response.response, compressor)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = compress_body(response.get_data(), encoding, config)
+            if body is None:
+                return response
+            response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -8,8 +8,70 @@ class Config:
         "postgresql+psycopg2://app:app@db:5432/app",
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Embedded mode: DATABASE_URL=sqlite:////data/h2h.db applies these on every connection
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
     # Optional: echo SQL queries for debugging
     SQLALCHEMY_ECHO = os.getenv("SQLALCHEMY_ECHO", "false").lower() == "true"
     # Security
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
     JWT_EXP_SECONDS = int(os.getenv("JWT_EXP_SECONDS", "1209600"))  # 14 days by default
+    # Admission control for write endpoints (token buckets per user and group)
+    RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "true").lower() == "true"
+    # memory:// keeps buckets per process; redis://host:6379/0 shares them across workers
+    RATELIMIT_STORAGE_URL = os.getenv("RATELIMIT_STORAGE_URL", "memory://")
+    RATELIMIT_GROUPS = os.getenv("RATELIMIT_GROUPS", "10/minute")
+    RATELIMIT_INVITES = os.getenv("RATELIMIT_INVITES", "20/minute")
+    RATELIMIT_MATCHES = os.getenv("RATELIMIT_MATCHES", "30/minute")
+    # Max write requests handled at once per process; extra load is shed with 503
+    WRITE_CONCURRENCY_LIMIT = int(os.getenv("WRITE_CONCURRENCY_LIMIT", "8"))
+    WRITE_QUEUE_TIMEOUT_MS = int(os.getenv("WRITE_QUEUE_TIMEOUT_MS", "250"))
+    # Match recording: "sync" applies ratings in the request, "async" queues them
+    # for `flask worker`, "prefer" queues only requests sent with Prefer: respond-async.
+    # Anything but "sync" needs a worker running, or queued matches are never applied
+    MATCH_PIPELINE = os.getenv("MATCH_PIPELINE", "sync")
+    WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "0.5"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    # Rows fetched per server-side cursor round trip when exporting match history
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+    # Rows deleted per transaction when `flask worker` tears down a deleted group
+    GROUP_DELETE_BATCH_SIZE = int(os.getenv("GROUP_DELETE_BATCH_SIZE", "5000"))
+    # Monthly match partitions on Postgres (see `flask partitions --help`)
+    PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+    PARTITION_ROLLUP_AFTER_MONTHS = int(os.getenv("PARTITION_ROLLUP_AFTER_MONTHS", "24"))
+    # Seconds between housekeeping passes in `flask worker`
+    MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", "3600"))
+    # Per-process cache of encoded win-probability matrices, bounded in bytes
+    PREDICTION_CACHE_MAX_BYTES = int(os.getenv("PREDICTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    # Time budget for refining generated teams; the greedy split is returned regardless
+    TEAM_BALANCE_BUDGET_MS = float(os.getenv("TEAM_BALANCE_BUDGET_MS", "200"))
+    # Response compression; br and zstd need the optional brotli / zstandard packages
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() == "true"
+    COMPRESS_ALGORITHMS = os.getenv("COMPRESS_ALGORITHMS", "zstd,br,gzip")  # server preference order
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+    COMPRESS_BR_LEVEL = int(os.getenv("COMPRESS_BR_LEVEL", "4"))
+    COMPRESS_ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "3"))
+    COMPRESS_MIMETYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+    # Optional ASGI server (`uvicorn asgi:app`): async read endpoints and their pool
+    ASGI_ASYNC_READS = os.getenv("ASGI_ASYNC_READS", "true").lower() == "true"  # false: Flask serves everything
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")  # default: DATABASE_URL with the asyncpg driver
+    ASGI_POOL_SIZE = int(os.getenv("ASGI_POOL_SIZE", "5"))
+    ASGI_MAX_OVERFLOW = int(os.getenv("ASGI_MAX_OVERFLOW", "10"))
+    ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "16"))  # threads for requests handled by Flask
+    # Per-request profiling, off by default.  When enabled, requests sending
+    # X-Profile: <PROFILING_TOKEN> (or a PROFILING_SAMPLE_RATE fraction of all
+    # requests) write cProfile stats plus an SQL/Python time split to PROFILING_DIR
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+    PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+    # Seconds a write's Idempotency-Key and stored response are kept for replay
+    IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(24 * 3600)))
+    # Per-process cache of hot groups' ratings, checked against groups.ratings_version
+    RATING_CACHE_ENABLED = os.getenv("RATING_CACHE_ENABLED", "true").lower() == "true"
+    RATING_CACHE_MAX_BYTES = int(os.getenv("RATING_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    # Voiding re-rates the matches after the voided one; older matches are refused
+    MATCH_VOID_WINDOW = int(os.getenv("MATCH_VOID_WINDOW", "1000"))
@@ -0,0 +1,65 @@
+"""Database-specific setup and portable stand-ins for Postgres-only SQL.
+
+A ``sqlite:///path.db`` DATABASE_URL runs the app on an embedded database,
+tuned per connection: WAL journaling so readers never wait on the writer,
+``synchronous=NORMAL`` (durable at checkpoints, safe with WAL), a busy timeout
+instead of immediate "database is locked" errors, memory-mapped reads and
+foreign-key enforcement.
+
+SQLite has no row locks, so ``SELECT ... FOR UPDATE`` compiles to a plain
+select there.  Instead, transactions that may write (non-GET requests, the
+worker and CLI commands) start with ``BEGIN IMMEDIATE`` and take the database
+write lock up front, which serializes writers the way the row locks would
+and rules out the late lock upgrade that makes concurrent SQLite writers fail.
+Read requests keep plain deferred transactions and run alongside the writer.
+"""
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+
+
+# Databases with the upserts used by ``conflict_insert``; checked at startup
+SUPPORTED = ('postgresql', 'sqlite')
+
+
+def conflict_insert(model):
+    """``insert()`` supporting ``on_conflict_do_nothing`` / ``on_conflict_do_update``."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def _writes_expected() -> bool:
+    return not has_request_context() or request.method not in ('GET', 'HEAD', 'OPTIONS')
+
+
+def configure_sqlite(engine, config):
+    pragmas = [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        "PRAGMA foreign_keys=ON",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy's begin event below issue BEGIN instead of pysqlite
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def _on_begin(conn):
+        conn.exec_driver_sql('BEGIN IMMEDIATE' if _writes_expected() else 'BEGIN')
+
+
+def configure_engine(engine, config):
+    if engine.dialect.name not in SUPPORTED:
+        raise ValueError(f'Unsupported DATABASE_URL: {engine.dialect.name} (use postgresql or sqlite)')
+    if engine.dialect.name == 'sqlite':
+        configure_sqlite(engine, config)
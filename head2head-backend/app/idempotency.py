@@ -0,0 +1,92 @@
+"""``Idempotency-Key`` support for group-scoped writes.
+
+A request carrying the header claims the key (per user and group) at the start
+of its transaction by inserting an ``idempotency_keys`` row, and the view
+stores its response in that row right before its own commit, so the key, the
+response and the write's side effects commit or roll back together:
+
+* a repeat after the commit gets the stored response back without running
+  the view again;
+* a concurrent duplicate blocks on the key's unique index until the first
+  request finishes (SQLite serializes writers anyway), then replays its
+  response, or runs itself if the first one failed and rolled back;
+* reusing a key for a different request is rejected with 422.
+
+Failed requests (validation errors, 403s) never commit, so they leave no key
+behind and may be retried with the same key.  Keys expire after
+``IDEMPOTENCY_KEY_TTL`` seconds and are deleted by the worker's maintenance
+pass.
+"""
+import hashlib
+from datetime import datetime, timedelta
+
+from flask import g, request
+
+from app import db
+from app.dialects import conflict_insert
+from app.models import IdempotencyKey
+
+
+MAX_KEY_LENGTH = 255
+
+
+def fingerprint() -> str:
+    """Hash of what the key promises to stand for: method, path and body."""
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode('utf-8'))
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def claim(user_id: int, group_id: int, key: str, ttl: int):
+    """Claim ``key`` in the current transaction.
+
+    Returns ``(row, fresh)``: ``fresh`` is True when this request owns the key
+    and should run; otherwise ``row`` belongs to an earlier request.
+    """
+    now = datetime.utcnow()
+    inserted = db.session.execute(
+        conflict_insert(IdempotencyKey)
+        .values(user_id=user_id, group_id=group_id, key=key, fingerprint=fingerprint(),
+                created_at=now, expires_at=now + timedelta(seconds=ttl))
+        .on_conflict_do_nothing(index_elements=['user_id', 'group_id', 'key'])
+    ).rowcount
+    row = (
+        IdempotencyKey.query
+        .filter_by(user_id=user_id, group_id=group_id, key=key)
+        .with_for_update()
+        .one()
+    )
+    if inserted:
+        return row, True
+    if row.expires_at <= now:
+        # Expired but not swept yet: start over as if the key were new
+        row.fingerprint, row.status_code, row.response, row.headers = fingerprint(), None, None, None
+        row.created_at, row.expires_at = now, now + timedelta(seconds=ttl)
+        return row, True
+    return row, False
+
+
+def remember(status: int, body, headers=None) -> None:
+    """Store the response on the key claimed by this request, if any (call before committing)."""
+    row = g.get('idempotency_key')
+    if row is not None:
+        row.status_code = status
+        row.response = body
+        row.headers = dict(headers) if headers else None
+
+
+def sweep_expired(batch_size: int) -> int:
+    """Delete expired keys in batches of ``batch_size``, committing each; returns the count."""
+    removed = 0
+    while True:
+        ids = [
+            i for (i,) in db.session.query(IdempotencyKey.id)
+            .filter(IdempotencyKey.expires_at <= datetime.utcnow())
+            .limit(batch_size)
+        ]
+        if not ids:
+            db.session.rollback()
+            return removed
+        IdempotencyKey.query.filter(IdempotencyKey.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        removed += len(ids)
@@ -0,0 +1,278 @@
+"""``flask import-matches``: bulk load historical results into a group.
+
+Both input formats carry the same fields, keyed by username:
+
+* ``mode``: ``duel``, ``team`` or ``ffa`` (optional: ``ffa`` when placements
+  are given, else ``duel`` for 1v1 and ``team`` otherwise)
+* ``team_a`` / ``team_b``: usernames of each side
+* ``result``: ``a`` or ``b`` for the winning side, or ``tie``
+* ``placements``: FFA finishing places, username to place (1 = winner)
+* ``score_a`` / ``score_b``: optional scores
+* ``played_at``: optional ISO timestamp; rows are rated in this order
+
+In NDJSON the teams are arrays and placements an object.  In CSV teams are
+``;``-separated and placements read ``alice:1;bob:2``.
+
+Everything is validated up front with bulk queries, matches and participants
+are written with ``COPY`` on Postgres (``executemany`` elsewhere), and the
+ratings and result counters are computed in a single in-memory pass over the
+sorted results, continuing from the group's current values.  When the import
+reaches back before the group's latest match, the counters are then rebuilt
+from the merged history (``stats.backfill``), so streaks and
+``last_played_at`` follow the dates rather than the import.
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import func, text
+
+from app import db
+from app.models import User, Group, Membership, Ranking, Match, MatchParticipant
+from app.matches import MatchError, parse_match, participants, compute_deltas, match_columns, rating_columns, participant_rows
+from app.stats import COUNTERS, StatLine, backfill, outcomes, record_result
+from app.rating_cache import bump_version
+
+
+_IN_CHUNK = 5000
+
+
+def _read_records(path, fmt):
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'ndjson':
+            for lineno, line in enumerate(f, start=1):
+                if line.strip():
+                    yield lineno, json.loads(line)
+            return
+        for lineno, row in enumerate(csv.DictReader(f), start=2):
+            rec = {k: (v or '').strip() for k, v in row.items() if k}
+            rec['team_a'] = [u for u in rec.get('team_a', '').split(';') if u.strip()]
+            rec['team_b'] = [u for u in rec.get('team_b', '').split(';') if u.strip()]
+            placements = {}
+            for item in rec.get('placements', '').split(';'):
+                if item.strip():
+                    name, _, place = item.rpartition(':')
+                    placements[name.strip()] = place.strip()
+            rec['placements'] = placements
+            yield lineno, rec
+
+
+def _usernames(rec):
+    names = set(rec.get('team_a') or []) | set(rec.get('team_b') or [])
+    names.update((rec.get('placements') or {}).keys())
+    return {str(n).strip() for n in names}
+
+
+def _to_payload(rec, ids):
+    """Translate an import record into the API payload ``parse_match`` accepts."""
+    placements = rec.get('placements') or {}
+    team_a = [ids[str(u).strip()] for u in rec.get('team_a') or []]
+    team_b = [ids[str(u).strip()] for u in rec.get('team_b') or []]
+    mode = (rec.get('mode') or '').lower() or ('ffa' if placements else ('duel' if len(team_a) == len(team_b) == 1 else 'team'))
+    result = (rec.get('result') or '').lower()
+    if mode != 'ffa' and result not in ('a', 'b', 'tie'):
+        raise MatchError('result must be a, b or tie')
+    payload = {'score_a': rec.get('score_a') or None, 'score_b': rec.get('score_b') or None}
+    if mode == 'ffa':
+        payload.update(mode='ffa', ranks={ids[str(u).strip()]: p for u, p in placements.items()})
+    elif mode == 'team':
+        payload.update(playersA=team_a, playersB=team_b, tie=result == 'tie', winner_team=2 if result == 'b' else 1)
+    elif mode == 'duel':
+        if len(team_a) != 1 or len(team_b) != 1:
+            raise MatchError('duel needs exactly one player per side')
+        winner, loser = (team_b[0], team_a[0]) if result == 'b' else (team_a[0], team_b[0])
+        payload.update(winner_id=winner, loser_id=loser, tie=result == 'tie')
+    else:
+        raise MatchError(f'unknown mode {mode!r}')
+    return payload
+
+
+def _played_at(rec):
+    value = rec.get('played_at')
+    if not value:
+        return None
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def _allocate_match_ids(n):
+    rows = db.session.execute(
+        text("SELECT nextval(pg_get_serial_sequence('matches', 'id')) FROM generate_series(1, :n)"),
+        {'n': n},
+    )
+    return [r[0] for r in rows]
+
+
+def _copy_rows(table, columns, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(['' if v is None else v for v in row])
+    buf.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+
+
+_RATING_COLUMNS = ['winner_points_before', 'winner_delta', 'loser_points_before', 'loser_delta']
+
+
+def _write_matches(group_id, loaded, applied):
+    """Insert the ``(spec, played_at)`` pairs rated as in ``applied``; returns the participant row count."""
+    match_cols = ['id', 'group_id', 'winner_id', 'loser_id', 'is_tie', 'team_a_score', 'team_b_score', 'created_at',
+                  *_RATING_COLUMNS]
+    match_values = [
+        {'group_id': group_id, 'created_at': played_at, **match_columns(spec),
+         **dict.fromkeys(_RATING_COLUMNS), **rating_columns(spec, before, deltas)}
+        for (spec, played_at), (before, deltas) in zip(loaded, applied)
+    ]
+
+    postgres = db.session.get_bind().dialect.name == 'postgresql'
+    if postgres:
+        match_ids = _allocate_match_ids(len(match_values))
+    else:
+        # Ids are assigned here so participants can reference them; a concurrent
+        # writer taking the same ids makes the insert fail and the import roll back
+        start = db.session.query(func.coalesce(func.max(Match.id), 0)).scalar() + 1
+        match_ids = range(start, start + len(match_values))
+    for values, match_id in zip(match_values, match_ids):
+        values['id'] = match_id
+    if postgres:
+        _copy_rows('matches', match_cols, ([v[c] for c in match_cols] for v in match_values))
+    else:
+        db.session.execute(Match.__table__.insert(), match_values)
+
+    part_values = [
+        (values['id'], uid, team, place, before[uid], deltas[uid], values['created_at'])
+        for values, (spec, _), (before, deltas) in zip(match_values, loaded, applied)
+        for uid, team, place in participant_rows(spec)
+    ]
+    part_cols = ['match_id', 'user_id', 'team', 'place', 'points_before', 'delta', 'created_at']
+    if postgres:
+        _copy_rows('match_participants', part_cols, part_values)
+    elif part_values:
+        db.session.execute(MatchParticipant.__table__.insert(), [dict(zip(part_cols, row)) for row in part_values])
+    return len(part_values)
+
+
+def _apply_ratings(group_id, loaded):
+    """Replay the imported results in memory and write each player's final rating and counters once.
+
+    Returns the ratings written and, per match, the participants' ratings
+    before it and their deltas for ``_write_matches``.
+    """
+    bump_version(group_id)
+    existing = {r.user_id: r for r in Ranking.query.filter_by(group_id=group_id).with_for_update()}
+    points = {uid: int(r.points or 1000) for uid, r in existing.items()}
+    lines = {uid: StatLine.of(r) for uid, r in existing.items()}
+    touched = set()
+    applied = []
+    for spec, played_at in loaded:
+        ids = participants(spec)
+        for uid in ids:
+            points.setdefault(uid, 1000)
+        before = {uid: points[uid] for uid in ids}
+        deltas = compute_deltas(spec, points)
+        applied.append((before, deltas))
+        for uid, delta in deltas.items():
+            points[uid] += delta
+        for uid, outcome in outcomes(spec).items():
+            record_result(lines.setdefault(uid, StatLine()), outcome, played_at)
+        touched.update(ids)
+
+    now = datetime.utcnow()
+    updates = [
+        {'r_id': r.id, 'r_points': points[uid], **{f'r_{c}': v for c, v in lines[uid].values().items()}}
+        for uid, r in existing.items() if uid in touched
+    ]
+    if updates:
+        db.session.execute(
+            Ranking.__table__.update()
+            .where(Ranking.__table__.c.id == db.bindparam('r_id'))
+            .values(points=db.bindparam('r_points'), updated_at=now,
+                    **{c: db.bindparam(f'r_{c}') for c in COUNTERS}),
+            updates,
+        )
+    new = [{'user_id': uid, 'group_id': group_id, 'points': p, 'updated_at': now, **lines[uid].values()}
+           for uid, p in points.items() if uid not in existing]
+    if new:
+        db.session.execute(Ranking.__table__.insert(), new)
+    return len(updates) + len(new), applied
+
+
+@click.command('import-matches')
+@click.argument('group')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Input format (default: from the file extension).')
+@click.option('--skip-invalid', is_flag=True, help='Skip invalid rows instead of aborting the import.')
+def import_matches_command(group, path, fmt, skip_invalid):
+    """Import historical results from PATH into GROUP (id or name)."""
+    started = time.perf_counter()
+    fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    target = Group.query.get(int(group)) if group.isdigit() else Group.query.filter_by(name=group).first()
+    if target is None:
+        raise click.ClickException(f'Group {group!r} not found')
+
+    records = list(_read_records(path, fmt))
+
+    # Resolve every username and membership with a handful of IN queries
+    names = sorted(set().union(*(_usernames(rec) for _, rec in records))) if records else []
+    ids = {}
+    for i in range(0, len(names), _IN_CHUNK):
+        ids.update(db.session.query(User.username, User.id).filter(User.username.in_(names[i:i + _IN_CHUNK])))
+    members = {uid for (uid,) in db.session.query(Membership.user_id).filter(Membership.group_id == target.id)}
+
+    loaded, errors = [], []
+    for lineno, rec in records:
+        try:
+            unknown = sorted(n for n in _usernames(rec) if n not in ids)
+            if unknown:
+                raise MatchError(f"unknown users: {', '.join(unknown)}")
+            spec = parse_match(_to_payload(rec, ids))
+            outsiders = [uid for uid in participants(spec) if uid not in members]
+            if outsiders:
+                raise MatchError(f'User {outsiders[0]} is not a member of this group')
+            loaded.append((spec, _played_at(rec)))
+        except (MatchError, ValueError) as e:
+            errors.append(f'line {lineno}: {e}')
+
+    if errors:
+        for err in errors[:20]:
+            click.echo(err, err=True)
+        if len(errors) > 20:
+            click.echo(f'... and {len(errors) - 20} more', err=True)
+        if not skip_invalid:
+            raise click.ClickException(f'{len(errors)} invalid rows, nothing imported')
+
+    # Undated rows keep their file order after every dated one
+    now = datetime.utcnow()
+    loaded = [(spec, played_at or now) for spec, played_at in loaded]
+    loaded.sort(key=lambda item: item[1])
+
+    n_parts = n_ratings = 0
+    merged = False
+    if loaded:
+        # Rate first: the group lock taken there also orders the new match ids after any live match
+        n_ratings, applied = _apply_ratings(target.id, loaded)
+        latest = db.session.query(func.max(Match.created_at)).filter(Match.group_id == target.id).scalar()
+        n_parts = _write_matches(target.id, loaded, applied)
+        if latest is not None and loaded[0][1] < latest:
+            # Counters were continued as if the import came last; recount them in date order
+            backfill(target.id, current_app.config['EXPORT_CHUNK_SIZE'])
+            merged = True
+    db.session.commit()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    rows = len(loaded) + n_parts
+    click.echo(
+        f'Imported {len(loaded)} matches ({n_parts} participant rows, {n_ratings} ratings updated, '
+        f'{len(errors)} skipped) in {elapsed:.2f}s: {rows / elapsed:,.0f} rows/s'
+    )
+    if merged:
+        click.echo('Imported history predates the latest match: result counters recomputed from the whole history')
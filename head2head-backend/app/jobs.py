@@ -0,0 +1,208 @@
+"""Postgres-backed job queue and the ``flask worker`` command.
+
+Workers claim jobs with ``FOR UPDATE SKIP LOCKED``.  Only the oldest queued
+job of each group is claimable, so while one worker holds a group's head job
+the others skip that group entirely and the group's jobs are applied in the
+order they were submitted.  A job is handled inside the transaction that
+claimed it, which makes its side effects and its status change atomic.
+"""
+import logging
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import func, or_
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import Group, Membership, Ranking, Invite, Match, MatchParticipant, MatchRollup, Job, IdempotencyKey
+from app.matches import MatchError, parse_match, apply_match
+from app.partitions import ensure_partitions
+from app.idempotency import sweep_expired
+
+
+log = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+class JobFailed(Exception):
+    """Permanent failure; the job is marked failed without retrying."""
+
+
+def job_handler(kind):
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def enqueue(kind, group_id=None, payload=None, submitted_by=None) -> Job:
+    job = Job(kind=kind, group_id=group_id, payload=payload, submitted_by=submitted_by, status='queued')
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def job_payload(job: Job) -> dict:
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'group_id': job.group_id,
+        'match_id': job.match_id,
+        'result': job.result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def claim_next(partition=None):
+    """Lock and return the next runnable job, or None.
+
+    ``partition`` is ``(index, count)``; the worker then only sees groups with
+    ``group_id % count == index``.  Jobs without a group go to partition 0.
+    """
+    older = aliased(Job)
+    group_head = (
+        db.session.query(func.min(older.id))
+        .filter(older.group_id == Job.group_id, older.status == 'queued')
+        .scalar_subquery()
+    )
+    q = Job.query.filter(Job.status == 'queued', or_(Job.group_id.is_(None), Job.id == group_head))
+    if partition is not None:
+        index, count = partition
+        in_partition = Job.group_id % count == index
+        q = q.filter(or_(Job.group_id.is_(None), in_partition) if index == 0 else in_partition)
+    return q.order_by(Job.scheduled_at, Job.id).limit(1).with_for_update(skip_locked=True).first()
+
+
+def run_once(partition=None) -> bool:
+    """Process one job; returns False when the queue had nothing runnable."""
+    job = claim_next(partition)
+    if job is None:
+        db.session.rollback()
+        return False
+
+    job_id = job.id
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise JobFailed(f'No handler for job kind {job.kind!r}')
+        # A handler returns False to stay queued (e.g. more batches to go)
+        if handler(job) is False:
+            job.scheduled_at = datetime.utcnow()
+        else:
+            job.attempts = (job.attempts or 0) + 1
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return True
+    except (JobFailed, MatchError) as e:
+        db.session.rollback()
+        _finish_failed(job_id, str(e), permanent=True)
+    except Exception as e:
+        db.session.rollback()
+        log.exception('Job %s failed', job_id)
+        _finish_failed(job_id, repr(e), permanent=False)
+    return True
+
+
+def _finish_failed(job_id, error, permanent):
+    job = Job.query.with_for_update().get(job_id)
+    if job is None:
+        return
+    job.attempts = (job.attempts or 0) + 1
+    job.error = error
+    if permanent or job.attempts >= current_app.config.get('JOB_MAX_ATTEMPTS', 5):
+        job.status = 'failed'
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+@job_handler('record_match')
+def _record_queued_match(job):
+    group = Group.query.get(job.group_id)
+    if group is None:
+        raise JobFailed('Group no longer exists')
+    match, body = apply_match(group, parse_match(job.payload or {}))
+    job.match_id = match.id
+    job.result = body
+
+
+def _delete_batch(model, criterion, size):
+    ids = [i for (i,) in db.session.query(model.id).filter(criterion).limit(size)]
+    if ids:
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+    return len(ids)
+
+
+@job_handler('delete_group')
+def _delete_group_step(job):
+    """Tear a group down one bounded batch per claim, children first.
+
+    Each batch commits on its own, so no step holds locks or session memory
+    proportional to the group's history.
+    """
+    size = current_app.config.get('GROUP_DELETE_BATCH_SIZE', 5000)
+    match_ids = [i for (i,) in db.session.query(Match.id).filter(Match.group_id == job.group_id).limit(size)]
+    if match_ids:
+        MatchParticipant.query.filter(MatchParticipant.match_id.in_(match_ids)).delete(synchronize_session=False)
+        Match.query.filter(Match.id.in_(match_ids)).delete(synchronize_session=False)
+        return False
+    for model in (MatchRollup, Invite, Ranking, Membership, IdempotencyKey):
+        if _delete_batch(model, model.group_id == job.group_id, size):
+            return False
+    group = Group.query.get(job.group_id)
+    if group is not None:
+        db.session.delete(group)
+
+
+def _parse_partition(value):
+    if not value:
+        return None
+    index, _, count = value.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise click.BadParameter('expected INDEX/COUNT with 0 <= INDEX < COUNT')
+    return index, count
+
+
+@click.command('worker')
+@click.option('--partition', default=None, help='Only process groups with group_id % COUNT == INDEX, given as INDEX/COUNT.')
+@click.option('--poll', 'poll_interval', type=float, default=None, help='Seconds to sleep when the queue is empty.')
+@click.option('--once', is_flag=True, help='Drain runnable jobs and exit instead of polling.')
+def worker_command(partition, poll_interval, once):
+    """Process queued jobs (async match recording and other background work)."""
+    partition = _parse_partition(partition)
+    if poll_interval is None:
+        poll_interval = current_app.config.get('WORKER_POLL_INTERVAL', 0.5)
+    click.echo(f'Worker started (partition={partition or "all"})')
+    next_maintenance = 0.0
+    while True:
+        if time.monotonic() >= next_maintenance:
+            _maintenance()
+            next_maintenance = time.monotonic() + current_app.config.get('MAINTENANCE_INTERVAL', 3600)
+        if run_once(partition):
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+def _maintenance():
+    """Periodic housekeeping run by every worker (all steps are idempotent)."""
+    try:
+        with db.engine.begin() as conn:
+            ensure_partitions(conn, current_app.config.get('PARTITION_MONTHS_AHEAD', 3))
+    except Exception:
+        log.exception('Creating upcoming match partitions failed')
+    try:
+        removed = sweep_expired(current_app.config.get('GROUP_DELETE_BATCH_SIZE', 5000))
+        if removed:
+            log.info('Removed %s expired idempotency keys', removed)
+    except Exception:
+        db.session.rollback()
+        log.exception('Sweeping expired idempotency keys failed')
@@ -0,0 +1,385 @@
+"""Match validation and ELO application shared by the API and the job worker.
+
+``parse_match`` turns a ``POST /groups/<id>/matches`` payload into a spec
+without touching the database, ``apply_match`` checks membership, updates the
+rankings and their result counters and adds the ``Match`` rows (with each
+player's rating before the match and the delta applied) to the session.
+Neither commits; the caller owns the transaction.
+"""
+import statistics
+
+from app import db
+from app.dialects import conflict_insert
+from app.models import Membership, Ranking, Match, MatchParticipant
+from app.stats import outcomes, record_result
+from app.rating_cache import Rating, bump_version, base_for_update, write_through
+
+
+K_FACTOR = 32.0
+
+
+class MatchError(Exception):
+    """A payload or membership problem, reported to the client as a 400."""
+
+
+def expected_score(ra: float, rb: float) -> float:
+    """ELO expected score of a player rated ``ra`` against one rated ``rb``."""
+    return 1.0 / (1.0 + 10.0 ** ((rb - ra) / 400.0))
+
+
+def _parse_team_scores(pl):
+    a = pl.get('score_a')
+    b = pl.get('score_b')
+    try:
+        a = int(a) if a is not None else None
+        b = int(b) if b is not None else None
+    except (TypeError, ValueError):
+        raise MatchError('score_a and score_b must be integers')
+    return a, b
+
+
+def parse_match(payload: dict) -> dict:
+    is_tie = bool(
+        payload.get('is_tie')
+        or payload.get('tie')
+        or (isinstance(payload.get('result'), str) and payload.get('result', '').strip().lower() == 'tie')
+    )
+    is_ffa = bool(payload.get('ffa') or payload.get('mode') == 'ffa' or payload.get('free_for_all'))
+    if is_ffa:
+        return _parse_ffa(payload)
+
+    # Teams (arrays) support
+    players_a = payload.get('playersA') or payload.get('team_a') or payload.get('team1') or []
+    players_b = payload.get('playersB') or payload.get('team_b') or payload.get('team2') or []
+    if players_a and players_b:
+        return parse_teams(payload, players_a, players_b, is_tie)
+
+    # Fallback to 1v1 flow
+    if is_tie:
+        p1_id = payload.get('player1_id') if 'player1_id' in payload else payload.get('winner_id')
+        p2_id = payload.get('player2_id') if 'player2_id' in payload else payload.get('loser_id')
+        if not isinstance(p1_id, int) or not isinstance(p2_id, int):
+            raise MatchError('player1_id and player2_id (or winner_id and loser_id) are required for ties')
+        if p1_id == p2_id:
+            raise MatchError('Players must be different for a tie')
+    else:
+        p1_id = payload.get('winner_id')
+        p2_id = payload.get('loser_id')
+        if not isinstance(p1_id, int) or not isinstance(p2_id, int):
+            raise MatchError('winner_id and loser_id are required')
+        if p1_id == p2_id:
+            raise MatchError('Winner and loser must be different')
+    score_a, score_b = _parse_team_scores(payload)
+    return {'mode': 'duel', 'is_tie': is_tie, 'player_a': p1_id, 'player_b': p2_id,
+            'score_a': score_a, 'score_b': score_b}
+
+
+def _parse_ffa(payload):
+    # Collect players and rankings/placements
+    players = payload.get('players') or []
+    ranks_input = payload.get('ranks') or payload.get('placements')
+    ordering = payload.get('ordering')  # list of user_ids in finish order (best to worst)
+    winner_id = payload.get('winner_id')
+
+    # Normalize players list if ranks/ordering provided
+    if not players and isinstance(ranks_input, dict):
+        try:
+            players = [int(k) for k in ranks_input.keys()]
+        except (TypeError, ValueError):
+            raise MatchError('Invalid ranks keys')
+    if not players and isinstance(ordering, list):
+        try:
+            players = [int(x) for x in ordering]
+        except (TypeError, ValueError):
+            raise MatchError('Invalid ordering values')
+
+    # Validate players
+    if not isinstance(players, list) or len(players) < 2:
+        raise MatchError('FFA requires at least 2 participants')
+    try:
+        player_ids = [int(x) for x in players]
+    except (TypeError, ValueError):
+        raise MatchError('players must be an array of user ids')
+    if len(set(player_ids)) != len(player_ids):
+        raise MatchError('Duplicate players in FFA participants')
+
+    # Build rank map: lower number is better (1 = winner). Ties allowed.
+    rank_map = {}
+    if isinstance(ranks_input, dict):
+        # keys may be strings
+        for k, v in ranks_input.items():
+            try:
+                uid = int(k)
+                place = int(v)
+            except (TypeError, ValueError):
+                raise MatchError('ranks must map user_id to integer place')
+            if uid not in player_ids:
+                raise MatchError(f'user {uid} in ranks not in players')
+            if place < 1:
+                raise MatchError('place must be >= 1')
+            rank_map[uid] = place
+        if len(rank_map) != len(player_ids):
+            raise MatchError('ranks must include every player')
+    elif isinstance(ordering, list) and ordering:
+        # assign 1..N
+        try:
+            ordering_ids = [int(x) for x in ordering]
+        except (TypeError, ValueError):
+            raise MatchError('ordering must contain user ids')
+        if set(ordering_ids) != set(player_ids):
+            raise MatchError('ordering must include all players exactly once')
+        for idx, uid in enumerate(ordering_ids, start=1):
+            rank_map[uid] = idx
+    elif winner_id is not None:
+        try:
+            winner_id = int(winner_id)
+        except (TypeError, ValueError):
+            raise MatchError('winner_id must be an integer')
+        if winner_id not in player_ids:
+            raise MatchError('winner_id must be one of players')
+        for uid in player_ids:
+            rank_map[uid] = 1 if uid == winner_id else 2
+    else:
+        raise MatchError('Provide ranks, ordering, or winner_id for FFA')
+
+    return {'mode': 'ffa', 'players': player_ids, 'places': rank_map}
+
+
+def parse_teams(payload, players_a, players_b, is_tie):
+    # Validate arrays
+    if not isinstance(players_a, list) or not isinstance(players_b, list):
+        raise MatchError('playersA and playersB must be arrays of user ids')
+    try:
+        team_a_ids = [int(x) for x in players_a]
+        team_b_ids = [int(x) for x in players_b]
+    except (TypeError, ValueError):
+        raise MatchError('playersA/playersB must contain integers')
+    if len(team_a_ids) == 0 or len(team_b_ids) == 0:
+        raise MatchError('Both teams must have at least one player')
+    if len(set(team_a_ids).intersection(set(team_b_ids))) > 0:
+        raise MatchError('A player cannot be on both teams')
+    if len(team_a_ids) != len(team_b_ids):
+        raise MatchError('Both teams must have the same number of players')
+
+    winner_team = None
+    if not is_tie:
+        # If not tie, determine winner by explicit field
+        winner_team = payload.get('winner_team')
+        if winner_team not in (1, 2, None):
+            raise MatchError('winner_team must be 1 or 2 when using team arrays')
+        if winner_team is None:
+            # Fallback: require explicit since arrays provided
+            raise MatchError('winner_team (1 or 2) is required when using team arrays')
+    score_a, score_b = _parse_team_scores(payload)
+    return {'mode': 'team', 'is_tie': is_tie, 'winner_team': winner_team,
+            'team_a': team_a_ids, 'team_b': team_b_ids,
+            'score_a': score_a, 'score_b': score_b}
+
+
+def participants(spec: dict) -> list:
+    if spec['mode'] == 'ffa':
+        return list(spec['players'])
+    if spec['mode'] == 'team':
+        return spec['team_a'] + spec['team_b']
+    return [spec['player_a'], spec['player_b']]
+
+
+def compute_deltas(spec: dict, points: dict) -> dict:
+    """Rating change per participant given their current ``points``."""
+    k = K_FACTOR
+    if spec['mode'] == 'ffa':
+        # Compute pairwise expected and score averages
+        ids = spec['players']
+        rank_map = spec['places']
+        current = {uid: float(points[uid]) for uid in ids}
+        score = {}
+        exp_avg = {}
+        for i in ids:
+            s = 0.0
+            e = 0.0
+            for j in ids:
+                if i == j:
+                    continue
+                # outcome for i vs j based on places
+                if rank_map[i] < rank_map[j]:
+                    s += 1.0
+                elif rank_map[i] > rank_map[j]:
+                    s += 0.0
+                else:
+                    s += 0.5
+                e += expected_score(current[i], current[j])
+            n_opp = max(1, len(ids) - 1)
+            score[i] = s / n_opp
+            exp_avg[i] = e / n_opp
+        return {uid: int(round(k * (score[uid] - exp_avg[uid]))) for uid in ids}
+
+    if spec['mode'] == 'team':
+        team_a_ids, team_b_ids = spec['team_a'], spec['team_b']
+        # Average team ratings
+        ra = statistics.fmean([points[uid] for uid in team_a_ids])
+        rb = statistics.fmean([points[uid] for uid in team_b_ids])
+        expected_a = expected_score(ra, rb)
+        expected_b = expected_score(rb, ra)
+        if spec['is_tie']:
+            score_a = 0.5
+        else:
+            score_a = 1.0 if spec['winner_team'] == 1 else 0.0
+        score_b = 1.0 - score_a
+        # Compute deltas and distribute per member to keep rating pool balanced
+        per_a = round(k * (score_a - expected_a) / len(team_a_ids))
+        per_b = round(k * (score_b - expected_b) / len(team_b_ids))
+        deltas = {uid: int(per_a) for uid in team_a_ids}
+        deltas.update({uid: int(per_b) for uid in team_b_ids})
+        return deltas
+
+    a, b = spec['player_a'], spec['player_b']
+    ra = float(points[a])
+    rb = float(points[b])
+    expected_a = expected_score(ra, rb)
+    expected_b = expected_score(rb, ra)
+    # Tie: both score 0.5; otherwise player_a is the winner
+    score_a = 0.5 if spec['is_tie'] else 1.0
+    new_ra = round(ra + k * (score_a - expected_a))
+    new_rb = round(rb + k * ((1.0 - score_a) - expected_b))
+    return {a: int(new_ra) - points[a], b: int(new_rb) - points[b]}
+
+
+def check_members(group_id: int, spec: dict) -> None:
+    ids = participants(spec)
+    found = {
+        uid for (uid,) in db.session.query(Membership.user_id)
+        .filter(Membership.group_id == group_id, Membership.user_id.in_(ids))
+    }
+    if spec['mode'] == 'duel':
+        if len(found) != 2:
+            raise MatchError('Both users must be members of the group')
+        return
+    for uid in ids:
+        if uid not in found:
+            raise MatchError(f'User {uid} is not a member of this group')
+
+
+def _load_rankings(group_id, ids):
+    # Row locks keep concurrent writers in one group from losing updates
+    query = Ranking.query.filter(Ranking.group_id == group_id).with_for_update()
+    rankings = {r.user_id: r for r in query.filter(Ranking.user_id.in_(ids))}
+    missing = [uid for uid in ids if uid not in rankings]
+    if missing:
+        # A concurrent first match for the same player inserts the row too
+        db.session.execute(
+            conflict_insert(Ranking)
+            .values([{'user_id': uid, 'group_id': group_id, 'points': 1000} for uid in missing])
+            .on_conflict_do_nothing(index_elements=['user_id', 'group_id'])
+        )
+        rankings.update((r.user_id, r) for r in query.filter(Ranking.user_id.in_(missing)))
+    return rankings
+
+
+def match_columns(spec: dict) -> dict:
+    """Column values of the ``Match`` row recording ``spec`` (minus group and time)."""
+    mode = spec['mode']
+    if mode == 'ffa':
+        rank_map = spec['places']
+        top_place = min(rank_map.values())
+        winners = [uid for uid, plc in rank_map.items() if plc == top_place]
+        return {
+            'winner_id': winners[0] if len(winners) == 1 else None,
+            'loser_id': None,
+            'is_tie': len(winners) != 1,
+            'team_a_score': None,
+            'team_b_score': None,
+        }
+    if mode == 'team':
+        team_a_ids, team_b_ids = spec['team_a'], spec['team_b']
+        a_won = spec['is_tie'] or spec['winner_team'] == 1
+        winner_id, loser_id = (team_a_ids[0], team_b_ids[0]) if a_won else (team_b_ids[0], team_a_ids[0])
+    else:
+        winner_id, loser_id = spec['player_a'], spec['player_b']
+    return {
+        'winner_id': winner_id,
+        'loser_id': loser_id,
+        'is_tie': spec['is_tie'],
+        'team_a_score': spec['score_a'],
+        'team_b_score': spec['score_b'],
+    }
+
+
+def rating_columns(spec: dict, points: dict, deltas: dict) -> dict:
+    """Ratings before the match and deltas stored on a duel's ``Match`` row (empty otherwise)."""
+    if spec['mode'] != 'duel':
+        return {}
+    a, b = spec['player_a'], spec['player_b']
+    return {
+        'winner_points_before': points[a],
+        'winner_delta': deltas[a],
+        'loser_points_before': points[b],
+        'loser_delta': deltas[b],
+    }
+
+
+def participant_rows(spec: dict) -> list:
+    """``(user_id, team, place)`` rows for ``match_participants``; duels store none."""
+    if spec['mode'] == 'ffa':
+        return [(uid, 0, int(spec['places'][uid])) for uid in spec['players']]
+    if spec['mode'] == 'team':
+        return [(uid, 1, None) for uid in spec['team_a']] + [(uid, 2, None) for uid in spec['team_b']]
+    return []
+
+
+def apply_match(group, spec: dict):
+    """Apply a parsed match to ``group``; returns ``(match, response_body)``."""
+    check_members(group.id, spec)
+    ids = participants(spec)
+    # Serializes rating writers in the group and invalidates other workers' caches
+    version = bump_version(group.id)
+    base = base_for_update(group, version)
+    if base is None:
+        rankings = _load_rankings(group.id, ids)
+    else:
+        rankings = {uid: base.get(uid) or Rating() for uid in ids}
+    points = {uid: int(rankings[uid].points or 1000) for uid in ids}
+    deltas = compute_deltas(spec, points)
+    for uid in ids:
+        rankings[uid].points = points[uid] + deltas[uid]
+
+    match = Match(group_id=group.id, **match_columns(spec), **rating_columns(spec, points, deltas))
+    db.session.add(match)
+    db.session.flush()
+    for uid, team, place in participant_rows(spec):
+        db.session.add(MatchParticipant(match_id=match.id, user_id=uid, team=team, place=place,
+                                        points_before=points[uid], delta=deltas[uid], created_at=match.created_at))
+    for uid, outcome in outcomes(spec).items():
+        record_result(rankings[uid], outcome, match.created_at)
+    if base is not None:
+        write_through(base, version, rankings)
+
+    mode = spec['mode']
+    if mode == 'ffa':
+        return match, {
+            'ok': True,
+            'ffa': True,
+            'players': [
+                {'id': uid, 'elo': rankings[uid].points, 'delta': deltas[uid], 'place': int(spec['places'][uid])}
+                for uid in ids
+            ],
+        }
+    if mode == 'team':
+        return match, {
+            'ok': True,
+            'tie': spec['is_tie'],
+            'team_a': [{'id': uid, 'elo': rankings[uid].points} for uid in spec['team_a']],
+            'team_b': [{'id': uid, 'elo': rankings[uid].points} for uid in spec['team_b']],
+        }
+    a, b = spec['player_a'], spec['player_b']
+    if spec['is_tie']:
+        return match, {
+            'ok': True,
+            'tie': True,
+            'player1': {'id': a, 'elo': rankings[a].points},
+            'player2': {'id': b, 'elo': rankings[b].points},
+        }
+    return match, {
+        'ok': True,
+        'winner': {'id': a, 'elo': rankings[a].points},
+        'loser': {'id': b, 'elo': rankings[b].points},
+    }
@@ -1,6 +1,6 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, func
 from app import db
 
 
@@ -16,6 +16,14 @@ class User(db.Model):
     memberships = db.relationship("Membership", back_populates="user", cascade="all, delete-orphan")
     rankings = db.relationship("Ranking", back_populates="user", cascade="all, delete-orphan")
 
+    # Typeahead: a "C" collation index serves both `LIKE 'prefix%'` and the ordered
+    # scan, like text_pattern_ops would. SQLite searches an in-memory index instead
+    __table_args__ = (
+        db.Index(
+            "ix_users_username_lower_prefix", func.lower(username).collate("C"),
+        ).ddl_if(dialect="postgresql"),
+    )
+
     def set_password(self, password: str) -> None:
         self.password_hash = generate_password_hash(password)
 
@@ -32,9 +40,13 @@ class Group(db.Model):
     # Default number of players per team for this group's sport
     default_team_size = db.Column(db.Integer, nullable=False, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Bumped with every change to the group's rankings or members (see app/rating_cache.py)
+    ratings_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
-    memberships = db.relationship("Membership", back_populates="group", cascade="all, delete-orphan")
-    rankings = db.relationship("Ranking", back_populates="group", cascade="all, delete-orphan")
+    # passive_deletes: rely on the ON DELETE CASCADE foreign keys instead of
+    # loading every child row into the session when a group is deleted
+    memberships = db.relationship("Membership", back_populates="group", cascade="all, delete-orphan", passive_deletes=True)
+    rankings = db.relationship("Ranking", back_populates="group", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Membership(db.Model):
@@ -59,17 +71,28 @@ class Ranking(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    group_id = db.Column(db.Integer, db.ForeignKey("groups.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Indexed by ix_rankings_group_id_points below
+    group_id = db.Column(db.Integer, db.ForeignKey("groups.id", ondelete="CASCADE"), nullable=False)
     rank = db.Column(db.Integer, nullable=True)
     # Use `points` as the ELO rating for simplicity; default 1000
     points = db.Column(db.Integer, nullable=False, default=1000)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # Result counters updated with `points` (see app/stats.py)
+    games = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    wins = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    losses = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    ties = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Consecutive wins when positive, consecutive losses when negative, 0 after a tie
+    streak = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_played_at = db.Column(db.DateTime, nullable=True)
 
     user = db.relationship("User", back_populates="rankings")
     group = db.relationship("Group", back_populates="rankings")
 
     __table_args__ = (
         UniqueConstraint("user_id", "group_id", name="uq_ranking_user_group"),
+        # A group's rankings, and those above a given player for their rank in `GET /my/groups`
+        db.Index("ix_rankings_group_id_points", "group_id", "points"),
     )
 
 
@@ -101,8 +124,21 @@ class Match(db.Model):
     # Optional scores for team/duel matches
     team_a_score = db.Column(db.Integer, nullable=True)
     team_b_score = db.Column(db.Integer, nullable=True)
+    # Duel players' ratings before the match and the deltas applied (see app/voiding.py);
+    # other modes keep theirs on the participant rows. Null for matches recorded earlier
+    winner_points_before = db.Column(db.Integer, nullable=True)
+    winner_delta = db.Column(db.Integer, nullable=True)
+    loser_points_before = db.Column(db.Integer, nullable=True)
+    loser_delta = db.Column(db.Integer, nullable=True)
+    # Partition key when `flask partitions migrate` has been run on Postgres
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        db.Index("ix_matches_group_id_created_at", "group_id", "created_at"),
+        # Matches rated after a given one, in the order they were applied
+        db.Index("ix_matches_group_id_id", "group_id", "id"),
+    )
+
 
 class MatchParticipant(db.Model):
     __tablename__ = "match_participants"
@@ -114,7 +150,81 @@ class MatchParticipant(db.Model):
     team = db.Column(db.Integer, nullable=False, default=0)
     # Finishing place for FFA modes (1 = winner). Null for team/duel modes
     place = db.Column(db.Integer, nullable=True)
+    # Rating before the match and the delta applied
+    points_before = db.Column(db.Integer, nullable=True)
+    delta = db.Column(db.Integer, nullable=True)
+    # Copy of the match's created_at so participants partition alongside their match
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     __table_args__ = (
         UniqueConstraint("match_id", "user_id", name="uq_match_participant_user"),
     )
+
+
+class MatchRollup(db.Model):
+    """Per-player monthly totals kept after old match partitions are condensed."""
+    __tablename__ = "match_rollups"
+
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey("groups.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # First day of the month the totals cover
+    month = db.Column(db.Date, nullable=False)
+    games = db.Column(db.Integer, nullable=False, default=0)
+    wins = db.Column(db.Integer, nullable=False, default=0)
+    losses = db.Column(db.Integer, nullable=False, default=0)
+    ties = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("group_id", "user_id", "month", name="uq_match_rollup_group_user_month"),
+    )
+
+
+class Job(db.Model):
+    """Durable work queue processed by ``flask worker``.
+
+    Jobs sharing a ``group_id`` are applied strictly in id order; see app/jobs.py.
+    """
+    __tablename__ = "jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    # Plain column rather than a foreign key: a job may outlive its group
+    group_id = db.Column(db.Integer, nullable=True)
+    submitted_by = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    payload = db.Column(db.JSON, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    match_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Claim order across groups; multi-step jobs move to the back after each step
+    scheduled_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_jobs_status_group_id", "status", "group_id", "id"),
+    )
+
+
+class IdempotencyKey(db.Model):
+    """Response stored for a write sent with an ``Idempotency-Key``; see app/idempotency.py."""
+    __tablename__ = "idempotency_keys"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Plain column like Job.group_id: the key is claimed before the view looks the group up
+    group_id = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # Null until the request that claimed the key commits its response
+    status_code = db.Column(db.Integer, nullable=True)
+    response = db.Column(db.JSON, nullable=True)
+    headers = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "group_id", "key", name="uq_idempotency_key_user_group_key"),
+    )
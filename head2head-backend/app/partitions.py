@@ -0,0 +1,259 @@
+"""Monthly range partitioning of match history on Postgres.
+
+``flask partitions migrate`` converts ``matches`` and ``match_participants``
+into tables partitioned by ``created_at`` month (participants carry a copy of
+their match's ``created_at`` for this).  ``flask worker`` keeps partitions
+created ahead of time, and ``flask partitions rollup`` condenses partitions
+past a configurable age into per-group, per-player ``match_rollups`` rows and
+detaches them, so history and activity queries only scan recent months.
+
+SQLite and unconverted Postgres databases keep plain tables.  Participants'
+``created_at`` exists on every database regardless; ``flask upgrade-schema``
+adds and fills it on databases created before it.
+"""
+import re
+from datetime import date, datetime
+
+import click
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+
+
+TABLES = ('matches', 'match_participants')
+
+# Constraints and indexes that CREATE TABLE ... (LIKE ...) does not copy.  Unique
+# keys must include the partition key, hence (id, created_at).
+_CONSTRAINTS = [
+    "ALTER TABLE matches ADD CONSTRAINT matches_pkey PRIMARY KEY (id, created_at)",
+    "ALTER TABLE matches ADD CONSTRAINT matches_group_id_fkey FOREIGN KEY (group_id) REFERENCES groups (id) ON DELETE CASCADE",
+    "ALTER TABLE matches ADD CONSTRAINT matches_winner_id_fkey FOREIGN KEY (winner_id) REFERENCES users (id) ON DELETE SET NULL",
+    "ALTER TABLE matches ADD CONSTRAINT matches_loser_id_fkey FOREIGN KEY (loser_id) REFERENCES users (id) ON DELETE SET NULL",
+    "CREATE INDEX ix_matches_group_id ON matches (group_id)",
+    "CREATE INDEX ix_matches_group_id_created_at ON matches (group_id, created_at)",
+    "CREATE INDEX ix_matches_group_id_id ON matches (group_id, id)",
+    "CREATE INDEX ix_matches_winner_id ON matches (winner_id)",
+    "CREATE INDEX ix_matches_loser_id ON matches (loser_id)",
+    "ALTER TABLE match_participants ADD CONSTRAINT match_participants_pkey PRIMARY KEY (id, created_at)",
+    "ALTER TABLE match_participants ADD CONSTRAINT match_participants_match_id_fkey "
+    "FOREIGN KEY (match_id, created_at) REFERENCES matches (id, created_at) ON DELETE CASCADE",
+    "ALTER TABLE match_participants ADD CONSTRAINT match_participants_user_id_fkey "
+    "FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE",
+    "ALTER TABLE match_participants ADD CONSTRAINT uq_match_participant_user UNIQUE (match_id, user_id, created_at)",
+    "CREATE INDEX ix_match_participants_match_id ON match_participants (match_id)",
+    "CREATE INDEX ix_match_participants_user_id ON match_participants (user_id)",
+]
+
+_ROLLUP_SQL = """
+WITH scoped AS (
+    SELECT id, group_id, winner_id, loser_id, is_tie, created_at
+    FROM matches
+    WHERE created_at >= :start AND created_at < :end
+),
+duels AS (
+    SELECT s.* FROM scoped s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM match_participants p WHERE p.match_id = s.id AND p.created_at = s.created_at
+    )
+),
+outcomes AS (
+    -- Duels keep their two players on the match row
+    SELECT group_id, winner_id AS user_id, CASE WHEN is_tie THEN 'tie' ELSE 'win' END AS outcome
+    FROM duels WHERE winner_id IS NOT NULL
+    UNION ALL
+    SELECT group_id, loser_id, CASE WHEN is_tie THEN 'tie' ELSE 'loss' END
+    FROM duels WHERE loser_id IS NOT NULL
+    UNION ALL
+    -- FFA: best place wins (ties share it); teams: the winner_id's team wins
+    SELECT s.group_id, p.user_id,
+        CASE
+            WHEN p.team = 0 AND p.place > (
+                SELECT min(q.place) FROM match_participants q
+                WHERE q.match_id = s.id AND q.created_at = s.created_at
+            ) THEN 'loss'
+            WHEN s.is_tie THEN 'tie'
+            WHEN p.team = 0 THEN 'win'
+            WHEN p.team = (
+                SELECT q.team FROM match_participants q
+                WHERE q.match_id = s.id AND q.created_at = s.created_at AND q.user_id = s.winner_id
+            ) THEN 'win'
+            ELSE 'loss'
+        END
+    FROM scoped s
+    JOIN match_participants p ON p.match_id = s.id AND p.created_at = s.created_at
+)
+INSERT INTO match_rollups (group_id, user_id, month, games, wins, losses, ties)
+SELECT group_id, user_id, :start, count(*),
+       count(*) FILTER (WHERE outcome = 'win'),
+       count(*) FILTER (WHERE outcome = 'loss'),
+       count(*) FILTER (WHERE outcome = 'tie')
+FROM outcomes
+GROUP BY group_id, user_id
+ON CONFLICT (group_id, user_id, month) DO UPDATE SET
+    games = match_rollups.games + EXCLUDED.games,
+    wins = match_rollups.wins + EXCLUDED.wins,
+    losses = match_rollups.losses + EXCLUDED.losses,
+    ties = match_rollups.ties + EXCLUDED.ties
+"""
+
+
+def month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, n: int) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f'{table}_y{month.year}m{month.month:02d}'
+
+
+def is_partitioned(conn, table='matches') -> bool:
+    if conn.dialect.name != 'postgresql':
+        return False
+    return bool(conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:t)"), {'t': table}
+    ).scalar())
+
+
+def partition_months(conn, table='matches') -> list:
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t)"
+    ), {'t': table}).scalars()
+    pattern = re.compile(rf'^{table}_y(\d{{4}})m(\d{{2}})$')
+    months = []
+    for name in names:
+        m = pattern.match(name)
+        if m:
+            months.append(date(int(m.group(1)), int(m.group(2)), 1))
+    return sorted(months)
+
+
+def _create_partitions(conn, first: date, last: date, suffix=''):
+    created = []
+    month = first
+    while month <= last:
+        for table in TABLES:
+            name = partition_name(table, month)
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table}{suffix} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_partitions(conn, months_ahead: int) -> list:
+    """Create partitions from the current month through ``months_ahead`` months out."""
+    if not is_partitioned(conn):
+        return []
+    this_month = month_start(datetime.utcnow())
+    return _create_partitions(conn, this_month, add_months(this_month, months_ahead))
+
+
+def convert(conn, months_ahead: int) -> bool:
+    """Rebuild ``matches`` and ``match_participants`` as partitioned tables in one transaction."""
+    if conn.dialect.name != 'postgresql':
+        raise click.ClickException('Partitioning requires Postgres')
+    if is_partitioned(conn):
+        return False
+
+    conn.execute(text("LOCK TABLE matches, match_participants IN ACCESS EXCLUSIVE MODE"))
+    # Participants inherit their match's timestamp as the partition key
+    conn.execute(text("ALTER TABLE match_participants ADD COLUMN IF NOT EXISTS created_at timestamp without time zone"))
+    conn.execute(text(
+        "UPDATE match_participants p SET created_at = m.created_at FROM matches m "
+        "WHERE m.id = p.match_id AND p.created_at IS DISTINCT FROM m.created_at"
+    ))
+    conn.execute(text("ALTER TABLE match_participants ALTER COLUMN created_at SET NOT NULL"))
+
+    sequences = {}
+    for table in TABLES:
+        seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': table}).scalar()
+        sequences[table] = seq
+        # Keep the id sequence alive when the old table is dropped
+        conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY NONE"))
+        conn.execute(text(f"CREATE TABLE {table}_p (LIKE {table} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"))
+        conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table}_p DEFAULT"))
+
+    oldest = conn.execute(text("SELECT min(created_at) FROM matches")).scalar() or datetime.utcnow()
+    this_month = month_start(datetime.utcnow())
+    _create_partitions(conn, month_start(oldest), add_months(this_month, months_ahead), suffix='_p')
+
+    for table in TABLES:
+        conn.execute(text(f"INSERT INTO {table}_p SELECT * FROM {table}"))
+    conn.execute(text("DROP TABLE match_participants"))
+    conn.execute(text("DROP TABLE matches"))
+    for table in TABLES:
+        conn.execute(text(f"ALTER TABLE {table}_p RENAME TO {table}"))
+    for stmt in _CONSTRAINTS:
+        conn.execute(text(stmt))
+    for table, seq in sequences.items():
+        conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {table}.id"))
+    return True
+
+
+def rollup(conn, before: date, keep_detached=False) -> list:
+    """Condense every monthly partition ending on or before ``before``."""
+    if not is_partitioned(conn):
+        return []
+    done = []
+    for month in partition_months(conn):
+        if add_months(month, 1) > before:
+            continue
+        conn.execute(text(_ROLLUP_SQL), {'start': month, 'end': add_months(month, 1)})
+        parts, matches = partition_name('match_participants', month), partition_name('matches', month)
+        conn.execute(text(f"ALTER TABLE match_participants DETACH PARTITION {parts}"))
+        if keep_detached:
+            # The detached copy must stop referencing rows that are about to leave `matches`
+            conn.execute(text(f"ALTER TABLE {parts} DROP CONSTRAINT IF EXISTS match_participants_match_id_fkey"))
+        else:
+            conn.execute(text(f"DROP TABLE {parts}"))
+        conn.execute(text(f"ALTER TABLE matches DETACH PARTITION {matches}"))
+        if not keep_detached:
+            conn.execute(text(f"DROP TABLE {matches}"))
+        done.append(month)
+    return done
+
+
+@click.group('partitions')
+def partitions_cli():
+    """Manage monthly partitions of match history (Postgres only)."""
+
+
+@partitions_cli.command('migrate')
+@click.option('--months-ahead', type=int, default=None, help='Future months to create partitions for.')
+def migrate_command(months_ahead):
+    """Convert matches and match_participants to partitioned tables."""
+    months_ahead = current_app.config['PARTITION_MONTHS_AHEAD'] if months_ahead is None else months_ahead
+    with db.engine.begin() as conn:
+        changed = convert(conn, months_ahead)
+    click.echo('Converted match history to monthly partitions' if changed else 'Already partitioned')
+
+
+@partitions_cli.command('ensure')
+@click.option('--months-ahead', type=int, default=None, help='Future months to create partitions for.')
+def ensure_command(months_ahead):
+    """Create any missing partitions for the coming months."""
+    months_ahead = current_app.config['PARTITION_MONTHS_AHEAD'] if months_ahead is None else months_ahead
+    with db.engine.begin() as conn:
+        created = ensure_partitions(conn, months_ahead)
+    click.echo(f'{len(created)} partitions checked')
+
+
+@partitions_cli.command('rollup')
+@click.option('--older-than-months', type=int, default=None, help='Age in months past which partitions are condensed.')
+@click.option('--keep-detached', is_flag=True, help='Detach condensed partitions instead of dropping them.')
+def rollup_command(older_than_months, keep_detached):
+    """Fold old partitions into match_rollups and detach them."""
+    if older_than_months is None:
+        older_than_months = current_app.config['PARTITION_ROLLUP_AFTER_MONTHS']
+    before = add_months(month_start(datetime.utcnow()), -older_than_months)
+    with db.engine.begin() as conn:
+        months = rollup(conn, before, keep_detached=keep_detached)
+    click.echo(f"Rolled up {len(months)} months: {', '.join(m.strftime('%Y-%m') for m in months) or 'none'}")
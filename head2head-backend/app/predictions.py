@@ -0,0 +1,184 @@
+"""Matchup predictions and the per-group win-probability matrix.
+
+The matrix is computed with numpy in one broadcast over the group's ratings
+and cached per process as encoded JSON, keyed by ``groups.ratings_version``.
+Every change to the group's rankings or members bumps it (see
+app/rating_cache.py), so a stale matrix is never served and an unchanged
+group is never rebuilt.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from flask import current_app
+
+from app import db
+from app.models import User, Membership, Ranking
+from app.matches import MatchError, parse_teams, compute_deltas, expected_score
+
+
+def parse_matchup(payload: dict) -> dict:
+    """Like ``parse_match`` but for a game that has not been played yet."""
+    if payload.get('ffa') or payload.get('mode') == 'ffa' or payload.get('free_for_all'):
+        players = payload.get('players') or []
+        if not isinstance(players, list) or len(players) < 2:
+            raise MatchError('FFA requires at least 2 participants')
+        try:
+            player_ids = [int(x) for x in players]
+        except (TypeError, ValueError):
+            raise MatchError('players must be an array of user ids')
+        if len(set(player_ids)) != len(player_ids):
+            raise MatchError('Duplicate players in FFA participants')
+        return {'mode': 'ffa', 'players': player_ids}
+
+    players_a = payload.get('playersA') or payload.get('team_a') or payload.get('team1') or []
+    players_b = payload.get('playersB') or payload.get('team_b') or payload.get('team2') or []
+    if players_a and players_b:
+        # Parsed as a tie so no winner_team is required
+        return parse_teams(payload, players_a, players_b, True)
+
+    p1_id = payload.get('player1_id') if 'player1_id' in payload else payload.get('winner_id')
+    p2_id = payload.get('player2_id') if 'player2_id' in payload else payload.get('loser_id')
+    if not isinstance(p1_id, int) or not isinstance(p2_id, int):
+        raise MatchError('player1_id and player2_id are required')
+    if p1_id == p2_id:
+        raise MatchError('Players must be different')
+    return {'mode': 'duel', 'is_tie': True, 'player_a': p1_id, 'player_b': p2_id, 'score_a': None, 'score_b': None}
+
+
+def _outcome_deltas(spec, points, me_first, tie):
+    """Deltas if the first side (``me_first``) wins, or of a tie."""
+    return compute_deltas(dict(spec, is_tie=tie, winner_team=1 if me_first else 2), points)
+
+
+def predict(spec: dict, points: dict) -> dict:
+    """Win probabilities and projected rating changes for every outcome."""
+    if spec['mode'] == 'duel':
+        a, b = spec['player_a'], spec['player_b']
+        players = []
+        for me, other in ((a, b), (b, a)):
+            base = dict(spec, player_a=me, player_b=other)
+            players.append({
+                'id': me,
+                'elo': points[me],
+                'win_probability': round(expected_score(points[me], points[other]), 4),
+                'delta_if_win': compute_deltas(dict(base, is_tie=False), points)[me],
+                'delta_if_tie': compute_deltas(dict(base, is_tie=True), points)[me],
+                'delta_if_loss': compute_deltas(dict(base, is_tie=False, player_a=other, player_b=me), points)[me],
+            })
+        return {'mode': 'duel', 'players': players}
+
+    if spec['mode'] == 'team':
+        sides = (spec['team_a'], spec['team_b'])
+        elo = [sum(points[uid] for uid in side) / len(side) for side in sides]
+        win, tie, loss = (_outcome_deltas(spec, points, True, False),
+                          _outcome_deltas(spec, points, False, True),
+                          _outcome_deltas(spec, points, False, False))
+        teams = []
+        for idx, side in enumerate(sides):
+            lead = side[0]
+            won, lost = (win, loss) if idx == 0 else (loss, win)
+            teams.append({
+                'players': [{'id': uid, 'elo': points[uid]} for uid in side],
+                'elo': round(elo[idx], 1),
+                'win_probability': round(expected_score(elo[idx], elo[1 - idx]), 4),
+                'delta_if_win': won[lead],
+                'delta_if_tie': tie[lead],
+                'delta_if_loss': lost[lead],
+            })
+        return {'mode': 'team', 'teams': teams}
+
+    ids = spec['players']
+    players = []
+    for me in ids:
+        first = {uid: 1 if uid == me else 2 for uid in ids}
+        last = {uid: 2 if uid == me else 1 for uid in ids}
+        players.append({
+            'id': me,
+            'elo': points[me],
+            'expected_score': round(sum(expected_score(points[me], points[o]) for o in ids if o != me) / (len(ids) - 1), 4),
+            'delta_if_first': compute_deltas({'mode': 'ffa', 'players': ids, 'places': first}, points)[me],
+            'delta_if_last': compute_deltas({'mode': 'ffa', 'players': ids, 'places': last}, points)[me],
+        })
+    return {'mode': 'ffa', 'players': players}
+
+
+def win_probabilities(ratings) -> np.ndarray:
+    """``m[i, j]`` is the probability that player ``i`` beats player ``j``."""
+    r = np.asarray(ratings, dtype=np.float64)
+    return 1.0 / (1.0 + 10.0 ** ((r[np.newaxis, :] - r[:, np.newaxis]) / 400.0))
+
+
+class MatrixCache:
+    """LRU of encoded matrices bounded by total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, group_id, version):
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(group_id)
+            return entry[1]
+
+    def put(self, group_id, version, body):
+        with self._lock:
+            old = self._entries.pop(group_id, None)
+            if old is not None:
+                self._size -= len(old[1])
+            if len(body) > self.max_bytes:
+                return
+            self._entries[group_id] = (version, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+def matrix_version(group) -> str:
+    """ETag and cache key for the group's matrix; changes with ``ratings_version``."""
+    # created_at tells a new group apart from a deleted one whose id SQLite reused
+    raw = f'{group.id}:{group.created_at.isoformat()}:{group.ratings_version}'
+    return hashlib.sha1(raw.encode('ascii')).hexdigest()
+
+
+def _cache() -> MatrixCache:
+    ext = current_app.extensions
+    if 'prediction_cache' not in ext:
+        ext['prediction_cache'] = MatrixCache(current_app.config.get('PREDICTION_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    return ext['prediction_cache']
+
+
+def group_matrix(group):
+    """Return ``(version, json_bytes)`` for the group's probability matrix."""
+    group_id = group.id
+    version = matrix_version(group)
+    cache = _cache()
+    body = cache.get(group_id, version)
+    if body is not None:
+        return version, body
+
+    rows = (
+        db.session.query(User.id, User.username, Ranking.points)
+        .join(Membership, Membership.user_id == User.id)
+        .outerjoin(Ranking, (Ranking.user_id == User.id) & (Ranking.group_id == group_id))
+        .filter(Membership.group_id == group_id)
+        .order_by(User.id)
+        .all()
+    )
+    elo = [p if p is not None else 1000 for (_, _, p) in rows]
+    matrix = np.round(win_probabilities(elo), 4) if rows else np.zeros((0, 0))
+    body = json.dumps({
+        'ok': True,
+        'players': [{'id': uid, 'username': uname, 'elo': e} for (uid, uname, _), e in zip(rows, elo)],
+        'matrix': matrix.tolist(),
+    }, separators=(',', ':')).encode('utf-8')
+    cache.put(group_id, version, body)
+    return version, body
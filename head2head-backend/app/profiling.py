@@ -0,0 +1,130 @@
+"""Opt-in per-request profiling.
+
+With ``PROFILING_ENABLED`` a request is profiled when it carries
+``X-Profile: <PROFILING_TOKEN>`` or is picked by ``PROFILING_SAMPLE_RATE``.
+Its cProfile stats are written to ``PROFILING_DIR`` as a ``.prof`` file
+(load with ``pstats``, snakeviz, or ``flameprof``/``gprof2dot`` for flame
+graphs) named after the endpoint, group id, query count and duration, next to
+a ``.json`` summary splitting wall time between SQL and Python.  The response
+gets a ``Server-Timing`` header with the same split.
+
+When disabled no hooks are installed at all.  Streamed bodies are produced
+after the view returns and are not included.
+"""
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import time
+from datetime import datetime
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+
+class _RequestProfile:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+
+    def stop(self):
+        self.profile.disable()
+        self.wall = time.perf_counter() - self.wall
+        self.cpu = time.thread_time() - self.cpu
+
+
+def _current():
+    return g.get('_profile') if has_request_context() else None
+
+
+class Profiler:
+    """Flask extension profiling selected requests."""
+
+    def init_app(self, app):
+        if not app.config.get('PROFILING_ENABLED'):
+            return
+        self.directory = app.config['PROFILING_DIR']
+        self.token = app.config.get('PROFILING_TOKEN') or ''
+        self.sample_rate = app.config.get('PROFILING_SAMPLE_RATE', 0.0)
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['profiler'] = self
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        from app import db
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_query)
+            event.listen(db.engine, 'after_cursor_execute', self._after_query)
+
+    def _wanted(self) -> bool:
+        header = request.headers.get('X-Profile')
+        if header and self.token and hmac.compare_digest(header, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _start(self):
+        if not self._wanted():
+            return
+        prof = _RequestProfile()
+        try:
+            prof.profile.enable()
+        except ValueError:
+            # Another profiler is already active on this interpreter
+            return
+        g._profile = prof
+
+    def _before_query(self, conn, cursor, statement, parameters, context, executemany):
+        prof = _current()
+        if prof is not None:
+            conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+    def _after_query(self, conn, cursor, statement, parameters, context, executemany):
+        prof = _current()
+        starts = conn.info.get('profile_query_start')
+        if prof is not None and starts:
+            prof.sql_time += time.perf_counter() - starts.pop()
+            prof.queries += 1
+
+    def _finish(self, response):
+        prof = g.pop('_profile', None)
+        if prof is None:
+            return response
+        prof.stop()
+        wall_ms, sql_ms, cpu_ms = prof.wall * 1000, prof.sql_time * 1000, prof.cpu * 1000
+        group_id = (request.view_args or {}).get('group_id')
+        endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', request.endpoint or 'unknown')
+        name = (
+            f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S.%f')}_{endpoint}"
+            f"_g{group_id if group_id is not None else '-'}_q{prof.queries}_{wall_ms:.0f}ms"
+        )
+        path = os.path.join(self.directory, name)
+        prof.profile.dump_stats(path + '.prof')
+        with open(path + '.json', 'w') as f:
+            json.dump({
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.path,
+                'group_id': group_id,
+                'status': response.status_code,
+                'queries': prof.queries,
+                'wall_ms': round(wall_ms, 3),
+                'cpu_ms': round(cpu_ms, 3),
+                'sql_ms': round(sql_ms, 3),
+                'python_ms': round(wall_ms - sql_ms, 3),
+            }, f, indent=2)
+        response.headers['Server-Timing'] = (
+            f'sql;dur={sql_ms:.1f}, python;dur={wall_ms - sql_ms:.1f}, cpu;dur={cpu_ms:.1f}, total;dur={wall_ms:.1f}'
+        )
+        response.headers['X-Profile-Id'] = name
+        return response
+
+    def _teardown(self, exc):
+        # after_request is skipped when the view raised
+        prof = g.pop('_profile', None)
+        if prof is not None:
+            prof.profile.disable()
@@ -0,0 +1,198 @@
+"""Admission control for write endpoints.
+
+Two independent guards are applied by ``RateLimiter.limit``:
+
+* a token bucket per (route, user, group), refilled continuously at the rate
+  configured for the route, answering ``429`` when the caller is out of tokens;
+* a per-process cap on concurrently executing write handlers, answering ``503``
+  when no slot frees up quickly, so a write spike cannot take every worker
+  thread and pooled connection away from the read endpoints.
+
+Buckets live in process memory by default.  Set ``RATELIMIT_STORAGE_URL`` to a
+``redis://`` URL to share them between workers, or assign any object with a
+``take(key, capacity, rate, now)`` method to ``RATELIMIT_STORAGE``.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify
+
+
+_UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_rate(value):
+    """Parse ``"30/minute"`` into ``(capacity, tokens_per_second)``.
+
+    Returns ``None`` for an empty or zero rate, which disables the limit.
+    """
+    value = (value or '').strip().lower()
+    if not value:
+        return None
+    count, _, unit = value.partition('/')
+    count = int(count)
+    if count <= 0:
+        return None
+    period = _UNITS.get(unit.strip().rstrip('s') or 'second')
+    if period is None:
+        raise ValueError(f'Unknown rate unit in {value!r}')
+    return count, count / period
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict guarded by a lock; state is per process."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        """Take one token; return 0 on success, else seconds until one is available."""
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - stamp) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return wait
+
+    def _prune(self, now):
+        # Buckets idle for an hour have refilled for any sane route rate
+        for k, (_, stamp) in list(self._buckets.items()):
+            if now - stamp > 3600:
+                del self._buckets[k]
+        if len(self._buckets) > self.max_keys:
+            oldest = sorted(self._buckets.items(), key=lambda kv: kv[1][1])
+            for k, _ in oldest[:len(self._buckets) - self.max_keys]:
+                del self._buckets[k]
+
+
+class RedisBucketStore:
+    """Token buckets shared by every worker through Redis.
+
+    The refill-and-take step runs as one Lua script so concurrent workers
+    never double-spend a token.
+    """
+
+    SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(state[1]) or capacity
+local stamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+    def __init__(self, client, prefix='h2h:rl:'):
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    @classmethod
+    def from_url(cls, url):
+        try:
+            import redis
+        except ImportError as e:  # pragma: no cover - optional dependency
+            raise RuntimeError('RATELIMIT_STORAGE_URL points at Redis but the redis package is not installed') from e
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, key, capacity, rate, now):
+        wait = self._script(keys=[self.prefix + key], args=[capacity, rate, now])
+        return float(wait)
+
+
+def _store_from_config(config):
+    store = config.get('RATELIMIT_STORAGE')
+    if store is not None:
+        return store
+    url = config.get('RATELIMIT_STORAGE_URL') or 'memory://'
+    if url.startswith('memory://'):
+        return MemoryBucketStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBucketStore.from_url(url)
+    raise ValueError(f'Unsupported RATELIMIT_STORAGE_URL: {url}')
+
+
+class _AdmissionState:
+    def __init__(self, app):
+        self.enabled = app.config.get('RATELIMIT_ENABLED', True)
+        self.store = _store_from_config(app.config)
+        slots = int(app.config.get('WRITE_CONCURRENCY_LIMIT') or 0)
+        self.write_slots = threading.BoundedSemaphore(slots) if slots > 0 else None
+        self.queue_timeout = float(app.config.get('WRITE_QUEUE_TIMEOUT_MS', 250)) / 1000.0
+        self.rates = {}
+
+    def rate_for(self, config_key):
+        if config_key not in self.rates:
+            self.rates[config_key] = parse_rate(current_app.config.get(config_key))
+        return self.rates[config_key]
+
+
+def _rejected(status, error, retry_after):
+    resp = jsonify({'ok': False, 'error': error})
+    resp.status_code = status
+    resp.headers['Retry-After'] = str(max(1, int(math.ceil(retry_after))))
+    return resp
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['ratelimit'] = _AdmissionState(app)
+
+    def limit(self, config_key, key_func):
+        """Guard a write view with the rate named by ``config_key``.
+
+        ``key_func`` returns ``(user_id, group_id)`` for the current request;
+        anonymous requests (``user_id`` of ``None``) skip the bucket and are
+        left for the view to reject.
+        """
+        def decorator(view):
+            name = view.__name__
+
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                state = current_app.extensions['ratelimit']
+                if not state.enabled:
+                    return view(*args, **kwargs)
+
+                rate = state.rate_for(config_key)
+                if rate is not None:
+                    user_id, group_id = key_func()
+                    if user_id is not None:
+                        capacity, per_second = rate
+                        wait = state.store.take(f'{name}:{user_id}:{group_id}', capacity, per_second, time.time())
+                        if wait > 0:
+                            return _rejected(429, 'Too many requests', wait)
+
+                if state.write_slots is None:
+                    return view(*args, **kwargs)
+                if not state.write_slots.acquire(timeout=state.queue_timeout):
+                    return _rejected(503, 'Server busy, retry shortly', 1)
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    state.write_slots.release()
+
+            return wrapped
+        return decorator
@@ -0,0 +1,280 @@
+"""Per-process write-through cache of each hot group's ratings and counters.
+
+Every change to a group's ``rankings`` or members first bumps
+``groups.ratings_version`` (``bump_version``), in the same transaction.  The bump takes the group row's
+lock, so writers in a group are serialized and the version names exactly one
+state of the group's rankings, across all workers.
+
+A process keeps immutable ``GroupRatings`` snapshots (user ids and counters in
+parallel numpy arrays, ~40 bytes per member) in an LRU bounded by bytes:
+
+* reads (leaderboards, predictions, team generation) use the snapshot whose
+  version matches the group row they already loaded, loading it on a miss;
+  snapshots also carry the group's ``created_at``, because SQLite reuses the
+  id of a deleted group and the new group's versions start over;
+* ``apply_match`` takes its base ratings from the snapshot at the version it
+  just bumped from, upserts the participants' rows, and publishes the new
+  snapshot to the cache once the transaction commits (nothing on rollback).
+
+A stale snapshot is never served: another worker's write moves the version,
+and the next read here reloads the group.  Disable with
+``RATING_CACHE_ENABLED=false``; the version is bumped either way.
+``GET /api/rating-cache`` reports the footprint and hit rate of the worker
+that answers it.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.dialects import conflict_insert
+from app.models import Group, Ranking
+from app.stats import COUNTERS, StatLine
+
+
+_EPOCH = datetime(1970, 1, 1)
+_NEVER = np.iinfo(np.int64).min
+_COLUMNS = ('points', 'games', 'wins', 'losses', 'ties', 'streak')
+
+
+class Rating(StatLine):
+    """One member's ``rankings`` values outside the ORM, attribute-compatible with ``Ranking``."""
+
+    def __init__(self, points=1000, **counters):
+        super().__init__(**counters)
+        self.points = points
+
+
+def _micros(dt):
+    return _NEVER if dt is None else (dt - _EPOCH) // timedelta(microseconds=1)
+
+
+class GroupRatings:
+    """Immutable snapshot of a group's rankings at one ``ratings_version``."""
+
+    def __init__(self, group_id, created_at, version, user_ids, columns, last_played):
+        self.group_id = group_id
+        self.created_at = created_at    # tells a group from an earlier one with the same id
+        self.version = version
+        self.user_ids = user_ids        # int64, sorted
+        self.columns = columns          # name -> int32 array aligned with user_ids
+        self.last_played = last_played  # int64 microseconds since the epoch, _NEVER for none
+
+    @classmethod
+    def from_rows(cls, group_id, created_at, version, rows):
+        """``rows`` are ``(user_id, points, games, wins, losses, ties, streak, last_played_at)``."""
+        rows = sorted(rows, key=lambda r: r[0])
+        user_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        columns = {
+            name: np.fromiter((r[i] or 0 for r in rows), dtype=np.int32, count=len(rows))
+            for i, name in enumerate(_COLUMNS, start=1)
+        }
+        last_played = np.fromiter((_micros(r[7]) for r in rows), dtype=np.int64, count=len(rows))
+        return cls(group_id, created_at, version, user_ids, columns, last_played)
+
+    @property
+    def nbytes(self) -> int:
+        return self.user_ids.nbytes + self.last_played.nbytes + sum(c.nbytes for c in self.columns.values())
+
+    def _index(self, uid) -> int:
+        i = int(np.searchsorted(self.user_ids, uid))
+        return i if i < len(self.user_ids) and self.user_ids[i] == uid else -1
+
+    def get(self, uid):
+        """A mutable ``Rating`` copy for ``uid``, or None when the member has no ranking row."""
+        i = self._index(uid)
+        if i < 0:
+            return None
+        micros = int(self.last_played[i])
+        return Rating(
+            **{name: int(col[i]) for name, col in self.columns.items()},
+            last_played_at=None if micros == _NEVER else _EPOCH + timedelta(microseconds=micros),
+        )
+
+    def points_of(self, ids) -> dict:
+        """``{user_id: points}``, 1000 for members without a ranking row."""
+        ids = np.fromiter(ids, dtype=np.int64)
+        points = np.full(len(ids), 1000, dtype=np.int64)
+        if len(self.user_ids):
+            idx = np.searchsorted(self.user_ids, ids).clip(max=len(self.user_ids) - 1)
+            found = self.user_ids[idx] == ids
+            points[found] = self.columns['points'][idx[found]]
+        return dict(zip(ids.tolist(), points.tolist()))
+
+    def updated(self, version, changes: dict):
+        """New snapshot at ``version`` with ``changes`` (user id to ``Rating``) applied."""
+        user_ids, last_played = self.user_ids.copy(), self.last_played.copy()
+        columns = {name: col.copy() for name, col in self.columns.items()}
+        added = []
+        for uid, rating in changes.items():
+            i = self._index(uid)
+            if i < 0:
+                added.append((uid, rating))
+                continue
+            for name in _COLUMNS:
+                columns[name][i] = getattr(rating, name)
+            last_played[i] = _micros(rating.last_played_at)
+        if added:
+            user_ids = np.concatenate([user_ids, np.array([uid for uid, _ in added], dtype=np.int64)])
+            last_played = np.concatenate([last_played, np.array([_micros(r.last_played_at) for _, r in added], dtype=np.int64)])
+            for name in _COLUMNS:
+                columns[name] = np.concatenate([columns[name], np.array([getattr(r, name) for _, r in added], dtype=np.int32)])
+            order = np.argsort(user_ids, kind='stable')
+            user_ids, last_played = user_ids[order], last_played[order]
+            columns = {name: col[order] for name, col in columns.items()}
+        return GroupRatings(self.group_id, self.created_at, version, user_ids, columns, last_played)
+
+
+class RatingCache:
+    """LRU of ``GroupRatings`` snapshots bounded by their total array size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.loads = self.write_throughs = self.evictions = 0
+
+    def get(self, group, version):
+        """The snapshot of ``group`` at ``version``, or None."""
+        with self._lock:
+            snapshot = self._entries.get(group.id)
+            if snapshot is None or snapshot.created_at != group.created_at or snapshot.version != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(group.id)
+            self.hits += 1
+            return snapshot
+
+    def put(self, snapshot, written=False):
+        """Store a snapshot loaded from the database, or ``written`` through by a commit."""
+        with self._lock:
+            if written:
+                self.write_throughs += 1
+            else:
+                self.loads += 1
+            old = self._entries.get(snapshot.group_id)
+            if old is not None:
+                # Keep a newer snapshot of the same group; one of a deleted group just goes
+                if old.created_at == snapshot.created_at and old.version > snapshot.version:
+                    return
+                del self._entries[snapshot.group_id]
+                self._size -= old.nbytes
+            if snapshot.nbytes > self.max_bytes:
+                return
+            self._entries[snapshot.group_id] = snapshot
+            self._size += snapshot.nbytes
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'groups': len(self._entries),
+                'members': sum(len(s.user_ids) for s in self._entries.values()),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'loads': self.loads,
+                'write_throughs': self.write_throughs,
+                'evictions': self.evictions,
+            }
+
+
+def _cache():
+    if not current_app.config.get('RATING_CACHE_ENABLED'):
+        return None
+    ext = current_app.extensions
+    if 'rating_cache' not in ext:
+        ext['rating_cache'] = RatingCache(current_app.config.get('RATING_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    return ext['rating_cache']
+
+
+def cache_stats():
+    """This process's cache footprint and hit rate, or None when the cache is disabled."""
+    cache = _cache()
+    return None if cache is None else cache.stats()
+
+
+def bump_version(group_id: int) -> int:
+    """Move the group to a new ratings version, locking it until commit; returns the new version."""
+    groups = Group.__table__
+    return db.session.execute(
+        update(groups).where(groups.c.id == group_id)
+        .values(ratings_version=groups.c.ratings_version + 1)
+        .returning(groups.c.ratings_version)
+    ).scalar_one()
+
+
+def _load(group_id: int):
+    # Version and rows come from one statement, so they describe the same state
+    rows = db.session.execute(
+        select(Group.created_at, Group.ratings_version, Ranking.user_id, Ranking.points, Ranking.games, Ranking.wins,
+               Ranking.losses, Ranking.ties, Ranking.streak, Ranking.last_played_at)
+        .select_from(Group)
+        .outerjoin(Ranking, Ranking.group_id == Group.id)
+        .where(Group.id == group_id)
+    ).all()
+    if not rows:
+        return None
+    return GroupRatings.from_rows(group_id, rows[0][0], rows[0][1], [tuple(r[2:]) for r in rows if r[2] is not None])
+
+
+def group_ratings(group):
+    """Snapshot of ``group``'s current ratings, or None when the cache is disabled."""
+    cache = _cache()
+    if cache is None:
+        return None
+    snapshot = cache.get(group, group.ratings_version)
+    if snapshot is None:
+        snapshot = _load(group.id)
+        if snapshot is not None:
+            cache.put(snapshot)
+    return snapshot
+
+
+def base_for_update(group, version: int):
+    """Snapshot to apply a write at ``version`` on top of, or None when the cache is disabled.
+
+    Call after ``bump_version``: the group is locked, so a snapshot loaded
+    here is the state the write starts from.
+    """
+    cache = _cache()
+    if cache is None:
+        return None
+    return cache.get(group, version - 1) or _load(group.id)
+
+
+def write_through(base, version: int, changes: dict) -> None:
+    """Upsert ``changes`` (user id to ``Rating``) and publish the new snapshot on commit."""
+    now = datetime.utcnow()
+    stmt = conflict_insert(Ranking).values([
+        {'user_id': uid, 'group_id': base.group_id, 'points': r.points, 'updated_at': now, **r.values()}
+        for uid, r in changes.items()
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'group_id'],
+        set_={name: stmt.excluded[name] for name in ('points', 'updated_at') + COUNTERS},
+    ))
+    db.session.info.setdefault('rating_cache_writes', []).append((_cache(), base.updated(version, changes)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish(session):
+    for cache, snapshot in session.info.pop('rating_cache_writes', ()):
+        cache.put(snapshot, written=True)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('rating_cache_writes', None)
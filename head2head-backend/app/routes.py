@@ -1,10 +1,20 @@
-from flask import Blueprint, jsonify, request, current_app
-from sqlalchemy import or_
+from flask import Blueprint, Response, jsonify, request, current_app, g, stream_with_context
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.orm import aliased
 from datetime import datetime
-import time, json, base64, hmac, hashlib
+from functools import wraps
+import time, json, base64, hmac, hashlib, csv, io
 
-from app import db
-from app.models import User, Group, Membership, Invite, Ranking, Match, MatchParticipant
+from app import db, limiter
+from app.models import User, Group, Membership, Invite, Ranking, Match, MatchParticipant, Job
+from app.matches import MatchError, parse_match, participants, check_members, apply_match
+from app.predictions import parse_matchup, predict, group_matrix
+from app.teams import balance_teams
+from app.search import search_users
+from app.jobs import enqueue, job_payload
+from app.idempotency import MAX_KEY_LENGTH, claim, fingerprint, remember
+from app.rating_cache import bump_version, cache_stats, group_ratings
+from app.voiding import VoidError, apply_void
 
 
 bp = Blueprint('api', __name__)
@@ -93,21 +103,71 @@ def login():
 
 
 def _current_user():
+    # Resolved once per request
+    if 'current_user' not in g:
+        g.current_user = _load_current_user()
+    return g.current_user
+
+
+def _load_current_user():
+    uid = _claimed_user_id()
+    return User.query.get(uid) if uid is not None else None
+
+
+def _claimed_user_id():
+    """The user id the request's credentials name, without looking the user up."""
     auth = request.headers.get('Authorization') or ''
     if auth.lower().startswith('bearer '):
         token = auth.split(' ', 1)[1].strip()
         payload = _jwt_decode(token)
         if payload and 'sub' in payload:
-            return User.query.get(int(payload['sub']))
+            return int(payload['sub'])
         return None
     uid = request.headers.get('X-User-Id')
     if not uid:
         return None
     try:
-        uid = int(uid)
+        return int(uid)
     except ValueError:
         return None
-    return User.query.get(uid)
+
+
+def _admission_key():
+    # No query here: on SQLite a write request's first query waits for the
+    # write lock (BEGIN IMMEDIATE), which would defeat shedding at the cap
+    return (_claimed_user_id(), (request.view_args or {}).get('group_id'))
+
+
+def _idempotent(view):
+    """Honour an ``Idempotency-Key`` header on a group-scoped write (see app/idempotency.py).
+
+    The view must finish successful requests with ``_commit_response``.
+    """
+    @wraps(view)
+    def wrapped(group_id, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        me = _current_user()
+        if not key or not me:
+            return view(group_id, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'ok': False, 'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'}), 400
+        row, fresh = claim(me.id, group_id, key, current_app.config['IDEMPOTENCY_KEY_TTL'])
+        if fresh:
+            g.idempotency_key = row
+            return view(group_id, **kwargs)
+        if row.fingerprint != fingerprint():
+            return jsonify({'ok': False, 'error': 'Idempotency-Key was already used for a different request'}), 422
+        if row.status_code is None:
+            return jsonify({'ok': False, 'error': 'A request with this Idempotency-Key is in progress'}), 409, {'Retry-After': '1'}
+        return jsonify(row.response), row.status_code, {**(row.headers or {}), 'Idempotent-Replayed': 'true'}
+    return wrapped
+
+
+def _commit_response(body, status, headers=None):
+    """Commit the request's writes together with the response stored for its Idempotency-Key."""
+    remember(status, body, headers)
+    db.session.commit()
+    return jsonify(body), status, headers or {}
 
 
 @bp.route('/auth/me', methods=['GET'])
@@ -118,8 +178,91 @@ def auth_me():
     return jsonify({'ok': True, 'user': {'id': me.id, 'username': me.username, 'email': me.email}}), 200
 
 
+@bp.route('/bootstrap', methods=['GET'])
+def bootstrap():
+    """Everything the client loads after sign-in, authenticated once.
+
+    Returns the user, the first page of their groups as ``my_groups`` lists
+    them and pending invites; with ``group_id`` also that group's detail and the first
+    ``limit`` matches of its history (``null`` when the caller is not a member).
+    """
+    me = _current_user()
+    if not me:
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
+    try:
+        group_id = int(request.args['group_id']) if request.args.get('group_id') else None
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'group_id and limit must be integers'}), 400
+
+    groups = db.session.execute(_my_groups_query(me.id).limit(_MY_GROUPS_PAGE + 1)).all()
+    invites = (
+        db.session.query(Invite, Group, User)
+        .outerjoin(Group, Group.id == Invite.group_id)
+        .outerjoin(User, User.id == Invite.inviter_id)
+        .filter(Invite.invitee_id == me.id, Invite.status == 'pending')
+        .order_by(Invite.created_at.desc())
+        .all()
+    )
+    body = {
+        'ok': True,
+        'user': {'id': me.id, 'username': me.username, 'email': me.email},
+        **_my_groups_page(groups, _MY_GROUPS_PAGE, 0),
+        'invites': [_invite_payload(inv, grp, inviter) for inv, grp, inviter in invites],
+    }
+
+    if group_id is not None:
+        # Membership usually comes with the group list, so no separate access check
+        selected = next(((m, grp) for m, grp, *_ in groups if grp.id == group_id), None)
+        if selected is None and len(groups) > _MY_GROUPS_PAGE:
+            selected = (
+                db.session.query(Membership, Group)
+                .join(Group, Group.id == Membership.group_id)
+                .filter(Membership.user_id == me.id, Membership.group_id == group_id)
+                .first()
+            )
+        body['group'] = body['matches'] = None
+        if selected:
+            membership, group = selected
+            members = _group_members(group)
+            matches = (
+                Match.query.filter_by(group_id=group.id)
+                .order_by(Match.created_at.desc())
+                .limit(limit)
+                .all()
+            )
+            body['group'] = _group_payload(group, membership, members)
+            body['matches'] = _match_payloads(matches)
+    return jsonify(body), 200
+
+
+@bp.route('/users/search', methods=['GET'])
+def search_usernames():
+    me = _current_user()
+    if not me:
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
+
+    q = (request.args.get('q') or '').strip()
+    try:
+        limit = int(request.args.get('limit', 10))
+        group_id = int(request.args['group_id']) if request.args.get('group_id') else None
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'limit and group_id must be integers'}), 400
+    limit = max(1, min(limit, 50))
+    if not q:
+        return jsonify({'ok': True, 'users': []}), 200
+
+    # Excluding a group's members and invitees reveals who they are, so members only
+    if group_id is not None and not Membership.query.filter_by(user_id=me.id, group_id=group_id).first():
+        return jsonify({'ok': False, 'error': 'Forbidden'}), 403
+
+    users = search_users(q, limit, exclude_user_id=me.id, group_id=group_id)
+    return jsonify({'ok': True, 'users': [{'id': uid, 'username': username} for uid, username in users]}), 200
+
+
 # Groups
 @bp.route('/groups', methods=['POST'])
+@limiter.limit('RATELIMIT_GROUPS', key_func=_admission_key)
 def create_group():
     me = _current_user()
     if not me:
@@ -191,27 +334,83 @@ def create_group():
     }), 201
 
 
+_MY_GROUPS_PAGE = 100
+_MY_GROUPS_MAX_PAGE = 500
+
+
 @bp.route('/my/groups', methods=['GET'])
 def my_groups():
+    """The caller's groups with member count, own rating and rank, and last match, ``limit`` at a time."""
     me = _current_user()
     if not me:
         return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
 
-    memberships = (
-        db.session.query(Membership, Group)
+    try:
+        limit = int(request.args.get('limit', _MY_GROUPS_PAGE))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'limit and offset must be integers'}), 400
+    limit = max(1, min(limit, _MY_GROUPS_MAX_PAGE))
+    offset = max(0, offset)
+
+    rows = db.session.execute(_my_groups_query(me.id).offset(offset).limit(limit + 1)).all()
+    return jsonify({'ok': True, **_my_groups_page(rows, limit, offset)}), 200
+
+
+def _my_groups_query(user_id: int):
+    """One row per membership of ``user_id``: ``(Membership, Group, member_count, elo, rank, last_match_at)``.
+
+    Each summary column is a correlated subquery answered from an index
+    (memberships and rankings by group, matches by group and time), so a page
+    costs one statement however many groups and members there are.  Members
+    without a ranking row count as 1000 like on the leaderboard.
+    """
+    others, ranked = aliased(Membership), aliased(Ranking)
+    member_count = (
+        select(func.count(others.id)).where(others.group_id == Group.id)
+        .correlate(Group).scalar_subquery()
+    )
+    elo = func.coalesce(Ranking.points, 1000)
+    above = (
+        select(func.count(ranked.id)).where(ranked.group_id == Group.id, ranked.points > elo)
+        .correlate(Group, Ranking).scalar_subquery()
+    )
+    unranked = member_count - (
+        select(func.count(ranked.id)).where(ranked.group_id == Group.id)
+        .correlate(Group).scalar_subquery()
+    )
+    last_match_at = (
+        select(func.max(Match.created_at)).where(Match.group_id == Group.id)
+        .correlate(Group).scalar_subquery()
+    )
+    return (
+        select(Membership, Group, member_count, elo, 1 + above + case((elo < 1000, unranked), else_=0), last_match_at)
         .join(Group, Group.id == Membership.group_id)
-        .filter(Membership.user_id == me.id)
-        .all()
+        .outerjoin(Ranking, (Ranking.user_id == user_id) & (Ranking.group_id == Group.id))
+        .where(Membership.user_id == user_id)
+        .order_by(Membership.id)
     )
-    groups = []
-    for m, g in memberships:
-        groups.append({
-            'id': g.id,
-            'name': g.name,
-            'sport': g.sport,
-            'role': m.role,
-        })
-    return jsonify({'ok': True, 'groups': groups}), 200
+
+
+def _my_groups_page(rows, limit: int, offset: int) -> dict:
+    """Response fields for ``limit + 1`` rows of ``_my_groups_query`` starting at ``offset``."""
+    return {
+        'groups': [_my_group_payload(*row) for row in rows[:limit]],
+        'next_offset': offset + limit if len(rows) > limit else None,
+    }
+
+
+def _my_group_payload(m, g, member_count, elo, rank, last_match_at) -> dict:
+    return {
+        'id': g.id,
+        'name': g.name,
+        'sport': g.sport,
+        'role': m.role,
+        'member_count': member_count,
+        'elo': elo,
+        'rank': rank,
+        'last_match_at': last_match_at.isoformat() if last_match_at else None,
+    }
 
 
 @bp.route('/groups/<int:group_id>', methods=['GET'])
@@ -225,30 +424,57 @@ def get_group(group_id: int):
     if not membership:
         return jsonify({'ok': False, 'error': 'Forbidden'}), 403
 
-    members = (
-        db.session.query(User, Membership, Ranking)
+    members = _group_members(group)
+    return jsonify({'ok': True, 'group': _group_payload(group, membership, members)}), 200
+
+
+def _group_members(group) -> list:
+    """``(User, Membership, Ranking or Rating or None)`` rows for ``_group_payload``."""
+    ratings = group_ratings(group)
+    if ratings is None:
+        return (
+            db.session.query(User, Membership, Ranking)
+            .join(Membership, Membership.user_id == User.id)
+            .outerjoin(Ranking, (Ranking.user_id == User.id) & (Ranking.group_id == group.id))
+            .filter(Membership.group_id == group.id)
+            .all()
+        )
+    rows = (
+        db.session.query(User, Membership)
         .join(Membership, Membership.user_id == User.id)
-        .outerjoin(Ranking, (Ranking.user_id == User.id) & (Ranking.group_id == group.id))
         .filter(Membership.group_id == group.id)
         .all()
     )
+    return [(u, m, ratings.get(u.id)) for u, m in rows]
+
+
+def _group_payload(group, membership, members) -> dict:
+    """``members`` holds ``(User, Membership, Ranking or Rating or None)`` rows."""
     members_payload = []
     for (u, m, r) in members:
         elo = r.points if r and r.points is not None else 1000
-        members_payload.append({'id': u.id, 'username': u.username, 'role': m.role, 'elo': elo})
+        members_payload.append({
+            'id': u.id,
+            'username': u.username,
+            'role': m.role,
+            'elo': elo,
+            'games': r.games if r else 0,
+            'wins': r.wins if r else 0,
+            'losses': r.losses if r else 0,
+            'ties': r.ties if r else 0,
+            'streak': r.streak if r else 0,
+            'last_played_at': r.last_played_at.isoformat() if r and r.last_played_at else None,
+        })
     # Sort by ELO desc
     members_payload.sort(key=lambda x: x['elo'], reverse=True)
-    return jsonify({
-        'ok': True,
-        'group': {
-            'id': group.id,
-            'name': group.name,
-            'sport': group.sport,
-            'default_team_size': group.default_team_size,
-            'members': members_payload,
-            'my_role': membership.role,
-        },
-    }), 200
+    return {
+        'id': group.id,
+        'name': group.name,
+        'sport': group.sport,
+        'default_team_size': group.default_team_size,
+        'members': members_payload,
+        'my_role': membership.role,
+    }
 
 
 @bp.route('/groups/<int:group_id>', methods=['PATCH'])
@@ -295,6 +521,8 @@ def update_group(group_id: int):
 
 
 @bp.route('/groups/<int:group_id>/invites', methods=['POST'])
+@limiter.limit('RATELIMIT_INVITES', key_func=_admission_key)
+@_idempotent
 def invite_to_group(group_id: int):
     me = _current_user()
     if not me:
@@ -332,8 +560,8 @@ def invite_to_group(group_id: int):
         inv.inviter_id = me.id
         inv.created_at = datetime.utcnow()
         inv.responded_at = None
-    db.session.commit()
-    return jsonify({'ok': True, 'invite': {'id': inv.id, 'group_id': inv.group_id, 'username': user.username, 'status': inv.status}}), 201
+    db.session.flush()
+    return _commit_response({'ok': True, 'invite': {'id': inv.id, 'group_id': inv.group_id, 'username': user.username, 'status': inv.status}}, 201)
 
 
 # Invites inbox
@@ -349,18 +577,19 @@ def list_invites():
         q = q.filter_by(status=status)
     invs = q.order_by(Invite.created_at.desc()).all()
 
-    def as_payload(inv: Invite):
-        g = Group.query.get(inv.group_id)
-        inviter = User.query.get(inv.inviter_id)
-        return {
-            'id': inv.id,
-            'status': inv.status,
-            'created_at': inv.created_at.isoformat(),
-            'group': {'id': g.id, 'name': g.name, 'sport': g.sport} if g else None,
-            'inviter': {'id': inviter.id, 'username': inviter.username} if inviter else None,
-        }
+    return jsonify({'ok': True, 'invites': [
+        _invite_payload(i, Group.query.get(i.group_id), User.query.get(i.inviter_id)) for i in invs
+    ]}), 200
 
-    return jsonify({'ok': True, 'invites': [as_payload(i) for i in invs]}), 200
+
+def _invite_payload(inv: Invite, g, inviter) -> dict:
+    return {
+        'id': inv.id,
+        'status': inv.status,
+        'created_at': inv.created_at.isoformat(),
+        'group': {'id': g.id, 'name': g.name, 'sport': g.sport} if g else None,
+        'inviter': {'id': inviter.id, 'username': inviter.username} if inviter else None,
+    }
 
 
 @bp.route('/invites/<int:invite_id>/respond', methods=['POST'])
@@ -383,6 +612,8 @@ def respond_invite(invite_id: int):
     if action == 'accept':
         # Make member if not already
         if not Membership.query.filter_by(user_id=me.id, group_id=inv.group_id).first():
+            # A new member changes the group's ratings as caches see them
+            bump_version(inv.group_id)
             db.session.add(Membership(user_id=me.id, group_id=inv.group_id, role='member'))
             # Also ensure an initial ELO ranking
             if not Ranking.query.filter_by(user_id=me.id, group_id=inv.group_id).first():
@@ -398,6 +629,8 @@ def respond_invite(invite_id: int):
 
 
 @bp.route('/groups/<int:group_id>/matches', methods=['POST'])
+@limiter.limit('RATELIMIT_MATCHES', key_func=_admission_key)
+@_idempotent
 def record_match(group_id: int):
     me = _current_user()
     if not me:
@@ -409,341 +642,61 @@ def record_match(group_id: int):
         return jsonify({'ok': False, 'error': 'Forbidden'}), 403
 
     payload = request.get_json(silent=True) or {}
-    is_tie = bool(
-        payload.get('is_tie')
-        or payload.get('tie')
-        or (isinstance(payload.get('result'), str) and payload.get('result', '').strip().lower() == 'tie')
-    )
-    is_ffa = bool(payload.get('ffa') or payload.get('mode') == 'ffa' or payload.get('free_for_all'))
-    # Optional team scores for team/duel
-    def _parse_team_scores(pl):
-        a = pl.get('score_a')
-        b = pl.get('score_b')
-        try:
-            a = int(a) if a is not None else None
-            b = int(b) if b is not None else None
-        except (TypeError, ValueError):
-            return (None, None, 'score_a and score_b must be integers')
-        return (a, b, None)
-
-    # Free-For-All (FFA) flow
-    if is_ffa:
-        # Collect players and rankings/placements
-        players = payload.get('players') or []
-        ranks_input = payload.get('ranks') or payload.get('placements')
-        ordering = payload.get('ordering')  # list of user_ids in finish order (best to worst)
-        winner_id = payload.get('winner_id')
-
-        # Normalize players list if ranks/ordering provided
-        if not players and isinstance(ranks_input, dict):
-            try:
-                players = [int(k) for k in ranks_input.keys()]
-            except (TypeError, ValueError):
-                return jsonify({'ok': False, 'error': 'Invalid ranks keys'}), 400
-        if not players and isinstance(ordering, list):
-            try:
-                players = [int(x) for x in ordering]
-            except (TypeError, ValueError):
-                return jsonify({'ok': False, 'error': 'Invalid ordering values'}), 400
-
-        # Validate players
-        if not isinstance(players, list) or len(players) < 2:
-            return jsonify({'ok': False, 'error': 'FFA requires at least 2 participants'}), 400
-        try:
-            player_ids = [int(x) for x in players]
-        except (TypeError, ValueError):
-            return jsonify({'ok': False, 'error': 'players must be an array of user ids'}), 400
-        if len(set(player_ids)) != len(player_ids):
-            return jsonify({'ok': False, 'error': 'Duplicate players in FFA participants'}), 400
-        # membership and rankings
-        for uid in player_ids:
-            if not Membership.query.filter_by(user_id=uid, group_id=group.id).first():
-                return jsonify({'ok': False, 'error': f'User {uid} is not a member of this group'}), 400
-        rankings = {}
-        for uid in player_ids:
-            r = Ranking.query.filter_by(user_id=uid, group_id=group.id).first()
-            if not r:
-                r = Ranking(user_id=uid, group_id=group.id, points=1000)
-                db.session.add(r)
-            rankings[uid] = r
-
-        # Build rank map: lower number is better (1 = winner). Ties allowed.
-        rank_map = {}
-        if isinstance(ranks_input, dict):
-            # keys may be strings
-            tmp = {}
-            for k, v in ranks_input.items():
-                try:
-                    uid = int(k)
-                    place = int(v)
-                except (TypeError, ValueError):
-                    return jsonify({'ok': False, 'error': 'ranks must map user_id to integer place'}), 400
-                if uid not in player_ids:
-                    return jsonify({'ok': False, 'error': f'user {uid} in ranks not in players'}), 400
-                if place < 1:
-                    return jsonify({'ok': False, 'error': 'place must be >= 1'}), 400
-                tmp[uid] = place
-            rank_map = tmp
-        elif isinstance(ordering, list) and ordering:
-            # assign 1..N
-            try:
-                ordering_ids = [int(x) for x in ordering]
-            except (TypeError, ValueError):
-                return jsonify({'ok': False, 'error': 'ordering must contain user ids'}), 400
-            if set(ordering_ids) != set(player_ids):
-                return jsonify({'ok': False, 'error': 'ordering must include all players exactly once'}), 400
-            for idx, uid in enumerate(ordering_ids, start=1):
-                rank_map[uid] = idx
-        elif winner_id is not None:
-            try:
-                winner_id = int(winner_id)
-            except (TypeError, ValueError):
-                return jsonify({'ok': False, 'error': 'winner_id must be an integer'}), 400
-            if winner_id not in player_ids:
-                return jsonify({'ok': False, 'error': 'winner_id must be one of players'}), 400
-            for uid in player_ids:
-                rank_map[uid] = 1 if uid == winner_id else 2
-        else:
-            return jsonify({'ok': False, 'error': 'Provide ranks, ordering, or winner_id for FFA'}), 400
-
-        # Compute pairwise expected and score averages
-        ids = player_ids
-        current = {uid: float(rankings[uid].points or 1000) for uid in ids}
-        import math
-        def expected(p_i, p_j):
-            return 1.0 / (1.0 + 10.0 ** ((p_j - p_i) / 400.0))
-        score = {}
-        exp_avg = {}
-        for i in ids:
-            s = 0.0
-            e = 0.0
-            for j in ids:
-                if i == j:
-                    continue
-                # outcome for i vs j based on places
-                if rank_map[i] < rank_map[j]:
-                    s += 1.0
-                elif rank_map[i] > rank_map[j]:
-                    s += 0.0
-                else:
-                    s += 0.5
-                e += expected(current[i], current[j])
-            n_opp = max(1, len(ids) - 1)
-            score[i] = s / n_opp
-            exp_avg[i] = e / n_opp
-
-        k = 32.0
-        deltas = {uid: int(round(k * (score[uid] - exp_avg[uid]))) for uid in ids}
-        # Apply updates
-        for uid in ids:
-            rankings[uid].points = int((rankings[uid].points or 1000) + deltas[uid])
-
-        # Persist match and participants
-        top_place = min(rank_map.values())
-        winners = [uid for uid, plc in rank_map.items() if plc == top_place]
-        match = Match(
-            group_id=group.id,
-            winner_id=winners[0] if len(winners) == 1 else None,
-            loser_id=None,
-            is_tie=(len(winners) != 1),
-        )
-        db.session.add(match)
-        db.session.flush()
-        for uid in ids:
-            db.session.add(MatchParticipant(match_id=match.id, user_id=uid, team=0, place=int(rank_map[uid])))
-        db.session.commit()
+    try:
+        spec = parse_match(payload)
+        if _wants_async():
+            # Validate now, apply later in `flask worker` in submission order
+            check_members(group.id, spec)
+            job = enqueue('record_match', group_id=group.id, payload=payload, submitted_by=me.id)
+            status_url = f'/api/groups/{group.id}/jobs/{job.id}'
+            body = {'ok': True, 'queued': True, 'job': job_payload(job), 'status_url': status_url}
+            return _commit_response(body, 202, {'Location': status_url})
+        _, body = apply_match(group, spec)
+    except MatchError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    return _commit_response(body, 201)
+
+
+@bp.route('/groups/<int:group_id>/matches/<int:match_id>/void', methods=['POST'])
+@_idempotent
+def void_match(group_id: int, match_id: int):
+    """Delete a mis-entered match and undo its rating changes (owner only, see app/voiding.py)."""
+    me = _current_user()
+    if not me:
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
 
-        return jsonify({
-            'ok': True,
-            'ffa': True,
-            'players': [
-                {'id': uid, 'elo': rankings[uid].points, 'delta': deltas[uid], 'place': int(rank_map[uid])}
-                for uid in ids
-            ],
-        }), 201
-    # Teams (arrays) support
-    players_a = payload.get('playersA') or payload.get('team_a') or payload.get('team1') or []
-    players_b = payload.get('playersB') or payload.get('team_b') or payload.get('team2') or []
-    if players_a and players_b:
-        # Validate arrays
-        if not isinstance(players_a, list) or not isinstance(players_b, list):
-            return jsonify({'ok': False, 'error': 'playersA and playersB must be arrays of user ids'}), 400
-        try:
-            team_a_ids = [int(x) for x in players_a]
-            team_b_ids = [int(x) for x in players_b]
-        except (TypeError, ValueError):
-            return jsonify({'ok': False, 'error': 'playersA/playersB must contain integers'}), 400
-        if len(team_a_ids) == 0 or len(team_b_ids) == 0:
-            return jsonify({'ok': False, 'error': 'Both teams must have at least one player'}), 400
-        if len(set(team_a_ids).intersection(set(team_b_ids))) > 0:
-            return jsonify({'ok': False, 'error': 'A player cannot be on both teams'}), 400
-        if len(team_a_ids) != len(team_b_ids):
-            return jsonify({'ok': False, 'error': 'Both teams must have the same number of players'}), 400
-
-        # Validate all are members and load/create rankings
-        all_ids = team_a_ids + team_b_ids
-        for uid in all_ids:
-            if not Membership.query.filter_by(user_id=uid, group_id=group.id).first():
-                return jsonify({'ok': False, 'error': f'User {uid} is not a member of this group'}), 400
-        rankings = {}
-        for uid in all_ids:
-            r = Ranking.query.filter_by(user_id=uid, group_id=group.id).first()
-            if not r:
-                r = Ranking(user_id=uid, group_id=group.id, points=1000)
-                db.session.add(r)
-            rankings[uid] = r
-
-        # Average team ratings
-        import statistics
-        ra = statistics.fmean([(rankings[uid].points or 1000) for uid in team_a_ids])
-        rb = statistics.fmean([(rankings[uid].points or 1000) for uid in team_b_ids])
-        k = 32.0
-        expected_a = 1.0 / (1.0 + 10.0 ** ((rb - ra) / 400.0))
-        expected_b = 1.0 / (1.0 + 10.0 ** ((ra - rb) / 400.0))
-        if is_tie:
-            score_a = 0.5
-            score_b = 0.5
-        else:
-            # If not tie, determine winner by explicit field or assume team A is winner when winner_team==1
-            winner_team = payload.get('winner_team')
-            if winner_team not in (1, 2, None):
-                return jsonify({'ok': False, 'error': 'winner_team must be 1 or 2 when using team arrays'}), 400
-            if winner_team is None:
-                # Fallback: require explicit since arrays provided
-                return jsonify({'ok': False, 'error': 'winner_team (1 or 2) is required when using team arrays'}), 400
-            score_a = 1.0 if winner_team == 1 else 0.0
-            score_b = 1.0 - score_a
-
-        # Compute deltas and distribute per member to keep rating pool balanced
-        delta_a = k * (score_a - expected_a)
-        delta_b = k * (score_b - expected_b)
-        per_a = round(delta_a / len(team_a_ids))
-        per_b = round(delta_b / len(team_b_ids))
-
-        for uid in team_a_ids:
-            rankings[uid].points = int((rankings[uid].points or 1000) + per_a)
-        for uid in team_b_ids:
-            rankings[uid].points = int((rankings[uid].points or 1000) + per_b)
-
-        # Persist match and participants
-        ta, tb, score_err = _parse_team_scores(payload)
-        if score_err:
-            return jsonify({'ok': False, 'error': score_err}), 400
-        if is_tie:
-            match = Match(group_id=group.id, winner_id=team_a_ids[0], loser_id=team_b_ids[0], is_tie=True, team_a_score=ta, team_b_score=tb)
-        else:
-            if score_a > score_b:
-                match = Match(group_id=group.id, winner_id=team_a_ids[0], loser_id=team_b_ids[0], is_tie=False, team_a_score=ta, team_b_score=tb)
-            else:
-                match = Match(group_id=group.id, winner_id=team_b_ids[0], loser_id=team_a_ids[0], is_tie=False, team_a_score=ta, team_b_score=tb)
-        db.session.add(match)
-        db.session.flush()
-        for uid in team_a_ids:
-            db.session.add(MatchParticipant(match_id=match.id, user_id=uid, team=1))
-        for uid in team_b_ids:
-            db.session.add(MatchParticipant(match_id=match.id, user_id=uid, team=2))
-        db.session.commit()
+    group = Group.query.get_or_404(group_id)
+    my = Membership.query.filter_by(user_id=me.id, group_id=group.id).first()
+    if not my or my.role != 'owner':
+        return jsonify({'ok': False, 'error': 'Only the group owner can void matches'}), 403
+    match = Match.query.filter_by(id=match_id, group_id=group.id).first_or_404()
 
-        return jsonify({
-            'ok': True,
-            'tie': is_tie,
-            'team_a': [{'id': uid, 'elo': rankings[uid].points} for uid in team_a_ids],
-            'team_b': [{'id': uid, 'elo': rankings[uid].points} for uid in team_b_ids],
-        }), 201
-    # Fallback to 1v1 flow
-    if is_tie:
-        p1_id = payload.get('player1_id') if 'player1_id' in payload else payload.get('winner_id')
-        p2_id = payload.get('player2_id') if 'player2_id' in payload else payload.get('loser_id')
-        if not isinstance(p1_id, int) or not isinstance(p2_id, int):
-            return jsonify({'ok': False, 'error': 'player1_id and player2_id (or winner_id and loser_id) are required for ties'}), 400
-        if p1_id == p2_id:
-            return jsonify({'ok': False, 'error': 'Players must be different for a tie'}), 400
-
-        # Validate both are members
-        m1 = Membership.query.filter_by(user_id=p1_id, group_id=group.id).first()
-        m2 = Membership.query.filter_by(user_id=p2_id, group_id=group.id).first()
-        if not m1 or not m2:
-            return jsonify({'ok': False, 'error': 'Both users must be members of the group'}), 400
-
-        # Load or create rankings
-        r1 = Ranking.query.filter_by(user_id=p1_id, group_id=group.id).first()
-        if not r1:
-            r1 = Ranking(user_id=p1_id, group_id=group.id, points=1000)
-            db.session.add(r1)
-        r2 = Ranking.query.filter_by(user_id=p2_id, group_id=group.id).first()
-        if not r2:
-            r2 = Ranking(user_id=p2_id, group_id=group.id, points=1000)
-            db.session.add(r2)
-
-        ra = float(r1.points or 1000)
-        rb = float(r2.points or 1000)
-        k = 32.0
-        expected_a = 1.0 / (1.0 + 10.0 ** ((rb - ra) / 400.0))
-        expected_b = 1.0 / (1.0 + 10.0 ** ((ra - rb) / 400.0))
-        # Tie: both score 0.5
-        new_ra = round(ra + k * (0.5 - expected_a))
-        new_rb = round(rb + k * (0.5 - expected_b))
-
-        r1.points = int(new_ra)
-        r2.points = int(new_rb)
-        ta, tb, score_err = _parse_team_scores(payload)
-        if score_err:
-            return jsonify({'ok': False, 'error': score_err}), 400
-        db.session.add(Match(group_id=group.id, winner_id=p1_id, loser_id=p2_id, is_tie=True, team_a_score=ta, team_b_score=tb))
-        db.session.commit()
+    try:
+        body = apply_void(group, match, current_app.config['MATCH_VOID_WINDOW'])
+    except VoidError as e:
+        db.session.rollback()
+        return jsonify({'ok': False, 'error': str(e)}), 409
+    return _commit_response(body, 200)
+
+
+def _wants_async() -> bool:
+    pipeline = current_app.config.get('MATCH_PIPELINE')
+    if pipeline == 'async':
+        return True
+    # Clients may only opt in where a worker is deployed; otherwise the preference is ignored
+    return pipeline == 'prefer' and 'respond-async' in (request.headers.get('Prefer') or '').lower()
 
-        return jsonify({
-            'ok': True,
-            'tie': True,
-            'player1': {'id': p1_id, 'elo': r1.points},
-            'player2': {'id': p2_id, 'elo': r2.points},
-        }), 201
-    else:
-        winner_id = payload.get('winner_id')
-        loser_id = payload.get('loser_id')
-        if not isinstance(winner_id, int) or not isinstance(loser_id, int):
-            return jsonify({'ok': False, 'error': 'winner_id and loser_id are required'}), 400
-        if winner_id == loser_id:
-            return jsonify({'ok': False, 'error': 'Winner and loser must be different'}), 400
-
-        # Validate both are members
-        win_mem = Membership.query.filter_by(user_id=winner_id, group_id=group.id).first()
-        lose_mem = Membership.query.filter_by(user_id=loser_id, group_id=group.id).first()
-        if not win_mem or not lose_mem:
-            return jsonify({'ok': False, 'error': 'Both users must be members of the group'}), 400
-
-        # Load or create rankings
-        win_rank = Ranking.query.filter_by(user_id=winner_id, group_id=group.id).first()
-        if not win_rank:
-            win_rank = Ranking(user_id=winner_id, group_id=group.id, points=1000)
-            db.session.add(win_rank)
-        lose_rank = Ranking.query.filter_by(user_id=loser_id, group_id=group.id).first()
-        if not lose_rank:
-            lose_rank = Ranking(user_id=loser_id, group_id=group.id, points=1000)
-            db.session.add(lose_rank)
-
-        ra = float(win_rank.points or 1000)
-        rb = float(lose_rank.points or 1000)
-        k = 32.0
-        expected_a = 1.0 / (1.0 + 10.0 ** ((rb - ra) / 400.0))
-        expected_b = 1.0 / (1.0 + 10.0 ** ((ra - rb) / 400.0))
-        # Winner score=1, loser score=0
-        new_ra = round(ra + k * (1.0 - expected_a))
-        new_rb = round(rb + k * (0.0 - expected_b))
-
-        win_rank.points = int(new_ra)
-        lose_rank.points = int(new_rb)
-        ta, tb, score_err = _parse_team_scores(payload)
-        if score_err:
-            return jsonify({'ok': False, 'error': score_err}), 400
-        db.session.add(Match(group_id=group.id, winner_id=winner_id, loser_id=loser_id, is_tie=False, team_a_score=ta, team_b_score=tb))
-        db.session.commit()
 
-        return jsonify({
-            'ok': True,
-            'winner': {'id': winner_id, 'elo': win_rank.points},
-            'loser': {'id': loser_id, 'elo': lose_rank.points},
-        }), 201
+@bp.route('/groups/<int:group_id>/jobs/<int:job_id>', methods=['GET'])
+def get_job(group_id: int, job_id: int):
+    me = _current_user()
+    if not me:
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
+
+    if not Membership.query.filter_by(user_id=me.id, group_id=group_id).first():
+        return jsonify({'ok': False, 'error': 'Forbidden'}), 403
+    job = Job.query.filter_by(id=job_id, group_id=group_id).first_or_404()
+    return jsonify({'ok': True, 'job': job_payload(job)}), 200
 
 
 @bp.route('/groups/<int:group_id>/matches', methods=['GET'])
@@ -773,45 +726,246 @@ def list_matches(group_id: int):
         .all()
     )
 
-    def match_payload(m: Match):
-        # Collect participants if present
-        parts = (
-            db.session.query(MatchParticipant, User)
-            .join(User, User.id == MatchParticipant.user_id)
-            .filter(MatchParticipant.match_id == m.id)
+    return jsonify({'ok': True, 'matches': _match_payloads(matches)}), 200
+
+
+def _match_payload(m, participants: list, usernames: dict, ratings: bool = False) -> dict:
+    """Serialize a match row given its participant payloads.
+
+    ``usernames`` maps user id to username for the winner/loser fallback of
+    duels, which have no participant rows.  With ``ratings`` the duel
+    fallback also carries each player's ``points_before`` and ``delta``.
+    """
+    participants = list(participants)
+    kind = 'ffa' if any(p['team'] == 0 for p in participants) else ('team' if participants else 'duel')
+    # Fallback participants for duels
+    if not participants and (m.winner_id or m.loser_id):
+        for uid, team, before, delta in ((m.winner_id, 1, 'winner_points_before', 'winner_delta'),
+                                         (m.loser_id, 2, 'loser_points_before', 'loser_delta')):
+            if uid and uid in usernames:
+                part = {'user': {'id': uid, 'username': usernames[uid]}, 'team': team, 'place': None}
+                if ratings:
+                    part.update(points_before=getattr(m, before), delta=getattr(m, delta))
+                participants.append(part)
+    return {
+        'id': m.id,
+        'created_at': m.created_at.isoformat(),
+        'is_tie': m.is_tie,
+        'kind': kind,
+        'winner_id': m.winner_id,
+        'team_a_score': m.team_a_score,
+        'team_b_score': m.team_b_score,
+        'participants': participants,
+    }
+
+
+def _match_payloads(matches, ratings: bool = False) -> list:
+    """Serialize a batch of matches with two bulk queries for participants and duel players.
+
+    ``ratings`` adds each participant's ``points_before`` and ``delta`` (None
+    for matches recorded before they were stored).
+    """
+    if not matches:
+        return []
+    parts = (
+        db.session.query(MatchParticipant.match_id, MatchParticipant.team, MatchParticipant.place,
+                         MatchParticipant.points_before, MatchParticipant.delta, User.id, User.username)
+        .join(User, User.id == MatchParticipant.user_id)
+        .filter(MatchParticipant.match_id.in_([m.id for m in matches]))
+        .order_by(MatchParticipant.id)
+    )
+    by_match = {}
+    for match_id, team, place, before, delta, uid, uname in parts:
+        part = {'user': {'id': uid, 'username': uname}, 'team': team, 'place': place}
+        if ratings:
+            part.update(points_before=before, delta=delta)
+        by_match.setdefault(match_id, []).append(part)
+
+    duel_ids = set()
+    for m in matches:
+        if m.id not in by_match:
+            duel_ids.update(x for x in (m.winner_id, m.loser_id) if x)
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(duel_ids))) if duel_ids else {}
+    return [_match_payload(m, by_match.get(m.id, []), usernames, ratings) for m in matches]
+
+
+_EXPORT_COLUMNS = ['match_id', 'created_at', 'kind', 'is_tie', 'team_a_score', 'team_b_score',
+                   'winner_id', 'user_id', 'username', 'team', 'place', 'points_before', 'delta']
+
+
+@bp.route('/groups/<int:group_id>/matches/export', methods=['GET'])
+def export_matches(group_id: int):
+    me = _current_user()
+    if not me:
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
+
+    group = Group.query.get_or_404(group_id)
+    if not Membership.query.filter_by(user_id=me.id, group_id=group.id).first():
+        return jsonify({'ok': False, 'error': 'Forbidden'}), 403
+
+    fmt = (request.args.get('format') or 'csv').lower()
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'ok': False, 'error': 'format must be csv or ndjson'}), 400
+
+    chunks = _iter_match_history(group.id, current_app.config.get('EXPORT_CHUNK_SIZE', 1000))
+    if fmt == 'csv':
+        body, mimetype = _csv_lines(chunks), 'text/csv'
+    else:
+        body = (''.join(json.dumps(p, separators=(',', ':')) + '\n' for p in chunk) for chunk in chunks)
+        mimetype = 'application/x-ndjson'
+    filename = f'group-{group.id}-matches.{fmt}'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+def _iter_match_history(group_id: int, chunk_size: int):
+    """Yield serialized matches, oldest first, one chunk at a time.
+
+    Rows come from a server-side cursor (``yield_per``) so memory stays flat
+    regardless of history length.
+    """
+    stmt = (
+        select(Match.id, Match.created_at, Match.is_tie, Match.winner_id, Match.loser_id,
+               Match.team_a_score, Match.team_b_score, Match.winner_points_before, Match.winner_delta,
+               Match.loser_points_before, Match.loser_delta)
+        .where(Match.group_id == group_id)
+        .order_by(Match.created_at, Match.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    for rows in db.session.execute(stmt).partitions():
+        yield _match_payloads(rows, ratings=True)
+
+
+def _csv_lines(chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(_EXPORT_COLUMNS)
+    # Send the header before the first query runs so the download starts at once
+    yield buf.getvalue()
+    for chunk in chunks:
+        buf.seek(0)
+        buf.truncate()
+        for p in chunk:
+            for part in p['participants'] or [None]:
+                writer.writerow([
+                    p['id'], p['created_at'], p['kind'], p['is_tie'], p['team_a_score'], p['team_b_score'], p['winner_id'],
+                    part['user']['id'] if part else None,
+                    part['user']['username'] if part else None,
+                    part['team'] if part else None,
+                    part['place'] if part else None,
+                    part['points_before'] if part else None,
+                    part['delta'] if part else None,
+                ])
+        yield buf.getvalue()
+
+
+@bp.route('/groups/<int:group_id>/predict', methods=['POST'])
+def predict_matchup(group_id: int):
+    me = _current_user()
+    if not me:
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
+
+    group = Group.query.get_or_404(group_id)
+    if not Membership.query.filter_by(user_id=me.id, group_id=group.id).first():
+        return jsonify({'ok': False, 'error': 'Forbidden'}), 403
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        spec = parse_matchup(payload)
+        check_members(group.id, spec)
+    except MatchError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+
+    ids = participants(spec)
+    ratings = group_ratings(group)
+    if ratings is not None:
+        points = ratings.points_of(ids)
+    else:
+        points = {uid: 1000 for uid in ids}
+        points.update(
+            (uid, p) for uid, p in db.session.query(Ranking.user_id, Ranking.points)
+            .filter(Ranking.group_id == group.id, Ranking.user_id.in_(ids))
+            if p is not None
+        )
+    return jsonify({'ok': True, **predict(spec, points)}), 200
+
+
+@bp.route('/groups/<int:group_id>/predict/matrix', methods=['GET'])
+def prediction_matrix(group_id: int):
+    me = _current_user()
+    if not me:
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
+
+    group = Group.query.get_or_404(group_id)
+    if not Membership.query.filter_by(user_id=me.id, group_id=group.id).first():
+        return jsonify({'ok': False, 'error': 'Forbidden'}), 403
+
+    version, body = group_matrix(group)
+    resp = current_app.response_class(body, mimetype='application/json')
+    resp.set_etag(version)
+    return resp.make_conditional(request)
+
+
+@bp.route('/groups/<int:group_id>/teams', methods=['POST'])
+def generate_teams(group_id: int):
+    me = _current_user()
+    if not me:
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
+
+    group = Group.query.get_or_404(group_id)
+    if not Membership.query.filter_by(user_id=me.id, group_id=group.id).first():
+        return jsonify({'ok': False, 'error': 'Forbidden'}), 403
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        team_size = int(payload['team_size']) if payload.get('team_size') is not None else (group.default_team_size or 1)
+        num_teams = int(payload['num_teams']) if payload.get('num_teams') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'ok': False, 'error': 'team_size and num_teams must be integers'}), 400
+
+    ratings = group_ratings(group)
+    if ratings is not None:
+        members = ratings.points_of(
+            uid for (uid,) in db.session.query(Membership.user_id).filter(Membership.group_id == group.id)
+        )
+    else:
+        members = dict(
+            db.session.query(Membership.user_id, func.coalesce(Ranking.points, 1000))
+            .outerjoin(Ranking, (Ranking.user_id == Membership.user_id) & (Ranking.group_id == Membership.group_id))
+            .filter(Membership.group_id == group.id)
             .all()
         )
-        participants = [
-            {
-                'user': {'id': u.id, 'username': u.username},
-                'team': p.team,
-                'place': p.place,
-            }
-            for (p, u) in parts
-        ]
-        kind = 'ffa' if any(p['team'] == 0 for p in participants) else ('team' if participants else 'duel')
-        # Fallback participants for duels
-        if not participants and (m.winner_id or m.loser_id):
-            if m.winner_id:
-                u = User.query.get(m.winner_id)
-                if u:
-                    participants.append({'user': {'id': u.id, 'username': u.username}, 'team': 1, 'place': None})
-            if m.loser_id:
-                u = User.query.get(m.loser_id)
-                if u:
-                    participants.append({'user': {'id': u.id, 'username': u.username}, 'team': 2, 'place': None})
-        return {
-            'id': m.id,
-            'created_at': m.created_at.isoformat(),
-            'is_tie': m.is_tie,
-            'kind': kind,
-            'winner_id': m.winner_id,
-            'team_a_score': m.team_a_score,
-            'team_b_score': m.team_b_score,
-            'participants': participants,
-        }
+    # Without a player list everyone in the group is considered present
+    players = payload.get('players')
+    if players is None:
+        ids = sorted(members)
+    else:
+        try:
+            ids = [int(x) for x in players]
+        except (TypeError, ValueError):
+            return jsonify({'ok': False, 'error': 'players must be an array of user ids'}), 400
+        if len(set(ids)) != len(ids):
+            return jsonify({'ok': False, 'error': 'Duplicate players'}), 400
+        for uid in ids:
+            if uid not in members:
+                return jsonify({'ok': False, 'error': f'User {uid} is not a member of this group'}), 400
+
+    try:
+        result = balance_teams(members, ids, team_size, num_teams, current_app.config['TEAM_BALANCE_BUDGET_MS'])
+    except MatchError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    return jsonify({'ok': True, 'team_size': team_size, **result}), 200
+
+
+@bp.route('/rating-cache', methods=['GET'])
+def rating_cache_stats():
+    """Footprint and hit rate of the rating cache in the worker serving the request."""
+    me = _current_user()
+    if not me:
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
+    stats = cache_stats()
+    return jsonify({'ok': True, 'enabled': stats is not None, **(stats or {})}), 200
 
-    return jsonify({'ok': True, 'matches': [match_payload(m) for m in matches]}), 200
 
 @bp.route('/groups/<int:group_id>/transfer-ownership', methods=['POST'])
 def transfer_ownership(group_id: int):
@@ -857,8 +1011,19 @@ def leave_group(group_id: int):
     if my.role == 'owner' and member_count > 1:
         return jsonify({'ok': False, 'error': 'Owner must transfer ownership before leaving'}), 400
 
+    bump_version(group.id)
+
     if my.role == 'owner' and member_count == 1:
-        db.session.delete(group)
+        # Detach the last member and close open invites now; the group and its
+        # history are deleted in batches by `flask worker`
+        Ranking.query.filter_by(user_id=me.id, group_id=group.id).delete(synchronize_session=False)
+        db.session.delete(my)
+        Invite.query.filter_by(group_id=group.id, status='pending').update(
+            {'status': 'canceled', 'responded_at': datetime.utcnow()}, synchronize_session=False)
+        # Free the name for new groups right away; names are stored stripped, so
+        # one with a leading space can't clash with a name anyone picks
+        group.name = f' deleted-group-{group.id}'
+        enqueue('delete_group', group_id=group.id, submitted_by=me.id)
         db.session.commit()
         return jsonify({'ok': True, 'group_deleted': True}), 200
     else:
@@ -0,0 +1,85 @@
+"""``flask upgrade-schema``: bring a database created by an earlier version up to date.
+
+Tables come from ``db.create_all()``, which creates missing tables but never
+changes existing ones, so columns and indexes added to the models since a
+database was created are missing from it until this step runs (queries then
+fail with "no such column").  Run it after every upgrade, before starting the
+app; docker-compose runs it ahead of ``flask run`` and ``flask worker``.
+
+Everything happens in one transaction and only what the live schema lacks is
+added, so running it again is a no-op:
+
+* missing tables are created;
+* columns with a server default are added with it; required columns without
+  one are added empty, filled from existing rows (``_FILL``) and then made
+  NOT NULL on Postgres (SQLite can't tighten a column, and the app always
+  sets them);
+* indexes declared on the models are created when missing.
+
+``flask partitions migrate`` (Postgres) is a separate, optional step.
+"""
+import click
+from sqlalchemy import inspect, text
+
+from app import db
+
+
+# Values for required columns added to tables that already have rows
+_FILL = {
+    ('match_participants', 'created_at'):
+        '(SELECT m.created_at FROM matches m WHERE m.id = match_participants.match_id)',
+    ('jobs', 'scheduled_at'): 'created_at',
+}
+
+
+def _add_column(conn, table, column) -> None:
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+    if column.server_default is not None:
+        conn.execute(text(f"{ddl} NOT NULL DEFAULT {column.server_default.arg}" if not column.nullable
+                          else f"{ddl} DEFAULT {column.server_default.arg}"))
+        return
+    if column.nullable:
+        conn.execute(text(ddl))
+        return
+    fill = _FILL.get((table, column.name))
+    if fill is None:
+        raise click.ClickException(f'No way to fill required column {table}.{column.name} for existing rows')
+    conn.execute(text(ddl))
+    conn.execute(text(f"UPDATE {table} SET {column.name} = {fill}"))
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column.name} SET NOT NULL"))
+
+
+def upgrade(conn) -> list:
+    """Add the tables, columns and indexes missing from the database; returns what was added."""
+    if conn.dialect.name == 'postgresql':
+        # Processes starting together (app and worker) upgrade one at a time
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('upgrade-schema'))"))
+    existing = set(inspect(conn).get_table_names())
+    db.metadata.create_all(conn)
+    added = [f'table {t}' for t in db.metadata.tables if t not in existing]
+
+    inspector = inspect(conn)
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        present = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in present:
+                _add_column(conn, table.name, column)
+                added.append(f'column {table.name}.{column.name}')
+        before = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            # Dialect-specific indexes (ddl_if) are skipped elsewhere
+            index.create(conn, checkfirst=True)
+        after = {i['name'] for i in inspect(conn).get_indexes(table.name)}
+        added += [f'index {name}' for name in sorted(after - before)]
+    return added
+
+
+@click.command('upgrade-schema')
+def upgrade_schema_command():
+    """Add tables, columns and indexes missing from an older database."""
+    with db.engine.begin() as conn:
+        added = upgrade(conn)
+    click.echo(f"Schema upgraded: {', '.join(added)}" if added else 'Schema up to date')
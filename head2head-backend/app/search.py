@@ -0,0 +1,118 @@
+"""Case-insensitive username prefix search for the invite typeahead.
+
+On Postgres the query walks ``ix_users_username_lower_prefix`` as a range
+scan in order and stops after ``limit`` rows, so its cost does not grow with
+the number of users.  Other databases use ``PrefixIndex``: a per-process
+sorted list of lowercased usernames searched by bisection.  Users are never
+renamed or deleted, so the list only has to pick up new ids.
+"""
+import bisect
+import sys
+import threading
+
+from flask import current_app
+from sqlalchemy import exists, func
+
+from app import db
+from app.models import User, Membership, Invite
+
+
+def _upper_bound(prefix: str):
+    """Smallest string greater than every string starting with ``prefix``.
+
+    ``None`` when there is none: U+10FFFF has no successor, so a prefix made
+    only of it bounds nothing and ``>= prefix`` alone finds its matches.
+    """
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return None
+    nxt = ord(stem[-1]) + 1
+    if 0xD800 <= nxt <= 0xDFFF:
+        # Surrogates can't be encoded and never occur in stored names
+        nxt = 0xE000
+    return stem[:-1] + chr(nxt)
+
+
+class PrefixIndex:
+    """Sorted ``(lowercased username, id, username)`` tuples, refreshed by id."""
+
+    def __init__(self):
+        self._entries = []
+        self._max_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        max_id = db.session.query(func.max(User.id)).scalar() or 0
+        if max_id <= self._max_id:
+            return
+        with self._lock:
+            if max_id <= self._max_id:
+                return
+            rows = (
+                db.session.query(User.id, User.username)
+                .filter(User.id > self._max_id, User.id <= max_id)
+                .all()
+            )
+            new = [(username.lower(), uid, username) for uid, username in rows]
+            if len(new) > 1000:
+                entries = self._entries + new
+                entries.sort()
+            else:
+                entries = list(self._entries)
+                for entry in new:
+                    bisect.insort(entries, entry)
+            # Readers keep iterating the list they started with
+            self._entries = entries
+            self._max_id = max_id
+
+    def search(self, prefix: str, limit: int, skip: set) -> list:
+        entries = self._entries
+        found = []
+        i = bisect.bisect_left(entries, (prefix,))
+        while i < len(entries) and entries[i][0].startswith(prefix) and len(found) < limit:
+            _, uid, username = entries[i]
+            if uid not in skip:
+                found.append((uid, username))
+            i += 1
+        return found
+
+
+def _index() -> PrefixIndex:
+    ext = current_app.extensions
+    if 'user_search_index' not in ext:
+        ext['user_search_index'] = PrefixIndex()
+    return ext['user_search_index']
+
+
+def search_users(prefix: str, limit: int, exclude_user_id: int = None, group_id: int = None) -> list:
+    """``(id, username)`` of users whose name starts with ``prefix``, in name order.
+
+    With ``group_id``, members of the group and users with a pending invite to
+    it are left out.
+    """
+    prefix = prefix.lower()
+    if db.session.get_bind().dialect.name == 'postgresql':
+        key = func.lower(User.username).collate('C')
+        q = db.session.query(User.id, User.username).filter(key >= prefix).order_by(key)
+        upper = _upper_bound(prefix)
+        if upper is not None:
+            q = q.filter(key < upper)
+        if exclude_user_id is not None:
+            q = q.filter(User.id != exclude_user_id)
+        if group_id is not None:
+            q = q.filter(
+                ~exists().where(Membership.user_id == User.id, Membership.group_id == group_id),
+                ~exists().where(Invite.invitee_id == User.id, Invite.group_id == group_id, Invite.status == 'pending'),
+            )
+        return [tuple(row) for row in q.limit(limit)]
+
+    skip = {exclude_user_id} if exclude_user_id is not None else set()
+    if group_id is not None:
+        skip.update(uid for (uid,) in db.session.query(Membership.user_id).filter(Membership.group_id == group_id))
+        skip.update(
+            uid for (uid,) in db.session.query(Invite.invitee_id)
+            .filter(Invite.group_id == group_id, Invite.status == 'pending')
+        )
+    index = _index()
+    index.refresh()
+    return index.search(prefix, limit, skip)
@@ -0,0 +1,159 @@
+"""Per-member result counters kept on ``rankings`` next to ``points``.
+
+Every rating update also advances the player's ``games``, ``wins``,
+``losses``, ``ties``, ``streak`` (consecutive wins when positive, losses when
+negative, 0 after a tie) and ``last_played_at`` in the same transaction, so
+player cards read them straight off the ranking row.  Outcomes are classified
+the way ``match_rollups`` does: in FFA the best place wins and a shared best
+place is a tie for those players, everyone else loses.
+
+``flask backfill-stats`` recomputes the counters from ``match_rollups`` plus
+the live match history, e.g. for rankings that predate them.  The columns
+themselves are added to older databases by ``flask upgrade-schema``, which
+must run first.
+"""
+import time
+
+import click
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Group, Ranking, Match, MatchParticipant, MatchRollup
+
+
+COUNTERS = ('games', 'wins', 'losses', 'ties', 'streak', 'last_played_at')
+
+
+class StatLine:
+    """Counters for one player outside the ORM (import and backfill replays)."""
+
+    def __init__(self, games=0, wins=0, losses=0, ties=0, streak=0, last_played_at=None):
+        self.games, self.wins, self.losses, self.ties = games, wins, losses, ties
+        self.streak, self.last_played_at = streak, last_played_at
+
+    @classmethod
+    def of(cls, ranking):
+        return cls(**{c: getattr(ranking, c) or (None if c == 'last_played_at' else 0) for c in COUNTERS})
+
+    def values(self) -> dict:
+        return {c: getattr(self, c) for c in COUNTERS}
+
+
+def outcomes(spec: dict) -> dict:
+    """``{user_id: 'win' | 'loss' | 'tie'}`` for a parsed match spec."""
+    mode = spec['mode']
+    if mode == 'ffa':
+        places = spec['places']
+        best = min(places.values())
+        shared = sum(1 for p in places.values() if p == best) > 1
+        return {uid: 'loss' if p > best else ('tie' if shared else 'win') for uid, p in places.items()}
+    if mode == 'team':
+        if spec['is_tie']:
+            return {uid: 'tie' for uid in spec['team_a'] + spec['team_b']}
+        winners, losers = (spec['team_a'], spec['team_b']) if spec['winner_team'] == 1 else (spec['team_b'], spec['team_a'])
+        return {**{uid: 'win' for uid in winners}, **{uid: 'loss' for uid in losers}}
+    if spec['is_tie']:
+        return {spec['player_a']: 'tie', spec['player_b']: 'tie'}
+    return {spec['player_a']: 'win', spec['player_b']: 'loss'}
+
+
+def stored_outcomes(is_tie, winner_id, loser_id, parts) -> dict:
+    """Same as ``outcomes`` for a stored match and its ``(user_id, team, place)`` rows."""
+    if not parts:
+        # Duels keep their two players on the match row
+        result = {}
+        if winner_id is not None:
+            result[winner_id] = 'tie' if is_tie else 'win'
+        if loser_id is not None:
+            result[loser_id] = 'tie' if is_tie else 'loss'
+        return result
+    if parts[0][1] == 0:
+        best = min(place for _, _, place in parts)
+        return {uid: 'loss' if place > best else ('tie' if is_tie else 'win') for uid, _, place in parts}
+    winning_team = next((team for uid, team, _ in parts if uid == winner_id), None)
+    return {uid: 'tie' if is_tie else ('win' if team == winning_team else 'loss') for uid, team, _ in parts}
+
+
+def record_result(target, outcome: str, played_at) -> None:
+    """Advance the counters on ``target`` (a ``Ranking`` or ``StatLine``) by one result."""
+    target.games = (target.games or 0) + 1
+    streak = target.streak or 0
+    if outcome == 'win':
+        target.wins = (target.wins or 0) + 1
+        target.streak = streak + 1 if streak > 0 else 1
+    elif outcome == 'loss':
+        target.losses = (target.losses or 0) + 1
+        target.streak = streak - 1 if streak < 0 else -1
+    else:
+        target.ties = (target.ties or 0) + 1
+        target.streak = 0
+    if target.last_played_at is None or played_at > target.last_played_at:
+        target.last_played_at = played_at
+
+
+def backfill(group_id: int, chunk_size: int) -> int:
+    """Recompute the counters of every ranking in a group; returns the rankings written.
+
+    Rankings are locked first so matches recorded meanwhile wait for the
+    replay instead of being overwritten by it.  Months already condensed into
+    ``match_rollups`` contribute their totals; streaks and ``last_played_at``
+    come from the live history only.
+    """
+    from app.rating_cache import bump_version  # rating_cache builds on this module
+
+    bump_version(group_id)
+    rankings = {r.user_id: r for r in Ranking.query.filter_by(group_id=group_id).with_for_update()}
+    lines = {}
+    totals = (
+        db.session.query(MatchRollup.user_id, func.sum(MatchRollup.games), func.sum(MatchRollup.wins),
+                         func.sum(MatchRollup.losses), func.sum(MatchRollup.ties))
+        .filter(MatchRollup.group_id == group_id)
+        .group_by(MatchRollup.user_id)
+    )
+    for uid, games, wins, losses, ties in totals:
+        lines[uid] = StatLine(int(games), int(wins), int(losses), int(ties))
+
+    matches = db.session.execute(
+        select(Match.id, Match.created_at, Match.is_tie, Match.winner_id, Match.loser_id)
+        .where(Match.group_id == group_id)
+        .order_by(Match.created_at, Match.id)
+    ).all()
+    for i in range(0, len(matches), chunk_size):
+        chunk = matches[i:i + chunk_size]
+        parts = {}
+        for match_id, uid, team, place in db.session.execute(
+            select(MatchParticipant.match_id, MatchParticipant.user_id, MatchParticipant.team, MatchParticipant.place)
+            .where(MatchParticipant.match_id.in_([m.id for m in chunk]))
+        ):
+            parts.setdefault(match_id, []).append((uid, team, place))
+        for m in chunk:
+            for uid, outcome in stored_outcomes(m.is_tie, m.winner_id, m.loser_id, parts.get(m.id, [])).items():
+                record_result(lines.setdefault(uid, StatLine()), outcome, m.created_at)
+
+    for uid, ranking in rankings.items():
+        for name, value in lines.get(uid, StatLine()).values().items():
+            setattr(ranking, name, value)
+    return len(rankings)
+
+
+@click.command('backfill-stats')
+@click.option('--group', 'group', default=None, help='Only this group (id or name).')
+def backfill_stats_command(group):
+    """Recompute per-member result counters from match history."""
+    started = time.perf_counter()
+    if group is None:
+        group_ids = [gid for (gid,) in db.session.query(Group.id).order_by(Group.id)]
+    else:
+        target = Group.query.get(int(group)) if group.isdigit() else Group.query.filter_by(name=group).first()
+        if target is None:
+            raise click.ClickException(f'Group {group!r} not found')
+        group_ids = [target.id]
+
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+    written = 0
+    for gid in group_ids:
+        # One transaction per group keeps lock hold times short
+        written += backfill(gid, chunk_size)
+        db.session.commit()
+    click.echo(f'Backfilled {written} rankings in {len(group_ids)} groups in {time.perf_counter() - started:.2f}s')
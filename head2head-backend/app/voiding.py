@@ -0,0 +1,217 @@
+"""Voiding a mis-entered match without replaying the group's history.
+
+``apply_match`` stores every player's rating before a match and the delta it
+applied (on the participant rows, on the match row for duels), so voiding
+match M only re-rates what M could have influenced:
+
+* M's players lose M's delta, which shifts their rating from then on;
+* walking the later matches in the order they were rated (id order), a match
+  with a shifted player is re-rated from its stored ratings plus the shifts,
+  and its other players pick up shifts of their own; every other match is
+  left alone since none of its inputs changed, and players whose shift
+  cancels out drop out of the walk;
+* the shifts are added to the current rankings, and M's players lose M's
+  result from their counters (streak and ``last_played_at`` are re-read from
+  the remaining history, like ``flask backfill-stats`` does).
+
+Matches recorded before the ratings were stored can't be voided, nor can a
+match with more than ``MATCH_VOID_WINDOW`` matches rated after it.
+"""
+from sqlalchemy import select, union
+
+from app import db
+from app.models import Match, MatchParticipant, Ranking
+from app.matches import compute_deltas
+from app.rating_cache import bump_version, base_for_update, write_through
+from app.stats import outcomes, stored_outcomes
+
+
+_FORM_CHUNK = 50
+
+
+class VoidError(Exception):
+    """Why a match can't be voided, reported to the client as a 409."""
+
+
+def _stored_spec(m, parts) -> dict:
+    """Spec of a stored match as ``compute_deltas`` takes it; ``parts`` are participant rows."""
+    if not parts:
+        return {'mode': 'duel', 'player_a': m.winner_id, 'player_b': m.loser_id, 'is_tie': m.is_tie}
+    if parts[0].team == 0:
+        return {'mode': 'ffa', 'players': [p.user_id for p in parts], 'places': {p.user_id: p.place for p in parts}}
+    winner_team = next((p.team for p in parts if p.user_id == m.winner_id), 1)
+    return {
+        'mode': 'team',
+        'is_tie': m.is_tie,
+        'winner_team': None if m.is_tie else winner_team,
+        'team_a': [p.user_id for p in parts if p.team == 1],
+        'team_b': [p.user_id for p in parts if p.team == 2],
+    }
+
+
+def _stored_ratings(m, parts) -> dict:
+    """``{user_id: (points_before, delta)}`` as stored with the match."""
+    if not parts:
+        return {m.winner_id: (m.winner_points_before, m.winner_delta),
+                m.loser_id: (m.loser_points_before, m.loser_delta)}
+    return {p.user_id: (p.points_before, p.delta) for p in parts}
+
+
+def _history(group_id: int, match_id: int, window: int) -> list:
+    """``(match, spec, stored ratings)`` for ``match_id`` and the matches rated after it."""
+    matches = db.session.execute(
+        select(Match.id, Match.is_tie, Match.winner_id, Match.loser_id, Match.winner_points_before,
+               Match.winner_delta, Match.loser_points_before, Match.loser_delta)
+        .where(Match.group_id == group_id, Match.id >= match_id)
+        .order_by(Match.id)
+        .limit(window + 2)
+    ).all()
+    if len(matches) > window + 1:
+        raise VoidError(f'Only matches with at most {window} matches recorded after them can be voided')
+    parts = {}
+    for p in db.session.execute(
+        select(MatchParticipant.match_id, MatchParticipant.user_id, MatchParticipant.team, MatchParticipant.place,
+               MatchParticipant.points_before, MatchParticipant.delta)
+        .where(MatchParticipant.match_id.in_([m.id for m in matches]))
+        .order_by(MatchParticipant.id)
+    ):
+        parts.setdefault(p.match_id, []).append(p)
+    return [(m, _stored_spec(m, parts.get(m.id, [])), _stored_ratings(m, parts.get(m.id, []))) for m in matches]
+
+
+def _complete(stored: dict) -> bool:
+    return None not in stored and all(before is not None and delta is not None for before, delta in stored.values())
+
+
+def _rerate(history) -> tuple:
+    """Shift per player once the first match of ``history`` is gone, and the re-rated matches."""
+    _, _, stored = history[0]
+    shift = {uid: -delta for uid, (_, delta) in stored.items() if delta}
+    rerated = []
+    for m, spec, stored in history[1:]:
+        if shift.keys().isdisjoint(stored):
+            continue
+        if not _complete(stored):
+            raise VoidError(f'Match {m.id} after this one was recorded without its ratings')
+        points = {uid: before + shift.get(uid, 0) for uid, (before, _) in stored.items()}
+        deltas = compute_deltas(spec, points)
+        for uid, (_, old) in stored.items():
+            shift[uid] = shift.get(uid, 0) + deltas[uid] - old
+        shift = {uid: s for uid, s in shift.items() if s}
+        rerated.append((m, spec, points, deltas))
+    return shift, rerated
+
+
+def _form(group_id: int, uid: int) -> tuple:
+    """``(streak, last_played_at)`` of ``uid`` from the group's live history."""
+    # One indexed lookup per role instead of an OR that scans the group's history
+    played = union(
+        select(Match.id).where(Match.winner_id == uid),
+        select(Match.id).where(Match.loser_id == uid),
+        select(MatchParticipant.match_id).where(MatchParticipant.user_id == uid),
+    )
+    query = (
+        select(Match.id, Match.created_at, Match.is_tie, Match.winner_id, Match.loser_id)
+        .where(Match.group_id == group_id, Match.id.in_(played))
+        .order_by(Match.created_at.desc(), Match.id.desc())
+    )
+    streak, last_played_at, offset = 0, None, 0
+    while True:
+        chunk = db.session.execute(query.offset(offset).limit(_FORM_CHUNK)).all()
+        if not chunk:
+            return streak, last_played_at
+        offset += len(chunk)
+        parts = {}
+        for match_id, user_id, team, place in db.session.execute(
+            select(MatchParticipant.match_id, MatchParticipant.user_id, MatchParticipant.team, MatchParticipant.place)
+            .where(MatchParticipant.match_id.in_([m.id for m in chunk]))
+        ):
+            parts.setdefault(match_id, []).append((user_id, team, place))
+        for m in chunk:
+            outcome = stored_outcomes(m.is_tie, m.winner_id, m.loser_id, parts.get(m.id, [])).get(uid)
+            if outcome is None:
+                continue
+            last_played_at = last_played_at or m.created_at
+            step = {'win': 1, 'loss': -1}.get(outcome, 0)
+            if step == 0 or (streak and (streak > 0) != (step > 0)):
+                return streak, last_played_at
+            streak += step
+
+
+def _write_rerated(rerated) -> None:
+    duels = [
+        {'m_id': m.id, 'm_wpb': points[spec['player_a']], 'm_wd': deltas[spec['player_a']],
+         'm_lpb': points[spec['player_b']], 'm_ld': deltas[spec['player_b']]}
+        for m, spec, points, deltas in rerated if spec['mode'] == 'duel'
+    ]
+    if duels:
+        matches = Match.__table__
+        db.session.execute(
+            matches.update().where(matches.c.id == db.bindparam('m_id'))
+            .values(winner_points_before=db.bindparam('m_wpb'), winner_delta=db.bindparam('m_wd'),
+                    loser_points_before=db.bindparam('m_lpb'), loser_delta=db.bindparam('m_ld')),
+            duels,
+        )
+    rows = [
+        {'p_match': m.id, 'p_user': uid, 'p_before': points[uid], 'p_delta': deltas[uid]}
+        for m, spec, points, deltas in rerated if spec['mode'] != 'duel'
+        for uid in points
+    ]
+    if rows:
+        parts = MatchParticipant.__table__
+        db.session.execute(
+            parts.update()
+            .where(parts.c.match_id == db.bindparam('p_match'), parts.c.user_id == db.bindparam('p_user'))
+            .values(points_before=db.bindparam('p_before'), delta=db.bindparam('p_delta')),
+            rows,
+        )
+
+
+def apply_void(group, match, window: int) -> dict:
+    """Remove ``match`` from ``group`` and undo its effect on ratings and counters; returns the response body.
+
+    Like ``apply_match`` it does not commit.
+    """
+    # Serializes with match recording: no match can be rated in between
+    version = bump_version(group.id)
+    history = _history(group.id, match.id, window)
+    if not history or history[0][0].id != match.id:
+        # Voided by a request that held the lock first; don't void the next match instead
+        raise VoidError(f'Match {match.id} has already been voided')
+    m, spec, stored = history[0]
+    if not _complete(stored):
+        raise VoidError('Matches recorded before rating deltas were stored cannot be voided')
+    shift, rerated = _rerate(history)
+    results = outcomes(spec)
+
+    MatchParticipant.query.filter_by(match_id=m.id).delete(synchronize_session=False)
+    Match.query.filter_by(id=m.id).delete(synchronize_session=False)
+    _write_rerated(rerated)
+
+    ids = sorted(set(shift) | set(stored))
+    base = base_for_update(group, version)
+    if base is None:
+        rankings = {
+            r.user_id: r for r in
+            Ranking.query.filter(Ranking.group_id == group.id, Ranking.user_id.in_(ids)).with_for_update()
+        }
+    else:
+        # Players who left the group have no ranking to correct
+        rankings = {uid: r for uid in ids if (r := base.get(uid)) is not None}
+    for uid, r in rankings.items():
+        r.points += shift.get(uid, 0)
+        outcome = results.get(uid)
+        if outcome is not None:
+            counter = {'win': 'wins', 'loss': 'losses', 'tie': 'ties'}[outcome]
+            r.games = max(0, r.games - 1)
+            setattr(r, counter, max(0, getattr(r, counter) - 1))
+            r.streak, r.last_played_at = _form(group.id, uid)
+    if base is not None and rankings:
+        write_through(base, version, rankings)
+
+    return {
+        'ok': True,
+        'voided': m.id,
+        'rerated_matches': len(rerated),
+        'players': [{'id': uid, 'elo': r.points, 'delta': shift.get(uid, 0)} for uid, r in sorted(rankings.items())],
+    }
@@ -0,0 +1,106 @@
+"""Benchmark response compression on representative API payloads.
+
+Seeds a group in an in-memory SQLite database, fetches the uncompressed
+bodies of the largest responses the app serves, then reports for every
+available encoding and a few levels the bytes on the wire, the CPU time to
+compress, and the total time to deliver the body over a slow mobile link.
+
+Payloads:
+
+* ``get_group`` with --members members and their rankings
+* ``list_matches`` 100-row page of mixed duel/team/FFA results
+* the win-probability matrix of a 100-member group
+* the CSV export of the group's history
+
+Usage:
+    python benchmarks/compression.py
+    python benchmarks/compression.py --members 2000 --mbps 2
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+LEVELS = {'gzip': (1, 6, 9), 'br': (1, 4, 11), 'zstd': (1, 3, 19)}
+
+
+def seed(app, client, args):
+    from app import db
+    from app.models import User, Membership
+
+    rng = random.Random(5)
+    owner = client.post('/api/users', json={'username': 'bench_owner', 'password': 'secret1'}).get_json()
+    headers = {'Authorization': f"Bearer {owner['token']}"}
+    gids = []
+    for name, size in (('bench_big', args.members), ('bench_matrix', 100)):
+        gid = client.post('/api/groups', headers=headers, json={'name': name, 'sport': 'bench'}).get_json()['group']['id']
+        with app.app_context():
+            users = [User(username=f'{name}_player_{i}', password_hash='x') for i in range(size)]
+            db.session.add_all(users)
+            db.session.flush()
+            db.session.add_all(Membership(user_id=u.id, group_id=gid, role='member') for u in users)
+            db.session.commit()
+            ids = [u.id for u in users]
+        for _ in range(args.matches):
+            kind = rng.random()
+            if kind < 0.5:
+                a, b = rng.sample(ids, 2)
+                payload = {'winner_id': a, 'loser_id': b, 'score_a': rng.randint(5, 11), 'score_b': rng.randint(0, 4)}
+            elif kind < 0.8:
+                p = rng.sample(ids, 4)
+                payload = {'playersA': p[:2], 'playersB': p[2:], 'winner_team': rng.choice((1, 2))}
+            else:
+                payload = {'mode': 'ffa', 'ordering': rng.sample(ids, 5)}
+            client.post(f'/api/groups/{gid}/matches', headers=headers, json=payload)
+        gids.append(gid)
+    return headers, gids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--members', type=int, default=500)
+    parser.add_argument('--matches', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--mbps', type=float, default=5.0, help='Link speed for the delivery-time estimate.')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite://'
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    os.environ['COMPRESS_ENABLED'] = 'false'
+    from app import create_app
+    from app.compression import available_encodings, compress
+
+    app = create_app()
+    client = app.test_client()
+    headers, (big, matrix) = seed(app, client, args)
+    payloads = {
+        'get_group': f'/api/groups/{big}',
+        'list_matches 100': f'/api/groups/{big}/matches?limit=100',
+        'matrix 100': f'/api/groups/{matrix}/predict/matrix',
+        'export csv': f'/api/groups/{big}/matches/export?format=csv',
+    }
+
+    print(f"{'payload':<18} {'encoding':<9} {'bytes':>9} {'ratio':>6} {'cpu ms':>7} {'wire ms':>8} {'total ms':>9}")
+    for label, path in payloads.items():
+        data = client.get(path, headers=headers).data
+        wire = len(data) * 8 / (args.mbps * 1000)
+        print(f"{label:<18} {'identity':<9} {len(data):>9,} {1.0:>6.2f} {0.0:>7.2f} {wire:>8.1f} {wire:>9.1f}")
+        for encoding in available_encodings():
+            for level in LEVELS[encoding]:
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    body = compress(data, encoding, level)
+                    timings.append((time.perf_counter() - start) * 1000)
+                cpu = statistics.median(timings)
+                wire = len(body) * 8 / (args.mbps * 1000)
+                print(f"{'':<18} {f'{encoding}-{level}':<9} {len(body):>9,} {len(data) / len(body):>6.1f} "
+                      f"{cpu:>7.2f} {wire:>8.1f} {cpu + wire:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
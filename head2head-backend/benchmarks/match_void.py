@@ -0,0 +1,149 @@
+"""Benchmark voiding a match (``POST /groups/<id>/matches/<mid>/void``) against a full replay.
+
+Imports a random history of duels, team matches and FFA rounds into one group
+of an in-memory SQLite database (or --url), then voids matches at growing
+distances from the end of the history.  Each void is compared with what
+undoing the match by replaying the whole group would cost: loading every
+match, re-rating it from 1000 and writing every ranking.  After each void the
+ratings left by the incremental rollback are checked against that replay.
+
+Usage:
+    python benchmarks/match_void.py
+    python benchmarks/match_void.py --matches 50000 --players 500 --back 1 10 100 1000
+    python benchmarks/match_void.py --url postgresql+psycopg2://postgres@localhost/h2h
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def write_history(path, usernames, n, rng):
+    """NDJSON for ``flask import-matches``: 60% duels, 25% 2v2, 15% FFA."""
+    start = datetime(2024, 1, 1)
+    with open(path, 'w') as f:
+        for i in range(n):
+            kind = rng.random()
+            rec = {'played_at': (start + timedelta(minutes=i)).isoformat()}
+            if kind < 0.6:
+                a, b = rng.sample(usernames, 2)
+                rec.update(mode='duel', team_a=[a], team_b=[b], result=rng.choice('aab') if rng.random() > 0.1 else 'tie')
+            elif kind < 0.85:
+                s = rng.sample(usernames, 4)
+                rec.update(mode='team', team_a=s[:2], team_b=s[2:], result=rng.choice(['a', 'b', 'tie']))
+            else:
+                s = rng.sample(usernames, rng.randint(3, 6))
+                rec.update(mode='ffa', placements={u: p for p, u in enumerate(s, start=1)})
+            f.write(json.dumps(rec) + '\n')
+
+
+def full_replay(group_id):
+    """Ratings from replaying the group's whole history, written to ``rankings`` like a rebuild would."""
+    from sqlalchemy import select
+    from app import db
+    from app.matches import compute_deltas, participants
+    from app.models import Match, MatchParticipant, Ranking
+    from app.voiding import _stored_spec
+
+    matches = db.session.execute(
+        select(Match.id, Match.is_tie, Match.winner_id, Match.loser_id)
+        .where(Match.group_id == group_id).order_by(Match.id)
+    ).all()
+    parts = {}
+    for p in db.session.execute(
+        select(MatchParticipant.match_id, MatchParticipant.user_id, MatchParticipant.team, MatchParticipant.place)
+        .join(Match, Match.id == MatchParticipant.match_id)
+        .where(Match.group_id == group_id).order_by(MatchParticipant.id)
+    ):
+        parts.setdefault(p.match_id, []).append(p)
+    points = {}
+    for m in matches:
+        spec = _stored_spec(m, parts.get(m.id, []))
+        for uid in participants(spec):
+            points.setdefault(uid, 1000)
+        for uid, delta in compute_deltas(spec, points).items():
+            points[uid] += delta
+    rankings = Ranking.__table__
+    db.session.execute(
+        rankings.update()
+        .where(rankings.c.group_id == group_id, rankings.c.user_id == db.bindparam('r_user'))
+        .values(points=db.bindparam('r_points')),
+        [{'r_user': uid, 'r_points': p} for uid, p in points.items()],
+    )
+    return points
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='sqlite://')
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--matches', type=int, default=20000)
+    parser.add_argument('--back', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help='Void the match this many from the end of the history.')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.url
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    os.environ.setdefault('MATCH_VOID_WINDOW', str(max(args.back)))
+    from app import create_app, db
+    from app.models import User, Membership, Match, Ranking
+
+    app = create_app()
+    client = app.test_client()
+    rng = random.Random(42)
+    owner = client.post('/api/users', json={'username': 'bench_owner', 'password': 'secret1'}).get_json()
+    headers = {'Authorization': f"Bearer {owner['token']}"}
+    gid = client.post('/api/groups', headers=headers, json={'name': 'bench_void', 'sport': 'bench'}).get_json()['group']['id']
+
+    with app.app_context():
+        users = [User(username=f'bench_void_{i}', password_hash='x') for i in range(args.players)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all(Membership(user_id=u.id, group_id=gid, role='member') for u in users)
+        db.session.commit()
+        usernames = [u.username for u in users]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'history.ndjson')
+        write_history(path, usernames, args.matches, rng)
+        started = time.perf_counter()
+        with app.app_context():
+            result = app.test_cli_runner().invoke(args=['import-matches', str(gid), path])
+        assert result.exit_code == 0, result.output or repr(result.exception)
+        print(f'Imported {args.matches} matches for {args.players} players in {time.perf_counter() - started:.1f}s')
+
+    print(f"{'back':>6} {'rerated':>8} {'void ms':>9} {'replay ms':>10} {'speedup':>8} {'check':>6}")
+    for back in sorted(args.back):
+        with app.app_context():
+            match_id = (
+                db.session.query(Match.id).filter(Match.group_id == gid)
+                .order_by(Match.id.desc()).offset(back - 1).limit(1).scalar()
+            )
+            started = time.perf_counter()
+            full_replay(gid)
+            replay_ms = (time.perf_counter() - started) * 1000
+            db.session.rollback()
+
+        started = time.perf_counter()
+        resp = client.post(f'/api/groups/{gid}/matches/{match_id}/void', headers=headers)
+        void_ms = (time.perf_counter() - started) * 1000
+        body = resp.get_json()
+        assert resp.status_code == 200, body
+
+        with app.app_context():
+            expected = full_replay(gid)
+            db.session.rollback()
+            actual = dict(db.session.query(Ranking.user_id, Ranking.points).filter(Ranking.group_id == gid))
+        check = 'ok' if all(actual.get(uid, 1000) == p for uid, p in expected.items()) else 'FAIL'
+        print(f"{back:>6} {body['rerated_matches']:>8} {void_ms:>9.1f} {replay_ms:>10.1f} "
+              f"{replay_ms / void_ms:>7.1f}x {check:>6}")
+
+
+if __name__ == '__main__':
+    main()
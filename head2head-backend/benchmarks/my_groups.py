@@ -0,0 +1,114 @@
+"""Benchmark the group list summary (``GET /my/groups``).
+
+Seeds one user into --groups groups of --members members each (ratings and a
+few matches per group) in an in-memory SQLite database (or --url), then
+compares the summary with what the client needed before it: the plain list
+plus ``GET /groups/<id>`` per group for member counts and the user's rating
+and rank.  Reports latency and SQL statements per approach, and with
+--explain the plan of the summary statement.
+
+Usage:
+    python benchmarks/my_groups.py
+    python benchmarks/my_groups.py --groups 500 --members 200 --url postgresql+psycopg2://postgres@localhost/h2h --explain
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='sqlite://')
+    parser.add_argument('--groups', type=int, default=300)
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--matches', type=int, default=20, help='Matches per group.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--explain', action='store_true', help='Print the query plan (Postgres).')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.url
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    os.environ.setdefault('RATING_CACHE_ENABLED', 'false')
+    from sqlalchemy import event, text
+    from app import create_app, db
+    from app.models import User, Group, Membership, Ranking, Match
+    from app.routes import _my_groups_query
+
+    app = create_app()
+    client = app.test_client()
+    rng = random.Random(42)
+    me = client.post('/api/users', json={'username': 'bench_me', 'password': 'secret1'}).get_json()
+    headers = {'Authorization': f"Bearer {me['token']}"}
+    my_id = me['user']['id']
+
+    started = time.perf_counter()
+    with app.app_context():
+        users = [User(username=f'bench_mg_{i}', password_hash='x') for i in range(args.members * 4)]
+        groups = [Group(name=f'bench_mg_{i}', sport='bench', default_team_size=1) for i in range(args.groups)]
+        db.session.add_all(users + groups)
+        db.session.flush()
+        memberships, rankings, matches = [], [], []
+        now = datetime.utcnow()
+        for g in groups:
+            others = rng.sample(users, args.members - 1)
+            memberships.append({'user_id': my_id, 'group_id': g.id, 'role': 'member', 'joined_at': now})
+            memberships += [{'user_id': u.id, 'group_id': g.id, 'role': 'member', 'joined_at': now} for u in others]
+            # Most members have played and have a ranking row; the rest count as 1000
+            rankings += [
+                {'user_id': uid, 'group_id': g.id, 'points': int(rng.gauss(1000, 120)), 'updated_at': now}
+                for uid in [my_id] + [u.id for u in others] if rng.random() < 0.8
+            ]
+            matches += [
+                {'group_id': g.id, 'winner_id': others[0].id, 'loser_id': others[1].id, 'is_tie': False,
+                 'created_at': now - timedelta(minutes=rng.randrange(100000))}
+                for _ in range(args.matches)
+            ]
+        db.session.execute(Membership.__table__.insert(), memberships)
+        db.session.execute(Ranking.__table__.insert(), rankings)
+        db.session.execute(Match.__table__.insert(), matches)
+        db.session.commit()
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+    print(f'Seeded {args.groups} groups x {args.members} members in {time.perf_counter() - started:.1f}s')
+
+    statements = [0]
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    def per_group():
+        groups = client.get(f'/api/my/groups?limit={args.groups}', headers=headers).get_json()['groups']
+        for g in groups:
+            assert client.get(f"/api/groups/{g['id']}", headers=headers).status_code == 200
+
+    def summary():
+        offset = 0
+        while offset is not None:
+            body = client.get(f'/api/my/groups?offset={offset}', headers=headers).get_json()
+            offset = body['next_offset']
+
+    print(f"{'approach':>22} {'p50 ms':>9} {'max ms':>9} {'statements':>11}")
+    for label, fn in (('list + get_group each', per_group), ('summary, 100 per page', summary)):
+        timings = []
+        for _ in range(args.repeat):
+            statements[0] = 0
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f'{label:>22} {statistics.median(timings):>9.1f} {max(timings):>9.1f} {statements[0]:>11}')
+
+    if args.explain:
+        with app.app_context():
+            query = _my_groups_query(my_id).limit(101).compile(db.engine, compile_kwargs={'literal_binds': True})
+            for (line,) in db.session.execute(text(f'EXPLAIN {query}')):
+                print(line)
+
+
+if __name__ == '__main__':
+    main()
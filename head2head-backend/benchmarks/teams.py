@@ -0,0 +1,92 @@
+"""Benchmark the balanced team generator (``POST /groups/<id>/teams``).
+
+Seeds a group with random ratings in an in-memory SQLite database (or
+--url), then calls the endpoint for growing player counts, both as two big
+teams and as many pairs, and reports latency and the resulting imbalance.
+For small counts the two-team split is also compared with the exact optimum
+found by brute force, which is what stops scaling past ~20 players.
+
+Usage:
+    python benchmarks/teams.py
+    python benchmarks/teams.py --sizes 10 20 50 100 200 500 --repeat 5
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def brute_force_spread(ratings):
+    """Smallest average-rating gap over every split into two equal halves."""
+    n = len(ratings)
+    total = sum(ratings)
+    best = float('inf')
+    # Fixing player 0 on the first team skips mirrored splits
+    for rest in itertools.combinations(range(1, n), n // 2 - 1):
+        a = ratings[0] + sum(ratings[i] for i in rest)
+        best = min(best, abs(total - 2 * a) / (n // 2))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='sqlite://')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 16, 20, 50, 100, 200, 500])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--exact-up-to', type=int, default=20, help='Brute-force the optimum up to this many players.')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.url
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    from app import create_app, db
+    from app.models import User, Group, Membership, Ranking
+
+    app = create_app()
+    client = app.test_client()
+    rng = random.Random(42)
+    owner = client.post('/api/users', json={'username': 'bench_owner', 'password': 'secret1'}).get_json()
+    headers = {'Authorization': f"Bearer {owner['token']}"}
+    gid = client.post('/api/groups', headers=headers, json={'name': 'bench_teams', 'sport': 'bench'}).get_json()['group']['id']
+
+    with app.app_context():
+        users = [User(username=f'bench_{i}', password_hash='x') for i in range(max(args.sizes))]
+        db.session.add_all(users)
+        db.session.flush()
+        for u in users:
+            db.session.add(Membership(user_id=u.id, group_id=gid, role='member'))
+            db.session.add(Ranking(user_id=u.id, group_id=gid, points=int(rng.gauss(1000, 150))))
+        db.session.commit()
+        ids = [u.id for u in users]
+        ratings = {uid: p for uid, p in db.session.query(Ranking.user_id, Ranking.points).filter(Ranking.group_id == gid)}
+
+    print(f"{'players':>7} {'shape':>8} {'p50 ms':>8} {'max ms':>8} {'swaps':>6} {'spread':>7} {'gap':>7} {'optimum':>8}")
+    try:
+        for n in args.sizes:
+            players = rng.sample(ids, n)
+            for label, team_size in (('2 teams', n // 2), ('pairs', 2)):
+                timings, body = [], None
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    resp = client.post(f'/api/groups/{gid}/teams', headers=headers,
+                                       json={'players': players, 'team_size': team_size})
+                    timings.append((time.perf_counter() - start) * 1000)
+                    body = resp.get_json()
+                    assert body['ok'], body
+                optimum = ''
+                if label == '2 teams' and n <= args.exact_up_to:
+                    optimum = f'{brute_force_spread([ratings[uid] for uid in players]):.1f}'
+                print(f"{n:>7} {label:>8} {statistics.median(timings):>8.1f} {max(timings):>8.1f} {body['swaps']:>6} "
+                      f"{body['imbalance']['elo_spread']:>7.1f} {body['imbalance']['expected_score_gap']:>7.4f} {optimum:>8}")
+    finally:
+        with app.app_context():
+            db.session.delete(db.session.get(Group, gid))
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+"""Database support checks made at startup."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.dialects import configure_engine
+
+
+def test_unsupported_database_is_rejected_at_startup(sqlite_app):
+    engine = SimpleNamespace(dialect=SimpleNamespace(name='mysql'))
+    with pytest.raises(ValueError, match='Unsupported DATABASE_URL: mysql'):
+        configure_engine(engine, sqlite_app.config)
@@ -0,0 +1,52 @@
+"""Match history export carries each participant's rating change."""
+import csv
+import io
+import json
+
+from app import db
+from app.models import Match, MatchParticipant
+
+
+def _export(app, group, fmt):
+    resp = app.test_client().get(f'/api/groups/{group.id}/matches/export?format={fmt}', headers=group.headers)
+    assert resp.status_code == 200
+    return resp.get_data(as_text=True)
+
+
+def test_export_includes_points_before_and_delta(any_app, make_group):
+    group = make_group(any_app, 4)
+    a, b, c, d = group.members
+    client = any_app.test_client()
+    for body in ({'winner_id': a, 'loser_id': b},
+                 {'playersA': [a, b], 'playersB': [c, d], 'winner_team': 2},
+                 {'ffa': True, 'placements': {str(a): 1, str(b): 2, str(c): 3}},
+                 {'winner_id': c, 'loser_id': d}):
+        assert client.post(f'/api/groups/{group.id}/matches', headers=group.headers, json=body).status_code == 201
+    with any_app.app_context():
+        # The last match stands in for one recorded before ratings were stored
+        old = Match.query.filter_by(group_id=group.id).order_by(Match.id.desc()).first()
+        old.winner_points_before = old.winner_delta = old.loser_points_before = old.loser_delta = None
+        db.session.commit()
+        stored = {}
+        for m in Match.query.filter_by(group_id=group.id):
+            stored[(m.id, m.winner_id)] = (m.winner_points_before, m.winner_delta)
+            stored[(m.id, m.loser_id)] = (m.loser_points_before, m.loser_delta)
+        for p in MatchParticipant.query.join(Match).filter(Match.group_id == group.id):
+            stored[(p.match_id, p.user_id)] = (p.points_before, p.delta)
+
+    ndjson = [json.loads(line) for line in _export(any_app, group, 'ndjson').splitlines()]
+    from_ndjson = {(m['id'], p['user']['id']): (p['points_before'], p['delta'])
+                   for m in ndjson for p in m['participants']}
+    assert len(from_ndjson) == 2 + 4 + 3 + 2
+    assert from_ndjson == {k: v for k, v in stored.items() if k in from_ndjson}
+    assert from_ndjson[(ndjson[0]['id'], a)] == (1000, 16)
+    assert from_ndjson[(ndjson[-1]['id'], c)] == (None, None)
+
+    rows = list(csv.DictReader(io.StringIO(_export(any_app, group, 'csv'))))
+    from_csv = {(int(r['match_id']), int(r['user_id'])): (r['points_before'], r['delta']) for r in rows}
+    assert from_csv == {k: ('' if before is None else str(before), '' if delta is None else str(delta))
+                        for k, (before, delta) in from_ndjson.items()}
+
+    # The match list keeps its shape
+    listed = client.get(f'/api/groups/{group.id}/matches', headers=group.headers).get_json()['matches']
+    assert all('delta' not in p for m in listed for p in m['participants'])
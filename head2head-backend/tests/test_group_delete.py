@@ -0,0 +1,34 @@
+"""Deleting an abandoned group: the request frees its name, ``flask worker`` removes the rest."""
+from app import db
+from app.jobs import run_once
+from app.models import Group, Job, Match, Membership, Ranking
+
+
+def test_last_owner_leaving_frees_the_name_before_the_worker_runs(any_app, make_group):
+    group = make_group(any_app, 2)
+    client = any_app.test_client()
+    a, b = group.members
+    assert client.post(f'/api/groups/{group.id}/matches', headers=group.headers,
+                       json={'winner_id': a, 'loser_id': b}).status_code == 201
+    name = client.get(f'/api/groups/{group.id}', headers=group.headers).get_json()['group']['name']
+    with any_app.app_context():
+        # The other member has left already
+        Ranking.query.filter_by(group_id=group.id, user_id=b).delete()
+        Membership.query.filter_by(group_id=group.id, user_id=b).delete()
+        db.session.commit()
+
+    resp = client.post(f'/api/groups/{group.id}/leave', headers=group.headers)
+    assert resp.get_json()['group_deleted'] is True
+
+    # No worker has run yet, and the name is already free
+    again = client.post('/api/groups', headers=group.headers, json={'name': name, 'sport': 'test'})
+    assert again.status_code == 201
+    new_id = again.get_json()['group']['id']
+
+    with any_app.app_context():
+        while run_once():
+            pass
+        assert Group.query.get(group.id) is None
+        assert Match.query.filter_by(group_id=group.id).count() == 0
+        assert Job.query.filter_by(kind='delete_group', group_id=group.id).one().status == 'done'
+        assert Group.query.get(new_id).name == name
@@ -0,0 +1,143 @@
+"""``Idempotency-Key`` on match recording, invites and voiding."""
+import threading
+import time
+
+import pytest
+
+from app import db
+from app import routes
+from app.models import IdempotencyKey, Match
+
+
+def _post(app, group, path, key, json, headers=None):
+    return app.test_client().post(f'/api/groups/{group.id}{path}', json=json,
+                                  headers={**group.headers, 'Idempotency-Key': key, **(headers or {})})
+
+
+def _matches(app, group):
+    with app.app_context():
+        return Match.query.filter_by(group_id=group.id).count()
+
+
+def _stored_keys(app, key):
+    with app.app_context():
+        return IdempotencyKey.query.filter_by(key=key).count()
+
+
+def _username(app, user_id):
+    with app.app_context():
+        return db.session.execute(db.text('SELECT username FROM users WHERE id = :id'), {'id': user_id}).scalar()
+
+
+def test_repeat_replays_the_stored_response(any_app, make_group, monkeypatch):
+    monkeypatch.setitem(any_app.config, 'MATCH_PIPELINE', 'prefer')
+    group = make_group(any_app, 2)
+    duel = {'winner_id': group.members[0], 'loser_id': group.members[1]}
+    first = _post(any_app, group, '/matches', 'k1', duel)
+    again = _post(any_app, group, '/matches', 'k1', duel)
+    assert first.status_code == again.status_code == 201
+    assert again.get_json() == first.get_json()
+    assert again.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert _matches(any_app, group) == 1
+
+    # Queued recording replays its 202 and Location as well
+    queued = _post(any_app, group, '/matches', 'k2', duel, {'Prefer': 'respond-async'})
+    replayed = _post(any_app, group, '/matches', 'k2', duel, {'Prefer': 'respond-async'})
+    assert queued.status_code == replayed.status_code == 202
+    assert replayed.headers['Location'] == queued.headers['Location']
+    assert replayed.get_json() == queued.get_json()
+
+
+def test_key_reused_for_a_different_request_is_rejected(any_app, make_group):
+    group = make_group(any_app, 2)
+    a, b = group.members
+    assert _post(any_app, group, '/matches', 'k1', {'winner_id': a, 'loser_id': b}).status_code == 201
+    reused = _post(any_app, group, '/matches', 'k1', {'winner_id': b, 'loser_id': a})
+    assert reused.status_code == 422
+    assert _matches(any_app, group) == 1
+
+
+def test_failed_requests_leave_no_key(any_app, make_group, monkeypatch):
+    group = make_group(any_app, 2)
+    a, b = group.members
+    duel = {'winner_id': a, 'loser_id': b}
+
+    # 400: validation error
+    assert _post(any_app, group, '/matches', 'bad', {'winner_id': a, 'loser_id': a}).status_code == 400
+    assert _stored_keys(any_app, 'bad') == 0
+    # 403: a member who isn't the owner may not void
+    token = any_app.test_client().post(
+        '/api/auth/login', json={'username': _username(any_app, b), 'password': 'secret1'}).get_json()['token']
+    assert _post(any_app, group, '/matches', 'rec', duel).status_code == 201
+    with any_app.app_context():
+        match_id = Match.query.filter_by(group_id=group.id).one().id
+    denied = _post(any_app, group, f'/matches/{match_id}/void', 'void', {},
+                   {'Authorization': f'Bearer {token}'})
+    assert denied.status_code == 403
+    assert _stored_keys(any_app, 'void') == 0
+
+    # 409 after the view rolled back: the match is too far back to void
+    assert _post(any_app, group, '/matches', 'rec2', {'winner_id': b, 'loser_id': a}).status_code == 201
+    monkeypatch.setitem(any_app.config, 'MATCH_VOID_WINDOW', 0)
+    assert _post(any_app, group, f'/matches/{match_id}/void', 'void', {}).status_code == 409
+    assert _stored_keys(any_app, 'void') == 0
+
+    # An unexpected error rolls the key back with everything else
+    def broken(group, spec):
+        raise RuntimeError('boom')
+    with monkeypatch.context() as m:
+        m.setattr(routes, 'apply_match', broken)
+        with pytest.raises(RuntimeError):
+            _post(any_app, group, '/matches', 'boom', duel)
+    assert _stored_keys(any_app, 'boom') == 0
+
+    # Each of those keys can still be used once the request succeeds
+    assert _post(any_app, group, '/matches', 'bad', duel).status_code == 201
+    assert _post(any_app, group, '/matches', 'boom', duel).status_code == 201
+    monkeypatch.setitem(any_app.config, 'MATCH_VOID_WINDOW', 10)
+    assert _post(any_app, group, f'/matches/{match_id}/void', 'void', {}).status_code == 200
+
+
+def test_concurrent_duplicate_waits_for_the_first_commit(any_app, make_group, monkeypatch):
+    group = make_group(any_app, 2)
+    duel = {'winner_id': group.members[0], 'loser_id': group.members[1]}
+    started = threading.Event()
+    real = routes.apply_match
+
+    def slow(group, spec):
+        # The first request holds its claim (and on SQLite the write lock) meanwhile
+        started.set()
+        time.sleep(0.3)
+        return real(group, spec)
+    monkeypatch.setattr(routes, 'apply_match', slow)
+
+    responses = {}
+
+    def send(name):
+        responses[name] = _post(any_app, group, '/matches', 'same', duel)
+
+    first = threading.Thread(target=send, args=('first',))
+    first.start()
+    assert started.wait(5)
+    second = threading.Thread(target=send, args=('second',))
+    second.start()
+    first.join()
+    second.join()
+
+    assert responses['first'].status_code == responses['second'].status_code == 201
+    assert responses['second'].get_json() == responses['first'].get_json()
+    assert responses['second'].headers['Idempotent-Replayed'] == 'true'
+    assert _matches(any_app, group) == 1
+
+
+def test_invites_are_idempotent(any_app, make_group):
+    group = make_group(any_app, 1)
+    client = any_app.test_client()
+    client.post('/api/users', json={'username': f'guest{group.id}', 'password': 'secret1'})
+    body = {'username': f'guest{group.id}'}
+    first = _post(any_app, group, '/invites', 'inv', body)
+    again = _post(any_app, group, '/invites', 'inv', body)
+    assert first.status_code == again.status_code
+    assert again.get_json() == first.get_json()
+    assert again.headers['Idempotent-Replayed'] == 'true'
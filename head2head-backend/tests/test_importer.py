@@ -0,0 +1,81 @@
+"""``flask import-matches`` into a group that already has live matches."""
+import json
+
+from app import db
+from app.models import Ranking
+from app.stats import COUNTERS
+
+
+def _counters(app, group_id):
+    with app.app_context():
+        return {
+            r.user_id: {c: getattr(r, c) for c in ('points',) + COUNTERS}
+            for r in Ranking.query.filter_by(group_id=group_id)
+        }
+
+
+def _cli(app, *args):
+    with app.app_context():
+        result = app.test_cli_runner().invoke(args=list(args))
+    assert result.exit_code == 0, result.output or repr(result.exception)
+    return result.output
+
+
+def _record_live(app, group):
+    client = app.test_client()
+    a, b, c, d, e = group.members
+    for winner, loser in ((a, b), (a, c), (b, a), (d, e), (e, d), (c, d)):
+        resp = client.post(f'/api/groups/{group.id}/matches', headers=group.headers,
+                           json={'winner_id': winner, 'loser_id': loser})
+        assert resp.status_code == 201
+
+
+def test_importing_older_history_matches_a_backfill(any_app, make_group, tmp_path):
+    group = make_group(any_app, 5)
+    _record_live(any_app, group)
+    with any_app.app_context():
+        names = dict(db.session.execute(db.text('SELECT id, username FROM users')).all())
+    u = [names[uid] for uid in group.members]
+    # Every imported result predates the live matches and disagrees with the live form
+    history = [
+        {'played_at': '2024-03-01T10:00:00', 'team_a': [u[1]], 'team_b': [u[0]], 'result': 'a'},
+        {'played_at': '2024-03-02T10:00:00', 'team_a': [u[0]], 'team_b': [u[1]], 'result': 'tie'},
+        {'played_at': '2024-03-03T10:00:00', 'team_a': [u[2], u[3]], 'team_b': [u[4], u[0]], 'result': 'b'},
+        {'played_at': '2024-03-04T10:00:00', 'placements': {u[3]: 1, u[1]: 2, u[2]: 3}},
+        {'played_at': '2024-03-05T10:00:00', 'team_a': [u[4]], 'team_b': [u[2]], 'result': 'a'},
+    ]
+    path = tmp_path / 'history.ndjson'
+    path.write_text(''.join(json.dumps(rec) + '\n' for rec in history))
+    live = _counters(any_app, group.id)
+
+    output = _cli(any_app, 'import-matches', str(group.id), str(path))
+    imported = _counters(any_app, group.id)
+    # The latest results are still the live ones
+    for uid in group.members:
+        assert imported[uid]['last_played_at'] == live[uid]['last_played_at']
+        assert imported[uid]['streak'] == live[uid]['streak']
+        assert imported[uid]['games'] > live[uid]['games']
+    assert 'recomputed' in output
+
+    _cli(any_app, 'backfill-stats', '--group', str(group.id))
+    assert _counters(any_app, group.id) == imported
+
+
+def test_importing_newer_history_continues_the_counters(any_app, make_group, tmp_path):
+    group = make_group(any_app, 5)
+    _record_live(any_app, group)
+    with any_app.app_context():
+        names = dict(db.session.execute(db.text('SELECT id, username FROM users')).all())
+    a, b = (names[uid] for uid in group.members[:2])
+    path = tmp_path / 'history.csv'
+    path.write_text('played_at,team_a,team_b,result\n2999-01-01T00:00:00,%s,%s,a\n2999-01-02T00:00:00,%s,%s,a\n'
+                    % (a, b, a, b))
+
+    output = _cli(any_app, 'import-matches', str(group.id), str(path))
+    assert 'recomputed' not in output
+    imported = _counters(any_app, group.id)
+    assert imported[group.members[0]]['streak'] == 2
+    assert imported[group.members[1]]['streak'] == -2
+
+    _cli(any_app, 'backfill-stats', '--group', str(group.id))
+    assert _counters(any_app, group.id) == imported
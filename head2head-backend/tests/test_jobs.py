@@ -0,0 +1,119 @@
+"""The queued match pipeline: when requests are queued, per-group claim order and concurrent workers."""
+import random
+import threading
+import time
+
+from app import db
+from app import jobs
+from app.jobs import enqueue, claim_next, run_once
+from app.matches import parse_match, compute_deltas
+from app.models import Job, Ranking
+
+
+def _enqueue(app, order, seed=7):
+    """Queue a random duel for each group in ``order``; returns ``(job_id, group_id, payload)`` triples."""
+    rng = random.Random(seed)
+    queued = []
+    with app.app_context():
+        for group in order:
+            a, b = rng.sample(group.members, 2)
+            payload = {'winner_id': a, 'loser_id': b, 'tie': rng.random() < 0.2}
+            job = enqueue('record_match', group_id=group.id, payload=payload, submitted_by=group.members[0])
+            queued.append((job.id, group.id, payload))
+        db.session.commit()
+    return queued
+
+
+def test_prefer_respond_async_only_queues_where_configured(any_app, make_group, monkeypatch):
+    group = make_group(any_app, 2)
+    client = any_app.test_client()
+
+    def record(prefer=None):
+        headers = {**group.headers, **({'Prefer': prefer} if prefer else {})}
+        return client.post(f'/api/groups/{group.id}/matches', headers=headers,
+                           json={'winner_id': group.members[0], 'loser_id': group.members[1]}).status_code
+
+    # Left at "sync" there may be no worker: the preference is ignored
+    assert record('respond-async') == 201
+    monkeypatch.setitem(any_app.config, 'MATCH_PIPELINE', 'prefer')
+    assert (record(), record('respond-async, wait=5')) == (201, 202)
+    monkeypatch.setitem(any_app.config, 'MATCH_PIPELINE', 'async')
+    assert record() == 202
+    with any_app.app_context():
+        assert Job.query.filter_by(group_id=group.id).count() == 2
+
+
+def test_only_each_groups_oldest_job_is_claimable(pg_app, make_group):
+    g1, g2 = make_group(pg_app, 3), make_group(pg_app, 3)
+    queued = _enqueue(pg_app, [g1, g1, g2, g1, g2])
+    heads = {gid: min(job_id for job_id, g, _ in queued if g == gid) for gid in (g1.id, g2.id)}
+
+    # Each nested app context has its own session, so these are three workers
+    with pg_app.app_context():
+        first = claim_next()
+        assert (first.group_id, first.id) == (g1.id, heads[g1.id])
+        with pg_app.app_context():
+            # g1's head is held: its later jobs must wait, so g2's head is next, not g1's second job
+            second = claim_next()
+            assert (second.group_id, second.id) == (g2.id, heads[g2.id])
+            with pg_app.app_context():
+                assert claim_next() is None
+
+
+def test_two_workers_apply_each_groups_jobs_in_submission_order(pg_app, make_group, monkeypatch):
+    g1, g2 = make_group(pg_app, 4), make_group(pg_app, 4)
+    # Interleaved in runs, so both workers often find the same group at the front of the queue
+    rng = random.Random(3)
+    queued = _enqueue(pg_app, [rng.choice([g1, g2]) for _ in range(40)])
+
+    # Random delays before each apply let the workers overlap and race
+    handler = jobs._handlers['record_match']
+
+    def slow(job):
+        time.sleep(random.random() * 0.01)
+        return handler(job)
+    monkeypatch.setitem(jobs._handlers, 'record_match', slow)
+
+    errors = []
+
+    def work():
+        try:
+            with pg_app.app_context():
+                deadline = time.monotonic() + 30
+                while time.monotonic() < deadline:
+                    if run_once():
+                        continue
+                    # Nothing runnable may only mean the other worker holds both heads
+                    if not Job.query.filter_by(status='queued').count():
+                        return
+                    db.session.rollback()
+                    time.sleep(0.01)
+                errors.append('queue did not drain')
+        except Exception as e:  # surfaced in the main thread
+            errors.append(repr(e))
+
+    workers = [threading.Thread(target=work) for _ in range(2)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert not errors
+
+    with pg_app.app_context():
+        done = {j.id: j for j in Job.query.filter(Job.id.in_([job_id for job_id, _, _ in queued]))}
+        assert {j.status for j in done.values()} == {'done'}
+        for group in (g1, g2):
+            job_ids = sorted(job_id for job_id, gid, _ in queued if gid == group.id)
+            # Matches get ids as they are applied: submission order must be apply order
+            match_ids = [done[job_id].match_id for job_id in job_ids]
+            assert match_ids == sorted(match_ids)
+
+            # Final ratings match replaying the group's jobs one by one in submission order
+            expected = {uid: 1000 for uid in group.members}
+            for _, gid, payload in queued:
+                if gid == group.id:
+                    for uid, delta in compute_deltas(parse_match(payload), expected).items():
+                        expected[uid] += delta
+            actual = dict(db.session.query(Ranking.user_id, Ranking.points).filter(Ranking.group_id == group.id))
+            assert actual == {uid: p for uid, p in expected.items() if uid in actual}
+            assert all(p == 1000 for uid, p in expected.items() if uid not in actual)
@@ -0,0 +1,115 @@
+"""Admission control on write endpoints: per-route buckets (429) and the write cap (503)."""
+import threading
+
+import pytest
+
+from app import create_app, db
+from app import routes
+from app.ratelimit import MemoryBucketStore, parse_rate
+
+
+class FakeClockStore(MemoryBucketStore):
+    """The in-process store on a clock the test moves by hand."""
+
+    def __init__(self):
+        super().__init__()
+        self.now = 1_000_000.0
+
+    def take(self, key, capacity, rate, now):
+        return super().take(key, capacity, rate, self.now)
+
+
+@pytest.fixture
+def limited_app(tmp_path):
+    store = FakeClockStore()
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'h2h.db'}",
+        'RATELIMIT_STORAGE': store,
+        'RATELIMIT_MATCHES': '2/minute',
+        'WRITE_CONCURRENCY_LIMIT': 1,
+        'WRITE_QUEUE_TIMEOUT_MS': 50,
+    })
+    app.clock = store
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _record(app, group, headers=None):
+    a, b = group.members[:2]
+    return app.test_client().post(f'/api/groups/{group.id}/matches', headers=headers or group.headers,
+                                  json={'winner_id': a, 'loser_id': b})
+
+
+def test_parse_rate():
+    assert parse_rate('30/minute') == (30, 0.5)
+    assert parse_rate('5/seconds') == (5, 5.0)
+    assert parse_rate('10') == (10, 10.0)
+    assert parse_rate('') is None and parse_rate('0/minute') is None
+    with pytest.raises(ValueError):
+        parse_rate('3/fortnight')
+
+
+def test_bucket_refills_continuously_up_to_capacity():
+    store = MemoryBucketStore()
+    assert [store.take('k', 3, 1.0, 0.0) for _ in range(3)] == [0, 0, 0]
+    assert store.take('k', 3, 1.0, 0.0) == pytest.approx(1.0)
+    assert store.take('k', 3, 1.0, 0.5) == pytest.approx(0.5)
+    assert store.take('k', 3, 1.0, 1.0) == 0
+    # A long idle spell refills to capacity, no further
+    assert [store.take('k', 3, 1.0, 100.0) for _ in range(4)][-1] == pytest.approx(1.0)
+
+
+def test_out_of_tokens_gets_429_with_retry_after(limited_app, make_group):
+    group = make_group(limited_app, 3)
+    other = make_group(limited_app, 2)
+    assert [_record(limited_app, group).status_code for _ in range(2)] == [201, 201]
+
+    limited = _record(limited_app, group)
+    assert limited.status_code == 429
+    # One token every 30 seconds at 2/minute
+    assert limited.headers['Retry-After'] == '30'
+    assert limited.get_json() == {'ok': False, 'error': 'Too many requests'}
+
+    # Buckets are per user and group
+    assert _record(limited_app, other).status_code == 201
+
+    limited_app.clock.now += 20
+    assert int(_record(limited_app, group).headers['Retry-After']) in (10, 11)  # rounded up
+    limited_app.clock.now += 10
+    assert _record(limited_app, group).status_code == 201
+    assert _record(limited_app, group).status_code == 429
+
+
+def test_writes_beyond_the_cap_are_shed_with_503(limited_app, make_group, monkeypatch):
+    group = make_group(limited_app, 2)
+    entered, release = threading.Event(), threading.Event()
+    real = routes.apply_match
+
+    def held(group, spec):
+        entered.set()
+        release.wait(5)
+        return real(group, spec)
+    monkeypatch.setattr(routes, 'apply_match', held)
+
+    first = {}
+    t = threading.Thread(target=lambda: first.update(resp=_record(limited_app, group)))
+    t.start()
+    try:
+        assert entered.wait(5)
+        shed = _record(limited_app, group)
+        assert shed.status_code == 503
+        assert shed.headers['Retry-After'] == '1'
+        # Reads don't queue behind the writes
+        client = limited_app.test_client()
+        assert client.get(f'/api/groups/{group.id}', headers=group.headers).status_code == 200
+    finally:
+        release.set()
+        t.join()
+    assert first['resp'].status_code == 201
+    # The slot is free again, and the shed request spent no slot
+    assert _record(limited_app, group).status_code == 429
+    limited_app.clock.now += 30
+    assert _record(limited_app, group).status_code == 201
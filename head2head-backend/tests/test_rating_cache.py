@@ -0,0 +1,104 @@
+"""The per-process rating cache: version misses, write-through on commit, reused group ids."""
+import pytest
+
+from app import create_app, db
+from app.jobs import run_once
+from app.models import Group, Membership, Ranking
+from app.rating_cache import Rating, base_for_update, bump_version, group_ratings, write_through
+
+
+def _members(app, group):
+    resp = app.test_client().get(f'/api/groups/{group.id}', headers=group.headers)
+    assert resp.status_code == 200
+    return {m['id']: (m['elo'], m['games']) for m in resp.get_json()['group']['members']}
+
+
+def _stored(app, group_id):
+    with app.app_context():
+        return {r.user_id: (r.points, r.games) for r in Ranking.query.filter_by(group_id=group_id)}
+
+
+def _record(app, group, winner, loser):
+    resp = app.test_client().post(f'/api/groups/{group.id}/matches', headers=group.headers,
+                                  json={'winner_id': winner, 'loser_id': loser})
+    assert resp.status_code == 201
+
+
+def test_another_writers_bump_misses_the_cached_snapshot(any_app, make_group):
+    group = make_group(any_app, 2)
+    a, b = group.members
+    _record(any_app, group, a, b)
+    assert _members(any_app, group) == {a: (1016, 1), b: (984, 1)}
+    hits = any_app.extensions['rating_cache'].hits
+    assert _members(any_app, group) == {a: (1016, 1), b: (984, 1)}
+    assert any_app.extensions['rating_cache'].hits == hits + 1
+
+    # A second app on the same database is another worker with a cache of its own
+    other = create_app({**any_app.config})
+    try:
+        _record(other, group, b, a)
+    finally:
+        with other.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    assert _members(any_app, group) == {uid: (p, g) for uid, (p, g) in _stored(any_app, group.id).items()}
+    assert _members(any_app, group)[a][1] == 2
+
+
+def test_write_through_publishes_only_on_commit(any_app, make_group):
+    group = make_group(any_app, 2)
+    a, _ = group.members
+    with any_app.app_context():
+        g = Group.query.get(group.id)
+        before = group_ratings(g)
+        cache = any_app.extensions['rating_cache']
+
+        version = bump_version(g.id)
+        write_through(base_for_update(g, version), version, {a: Rating(points=1100, games=1, wins=1, streak=1)})
+        assert cache.get(g, version) is None
+        db.session.rollback()
+        assert cache.get(g, version) is None
+        assert cache.get(g, before.version) is before
+        assert Ranking.query.filter_by(group_id=g.id, user_id=a).one().points == 1000
+
+        version = bump_version(g.id)
+        write_through(base_for_update(g, version), version, {a: Rating(points=1100, games=1, wins=1, streak=1)})
+        assert cache.get(g, version) is None
+        db.session.commit()
+        g = Group.query.get(group.id)
+        assert g.ratings_version == version
+        assert cache.get(g, version).get(a).points == 1100
+    assert _stored(any_app, group.id) == {a: (1100, 1)}
+
+
+def test_reused_group_id_does_not_see_the_deleted_groups_ratings(sqlite_app, make_group):
+    old = make_group(sqlite_app, 2)
+    a, b = old.members
+    _record(sqlite_app, old, a, b)
+    assert _members(sqlite_app, old) == {a: (1016, 1), b: (984, 1)}
+    with sqlite_app.app_context():
+        cached_version = Group.query.get(old.id).ratings_version
+        Ranking.query.filter_by(group_id=old.id, user_id=b).delete()
+        Membership.query.filter_by(group_id=old.id, user_id=b).delete()
+        db.session.commit()
+    client = sqlite_app.test_client()
+    assert client.post(f'/api/groups/{old.id}/leave', headers=old.headers).status_code == 200
+    with sqlite_app.app_context():
+        while run_once():
+            pass
+
+    # SQLite hands the deleted group's id to the next group
+    resp = client.post('/api/groups', headers=old.headers, json={'name': 'again', 'sport': 'test'})
+    new = type(old)(id=resp.get_json()['group']['id'], members=[a, b], headers=old.headers)
+    if new.id != old.id:
+        pytest.skip('SQLite did not reuse the group id')
+    with sqlite_app.app_context():
+        db.session.add(Membership(user_id=b, group_id=new.id, role='member'))
+        while bump_version(new.id) < cached_version:
+            pass
+        db.session.commit()
+
+    assert _members(sqlite_app, new) == {a: (1000, 0), b: (1000, 0)}
+    _record(sqlite_app, new, b, a)
+    assert _stored(sqlite_app, new.id) == {a: (984, 1), b: (1016, 1)}
+    assert _members(sqlite_app, new) == {a: (984, 1), b: (1016, 1)}
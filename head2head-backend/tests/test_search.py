@@ -0,0 +1,36 @@
+"""Username prefix search for the invite typeahead."""
+import uuid
+
+from app.search import _upper_bound
+
+LAST = chr(0x10FFFF)
+
+
+def test_upper_bound():
+    assert _upper_bound('ab') == 'ac'
+    assert _upper_bound('a' + LAST) == 'b'
+    assert _upper_bound('a' + LAST + LAST) == 'b'
+    assert _upper_bound(chr(0xD7FF)) == chr(0xE000)
+    assert _upper_bound(LAST) is None
+    assert _upper_bound('') is None
+
+
+def test_prefixes_at_the_end_of_unicode(any_app):
+    client = any_app.test_client()
+    tag = uuid.uuid4().hex[:6]
+    names = [f'{tag}a', f'{tag}a{LAST}', f'{tag}a{LAST}z', f'{tag}b', f'{tag}{chr(0xD7FF)}x', f'{tag}{chr(0xE000)}', f'{LAST}{tag}']
+    tokens = [client.post('/api/users', json={'username': n, 'password': 'secret1'}).get_json()['token'] for n in names]
+    me = client.post('/api/users', json={'username': f'me{tag}', 'password': 'secret1'}).get_json()['token']
+
+    def search(q):
+        resp = client.get('/api/users/search', query_string={'q': q, 'limit': 50},
+                          headers={'Authorization': f'Bearer {me}'})
+        assert resp.status_code == 200
+        return [u['username'] for u in resp.get_json()['users']]
+
+    assert len(tokens) == len(names)
+    assert search(f'{tag}a') == [f'{tag}a', f'{tag}a{LAST}', f'{tag}a{LAST}z']
+    assert search(f'{tag}a{LAST}') == [f'{tag}a{LAST}', f'{tag}a{LAST}z']
+    assert search(f'{tag}a{LAST}z') == [f'{tag}a{LAST}z']
+    assert search(f'{tag}{chr(0xD7FF)}') == [f'{tag}{chr(0xD7FF)}x']
+    assert search(LAST) == [f'{LAST}{tag}']
@@ -0,0 +1,19 @@
+"""``POST /groups/<id>/teams``: the rating-balanced team generator."""
+
+
+def _teams(app, group, body):
+    return app.test_client().post(f'/api/groups/{group.id}/teams', headers=group.headers, json=body)
+
+
+def test_team_size_defaults_to_the_group_and_rejects_zero(sqlite_app, make_group):
+    group = make_group(sqlite_app, 4)
+
+    resp = _teams(sqlite_app, group, {})
+    assert resp.status_code == 200
+    assert resp.get_json()['team_size'] == 1
+    assert _teams(sqlite_app, group, {'team_size': 2}).get_json()['team_size'] == 2
+
+    zero = _teams(sqlite_app, group, {'team_size': 0})
+    assert zero.status_code == 400
+    assert zero.get_json()['error'] == 'team_size must be at least 1'
+    assert _teams(sqlite_app, group, {'team_size': 'two'}).status_code == 400
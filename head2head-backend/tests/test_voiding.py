@@ -0,0 +1,137 @@
+"""Voiding a match re-rates incrementally; the result must equal replaying what's left."""
+from types import SimpleNamespace
+
+import pytest
+
+from app import db, routes
+from app.matches import compute_deltas, parse_match
+from app.models import Match, Ranking
+from app.stats import StatLine, outcomes, record_result
+
+
+def _history(a, b, c, d, e):
+    """Duels (one tied), team games (one tied) and FFAs (one with a shared first place)."""
+    return [
+        {'winner_id': a, 'loser_id': b},
+        {'playersA': [a, c], 'playersB': [b, d], 'winner_team': 2},
+        {'ffa': True, 'placements': {a: 1, b: 2, c: 3, e: 4}},
+        {'winner_id': c, 'loser_id': a},
+        {'winner_id': d, 'loser_id': e, 'tie': True},
+        {'playersA': [b, e], 'playersB': [c, d], 'winner_team': 1},
+        {'ffa': True, 'placements': {b: 1, d: 1, a: 3}},
+        {'winner_id': e, 'loser_id': b},
+        {'playersA': [a, b], 'playersB': [d, e], 'tie': True},
+        {'winner_id': a, 'loser_id': d},
+        {'ffa': True, 'placements': {e: 1, c: 2, a: 3, d: 4}},
+        {'winner_id': b, 'loser_id': c},
+    ]
+
+
+def _record(app, group, payloads) -> list:
+    client = app.test_client()
+    ids = []
+    for payload in payloads:
+        resp = client.post(f'/api/groups/{group.id}/matches', headers=group.headers, json=payload)
+        assert resp.status_code == 201, resp.get_json()
+        with app.app_context():
+            ids.append(db.session.query(db.func.max(Match.id)).filter(Match.group_id == group.id).scalar())
+    return ids
+
+
+def _void(app, group, match_id, headers=None):
+    return app.test_client().post(f'/api/groups/{group.id}/matches/{match_id}/void', headers=headers or group.headers)
+
+
+def _stored(app, group):
+    with app.app_context():
+        return {
+            r.user_id: (r.points, r.games, r.wins, r.losses, r.ties, r.streak, r.last_played_at)
+            for r in Ranking.query.filter_by(group_id=group.id)
+        }
+
+
+def _replay(app, group, recorded: dict):
+    """Rankings from scratch over the matches still stored, in the order they were rated."""
+    with app.app_context():
+        played_at = dict(db.session.query(Match.id, Match.created_at).filter(Match.group_id == group.id))
+    assert set(played_at) == set(recorded)
+    points = {uid: 1000 for uid in group.members}
+    lines = {uid: StatLine() for uid in group.members}
+    for match_id in sorted(recorded):
+        spec = parse_match(recorded[match_id])
+        for uid, delta in compute_deltas(spec, points).items():
+            points[uid] += delta
+        for uid, outcome in outcomes(spec).items():
+            record_result(lines[uid], outcome, played_at[match_id])
+    return {
+        uid: (points[uid], line.games, line.wins, line.losses, line.ties, line.streak, line.last_played_at)
+        for uid, line in lines.items()
+    }
+
+
+def _login(app, user_id):
+    client = app.test_client()
+    with app.app_context():
+        username = db.session.execute(db.text('SELECT username FROM users WHERE id = :id'), {'id': user_id}).scalar()
+    token = client.post('/api/auth/login', json={'username': username, 'password': 'secret1'}).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.mark.parametrize('cache', [True, False], ids=['cache', 'no-cache'])
+def test_voids_at_any_depth_match_a_full_replay(any_app, make_group, monkeypatch, cache):
+    monkeypatch.setitem(any_app.config, 'RATING_CACHE_ENABLED', cache)
+    group = make_group(any_app, 5)
+    payloads = _history(*group.members)
+    recorded = dict(zip(_record(any_app, group, payloads), payloads))
+    assert _stored(any_app, group) == _replay(any_app, group, recorded)
+
+    ids = sorted(recorded)
+    # The latest match, one in the middle, the first, then the latest again
+    for match_id in (ids[-1], ids[5], ids[0], ids[-2]):
+        resp = _void(any_app, group, match_id)
+        assert resp.status_code == 200, resp.get_json()
+        del recorded[match_id]
+        assert _stored(any_app, group) == _replay(any_app, group, recorded)
+
+    resp = any_app.test_client().get(f'/api/groups/{group.id}', headers=group.headers)
+    expected = _replay(any_app, group, recorded)
+    assert {m['id']: (m['elo'], m['games']) for m in resp.get_json()['group']['members']} == {
+        uid: (row[0], row[1]) for uid, row in expected.items()
+    }
+
+
+def test_only_the_owner_voids_and_only_once(any_app, make_group, monkeypatch):
+    group = make_group(any_app, 3)
+    a, b, c = group.members
+    payloads = [{'winner_id': a, 'loser_id': b}, {'winner_id': b, 'loser_id': c}, {'winner_id': c, 'loser_id': a}]
+    recorded = dict(zip(_record(any_app, group, payloads), payloads))
+    first, second, third = sorted(recorded)
+
+    denied = _void(any_app, group, second, _login(any_app, b))
+    assert denied.status_code == 403
+    assert denied.get_json()['error'] == 'Only the group owner can void matches'
+    assert _stored(any_app, group) == _replay(any_app, group, recorded)
+
+    # Two voids of the same match: the second loaded it before the first deleted it
+    real = routes.apply_void
+
+    def raced(group_row, match, window):
+        loaded = SimpleNamespace(id=match.id)
+        real(group_row, match, window)
+        db.session.commit()
+        return real(group_row, loaded, window)
+
+    with monkeypatch.context() as m:
+        m.setattr(routes, 'apply_void', raced)
+        conflict = _void(any_app, group, second)
+    assert conflict.status_code == 409
+    assert conflict.get_json()['error'] == f'Match {second} has already been voided'
+    del recorded[second]
+    assert _stored(any_app, group) == _replay(any_app, group, recorded)
+
+    # Once it's gone the match can't be found at all
+    assert _void(any_app, group, second).status_code == 404
+    assert _void(any_app, group, third).status_code == 200
+    del recorded[third]
+    assert _stored(any_app, group) == _replay(any_app, group, recorded)
+    assert set(recorded) == {first}
@@ -52,6 +52,7 @@ function App() {
   const [inviteInput, setInviteInput] = useState('');
   const [pendingInvites, setPendingInvites] = useState([]); // usernames to invite when creating
   const [myGroups, setMyGroups] = useState([]);
+  const [myGroupsNextOffset, setMyGroupsNextOffset] = useState(null); // next page of /my/groups, null at the end
   const [selectedGroup, setSelectedGroup] = useState(null);
   const [groupDetails, setGroupDetails] = useState(null);
   const [editSportSelect, setEditSportSelect] = useState('');
@@ -111,8 +112,7 @@ function App() {
       if (data.token) { localStorage.setItem('token', data.token); setToken(data.token); }
       setUser(data.user); // auto sign-in after account creation
       setForm({ username: '', email: '', password: '' });
-      fetchMyGroups(data.user.id);
-      fetchInbox(data.user.id);
+      fetchBootstrap(data.token);
     } catch (err) {
       console.error(err);
       setStatus({ type: 'error', message: 'Network error creating user' });
@@ -140,8 +140,7 @@ function App() {
       setStatus({ type: 'success', message: `Signed in as ${data.user.username}` });
       setLoginForm({ username: '', password: '' });
       // Load my groups and invites after login
-      fetchMyGroups(data.user.id);
-      fetchInbox(data.user.id);
+      fetchBootstrap(data.token);
     } catch (err) {
       console.error(err);
       setStatus({ type: 'error', message: 'Network error signing in' });
@@ -151,6 +150,7 @@ function App() {
   const signOut = () => {
     setUser(null);
     setMyGroups([]);
+    setMyGroupsNextOffset(null);
     setInbox([]);
     setSelectedGroup(null);
     setGroupDetails(null);
@@ -174,11 +174,33 @@ function App() {
     return h;
   };
 
-  const fetchMyGroups = async (uid) => {
+  // User, groups and pending invites in one request (used on sign-in and reload)
+  const fetchBootstrap = async (authToken) => {
     try {
-      const res = await fetch('/api/my/groups', { headers: headersAuth() });
+      const res = await fetch('/api/bootstrap', {
+        headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${authToken}` },
+      });
+      if (res.ok) {
+        const data = await res.json();
+        setUser(data.user);
+        setMyGroups(data.groups);
+        setMyGroupsNextOffset(data.next_offset ?? null);
+        setInbox(data.invites);
+      }
+      return res;
+    } catch {
+      return null;
+    }
+  };
+
+  const fetchMyGroups = async (uid, offset = 0) => {
+    try {
+      const res = await fetch(`/api/my/groups?offset=${offset}`, { headers: headersAuth() });
       const data = await res.json();
-      if (res.ok) setMyGroups(data.groups);
+      if (res.ok) {
+        setMyGroups((prev) => (offset ? [...prev, ...data.groups] : data.groups));
+        setMyGroupsNextOffset(data.next_offset ?? null);
+      }
     } catch {}
   };
 
@@ -243,13 +265,8 @@ function App() {
     const init = async () => {
       if (!token) return;
       try {
-        const res = await fetch('/api/auth/me', { headers: headersAuth() });
-        const data = await res.json();
-        if (res.ok) {
-          setUser(data.user);
-          fetchMyGroups(data.user.id);
-          fetchInbox(data.user.id);
-        } else {
+        const res = await fetchBootstrap(token);
+        if (res && !res.ok) {
           // invalid/expired token
           localStorage.removeItem('token');
           setToken('');
@@ -701,12 +718,18 @@ function App() {
                       <li key={g.id}>
                         <button onClick={() => { setSelectedGroup(g.id); fetchGroup(user.id, g.id); }} className="text-left w-full px-3 py-2 rounded-lg bg-slate-800/60 border border-slate-700 hover:bg-slate-800">
                           <div className="font-medium">{g.name} <span className="text-slate-400">({g.sport})</span></div>
-                          <div className="text-slate-400 text-sm">{g.role}</div>
+                          <div className="text-slate-400 text-sm">
+                            {g.role} · #{g.rank} of {g.member_count} · {g.elo} ELO
+                            {g.last_match_at && <> · last match {new Date(g.last_match_at).toLocaleDateString()}</>}
+                          </div>
                         </button>
                       </li>
                     ))}
                   </ul>
                 )}
+                {myGroupsNextOffset !== null && (
+                  <Button onClick={() => fetchMyGroups(user.id, myGroupsNextOffset)} variant="secondary" className="mt-3 text-sm">Load more</Button>
+                )}
               </Card>
 
               <Card header="Group Info">